@@ -1,10 +1,22 @@
 from pathlib import Path
-from typing import Union, Optional
+from typing import Iterable, Union, Optional
+
 import requests
 
 from ..common.constants import DEFAULT_BASE_URL
 from ..helpers.filesystem import provision_path
+from ..log_engine import ROOT_LOGGER as PARENT_LOGGER
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('api')
+
 
+from .client import InferenceClient, get_client, close_clients
+from .endpoints import Endpoint, EndpointPool
+from .hedging import HedgedClient
+from .aio import AsyncInferenceClient, analyze_image_async
+from .preprocess import Preprocessor, rescale_prediction
+from .payload import DEFAULT_CHUNK_SIZE, MultipartPayload
 
 
 def create_payload(
@@ -12,11 +24,22 @@ def create_payload(
         do_not_expand: bool = False,
         do_not_resolve: bool = False,
         do_not_convert: bool = False,
-        do_not_provision: bool = False
-):
+        do_not_provision: bool = False,
+        field_name: str = 'f1',
+        data: Optional[Union[bytes, memoryview]] = None,
+        payload: Optional[MultipartPayload] = None,
+        use_mmap: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> MultipartPayload:
     """
     Create a payload for the request.
 
+    The payload is a streaming, context-managed request body (see :class:`MultipartPayload`); the file is only opened
+    while the body is being sent and is always closed afterward. Use it as a context manager:
+
+        >>> with create_payload('image.jpg') as payload:
+        ...     client.infer(payload=payload)
+
     Parameters:
         image_path (str):
             The path to the image.
@@ -30,13 +53,32 @@ def create_payload(
         do_not_convert (bool):
             A flag indicating whether to convert the path to a string.
 
+        field_name (str):
+            The multipart field name of the file. The inference server accepts numbered fields (`f1` .. `fN`).
+
+        data (Optional[Union[bytes, memoryview]]):
+            The bytes of the image, if they were already read (for example, to hash the file). They are sent without
+            being copied, and the file is not read again.
+
+        payload (Optional[MultipartPayload]):
+            An existing payload to add the file to, to build a multi-image request.
+
+        use_mmap (bool):
+            A flag indicating whether a new payload should stream files through a read-only memory map.
+
+        chunk_size (int):
+            The number of bytes a new payload reads from a file at a time.
+
     Returns:
-        dict:
+        MultipartPayload:
             The payload for the request.
 
     Raises:
         ValueError:
             If the path is invalid.
+
+        FileNotFoundError:
+            If the file does not exist.
     """
     if not do_not_provision:
         image_path = provision_path(
@@ -49,10 +91,18 @@ def create_payload(
     if not isinstance(image_path, Path):
         raise ValueError(f"Invalid path: {image_path}!")
 
-    if not image_path.exists():
+    if data is None and not image_path.exists():
         raise FileNotFoundError(f"The file {image_path} does not exist!")
 
-    return {'f1': open(image_path, 'rb')}
+    if payload is None:
+        payload = MultipartPayload(chunk_size=chunk_size, use_mmap=use_mmap)
+
+    if data is None:
+        payload.add_file(field_name, image_path=image_path)
+    else:
+        payload.add_file(field_name, data=data, filename=image_path.name)
+
+    return payload
 
 
 def make_request(
@@ -61,7 +111,10 @@ def make_request(
         do_not_expand:    bool = False,
         do_not_resolve:   bool = False,
         do_not_convert:   bool = False,
-        do_not_provision: bool = False
+        do_not_provision: bool = False,
+        client:           Optional[InferenceClient] = None,
+        preprocessor:     Optional[Preprocessor] = None,
+        data:             Optional[Union[bytes, memoryview]] = None
 ):
     """
     Make a request to the inference server.
@@ -85,6 +138,17 @@ def make_request(
         do_not_provision (bool):
             A flag indicating whether to provision the path.
 
+        client (Optional[InferenceClient]):
+            The client to send the request with. Defaults to the shared client for `base_url`.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload and the returned boxes are mapped back to the
+            coordinates of the original image.
+
+        data (Optional[Union[bytes, memoryview]]):
+            The bytes of the image, if they were already read. They are uploaded without being copied (unless the
+            image is downscaled).
+
     Returns:
         dict:
             The result of the request.
@@ -105,22 +169,68 @@ def make_request(
         IsADirectoryError:
             If the path is a directory.
     """
-    # Create the payload
-    files = create_payload(
-        image_path,
-        do_not_expand=do_not_expand,
-        do_not_resolve=do_not_resolve,
-        do_not_convert=do_not_convert,
-        do_not_provision=do_not_provision
-    )
+    if not do_not_provision:
+        image_path = provision_path(
+            image_path,
+            do_not_expand=do_not_expand,
+            do_not_resolve=do_not_resolve,
+            do_not_convert=do_not_convert
+        )
+
+    if client is None:
+        client = get_client(base_url)
+
+    # Create the payload and make the request over the client's pooled connection, raising if it was unsuccessful
+    with MultipartPayload() as payload:
+        scale = _add_upload(payload, image_path, preprocessor=preprocessor, data=data)
+        result = client.infer(payload=payload)
+
+    if scale is not None:
+        for prediction in result.get('prediction', []):
+            rescale_prediction(prediction, scale)
+
+    return result
+
+
+def _add_upload(
+        payload:      MultipartPayload,
+        image_path:   Path,
+        field_name:   str = 'f1',
+        preprocessor: Optional[Preprocessor] = None,
+        data:         Optional[Union[bytes, memoryview]] = None
+):
+    """
+    Add an image to a payload, downscaling it first if a preprocessor is given.
+
+    Parameters:
+        payload (MultipartPayload):
+            The payload to add the image to.
+
+        image_path (Path):
+            The provisioned path to the image.
 
-    # Make the request
-    response = requests.post(base_url, files=files)
+        field_name (str):
+            The multipart field name of the file.
 
-    # Check if the request was successful
-    response.raise_for_status()
+        preprocessor (Optional[Preprocessor]):
+            The preprocessor to downscale the image with.
+
+        data (Optional[Union[bytes, memoryview]]):
+            The bytes of the image, if they were already read.
+
+    Returns:
+        Optional[tuple[float, float]]:
+            The factors that map the returned boxes back to original coordinates, or None if the image is uploaded
+            as-is.
+    """
+    if preprocessor is not None:
+        if prepared := preprocessor.prepare(image_path, data=data):
+            filename, prepared_data, content_type = prepared.as_file()
+            payload.add_file(field_name, data=prepared_data, filename=filename, content_type=content_type)
 
-    return response.json()
+            return prepared.scale
+
+    create_payload(image_path, do_not_provision=True, field_name=field_name, data=data, payload=payload)
 
 
 def analyze_image(
@@ -128,6 +238,9 @@ def analyze_image(
         base_url: Optional[str] = None,
         do_not_provision: bool = False,
         do_not_convert: bool = False,
+        client: Optional[InferenceClient] = None,
+        preprocessor: Optional[Preprocessor] = None,
+        data: Optional[Union[bytes, memoryview]] = None,
         **kwargs
 ) -> dict:
     """
@@ -140,6 +253,15 @@ def analyze_image(
         base_url (Optional[str]):
             The base URL of the inference server.
 
+        client (Optional[InferenceClient]):
+            The client to send the request with. Defaults to the shared client for `base_url`.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`Preprocessor`).
+
+        data (Optional[Union[bytes, memoryview]]):
+            The bytes of the image, if they were already read. The file is then not read again.
+
     Returns:
         dict:
             The result of the analysis.
@@ -150,10 +272,203 @@ def analyze_image(
     if not do_not_provision:
         image_path = provision_path(image_path, do_not_convert=do_not_convert, **kwargs)
 
-    result = make_request(image_path, base_url=base_url, do_not_provision=True)
+    result = make_request(
+        image_path,
+        base_url=base_url,
+        do_not_provision=True,
+        client=client,
+        preprocessor=preprocessor,
+        data=data
+    )
 
     return {
         'image_path': image_path,
         'result': result
 
     }
+
+
+DEFAULT_BATCH_SIZE = 8
+"""
+int:
+    The default number of images packed into a single batch request.
+"""
+
+
+def iter_batches(items: Iterable, batch_size: int):
+    """
+    Split an iterable into lists of at most `batch_size` items.
+
+    Parameters:
+        items (Iterable):
+            The items to split.
+
+        batch_size (int):
+            The maximum number of items in each batch.
+
+    Yields:
+        list:
+            The next batch of items.
+    """
+    batch = []
+
+    for item in items:
+        batch.append(item)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def make_batch_request(
+        image_paths: list[Path],
+        base_url:     Optional[str] = DEFAULT_BASE_URL,
+        client:       Optional[InferenceClient] = None,
+        preprocessor: Optional[Preprocessor] = None
+) -> list:
+    """
+    Make a single request to the inference server carrying several images.
+
+    The images are sent as the numbered multipart fields `f1` .. `fN`, and the server answers with one `prediction`
+    entry per field, in the same order.
+
+    Parameters:
+        image_paths (list[Path]):
+            The provisioned paths to the images.
+
+        base_url (Optional[str]):
+            The base URL of the inference server.
+
+        client (Optional[InferenceClient]):
+            The client to send the request with. Defaults to the shared client for `base_url`.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`Preprocessor`).
+
+    Returns:
+        list:
+            The prediction entries, one per image, in the order of `image_paths`, in original image coordinates.
+
+    Raises:
+        requests.exceptions.HTTPError:
+            If the request was unsuccessful.
+
+        ValueError:
+            If the server did not answer with exactly one prediction entry per image.
+    """
+    if client is None:
+        client = get_client(base_url)
+
+    with MultipartPayload() as payload:
+        scales = [
+            _add_upload(payload, image_path, field_name=f'f{i}', preprocessor=preprocessor)
+            for i, image_path in enumerate(image_paths, start=1)
+        ]
+
+        result = client.infer(payload=payload)
+
+    predictions = result.get('prediction', [])
+
+    if len(predictions) != len(image_paths):
+        raise ValueError(
+            f'Expected {len(image_paths)} predictions from the inference server, received {len(predictions)}!'
+        )
+
+    for prediction, scale in zip(predictions, scales):
+        if scale is not None:
+            rescale_prediction(prediction, scale)
+
+    return predictions
+
+
+def analyze_images_batch(
+        image_paths:      Iterable[Union[str, Path]],
+        batch_size:       int = DEFAULT_BATCH_SIZE,
+        base_url:         Optional[str] = None,
+        client:           Optional[InferenceClient] = None,
+        do_not_provision: bool = False,
+        do_not_convert:   bool = False,
+        preprocessor:     Optional[Preprocessor] = None,
+        **kwargs
+) -> list[dict]:
+    """
+    Analyze several images using the inference server, packing up to `batch_size` images into each request.
+
+    If the server rejects a batch (an HTTP error, an undecodable body, or a prediction count that does not match the
+    number of images sent), the images of that batch are retried one request at a time.
+
+    Parameters:
+        image_paths (Iterable[Union[str, Path]]):
+            The paths to the images.
+
+        batch_size (int):
+            The maximum number of images sent in a single request.
+
+        base_url (Optional[str]):
+            The base URL of the inference server.
+
+        client (Optional[InferenceClient]):
+            The client to send the requests with. Defaults to the shared client for `base_url`.
+
+        do_not_provision (bool):
+            A flag indicating whether to provision the paths.
+
+        do_not_convert (bool):
+            A flag indicating whether to convert strings to pathlib.Path objects.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`Preprocessor`).
+
+    Returns:
+        list[dict]:
+            One result per image, in input order, shaped like the result of :func:`analyze_image`. Images that could
+            not be analyzed, even on their own, have an `error` entry holding the exception instead of a `result`.
+
+    Raises:
+        ValueError:
+            If the batch size is not a positive integer.
+    """
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError(f"Invalid batch size: {batch_size}!")
+
+    if base_url is None:
+        base_url = DEFAULT_BASE_URL
+
+    if client is None:
+        client = get_client(base_url)
+
+    if not do_not_provision:
+        image_paths = [provision_path(path, do_not_convert=do_not_convert, **kwargs) for path in image_paths]
+
+    results = []
+
+    for batch in iter_batches(image_paths, batch_size):
+        if len(batch) > 1:
+            try:
+                predictions = make_batch_request(batch, base_url=base_url, client=client, preprocessor=preprocessor)
+            except (requests.exceptions.RequestException, OSError, ValueError) as e:
+                MOD_LOGGER.warning(f'Inference server rejected a batch of {len(batch)} images ({e}). '
+                                   'Falling back to single requests.')
+            else:
+                results.extend(
+                    {'image_path': image_path, 'result': {'prediction': [prediction]}}
+                    for image_path, prediction in zip(batch, predictions)
+                )
+                continue
+
+        for image_path in batch:
+            try:
+                results.append(analyze_image(
+                    image_path,
+                    base_url=base_url,
+                    do_not_provision=True,
+                    client=client,
+                    preprocessor=preprocessor
+                ))
+            except Exception as e:
+                results.append({'image_path': image_path, 'error': e})
+
+    return results
@@ -0,0 +1,322 @@
+"""
+aio.py
+
+This module provides an asyncio code path for the inference API.
+
+The :class:`AsyncInferenceClient` wraps a pooled :class:`aiohttp.ClientSession` and bounds the number of requests in
+flight with a semaphore, so a single event loop can keep hundreds of requests outstanding against a batching inference
+server without a thread per request. Files are streamed in chunks read on the default executor, so the event loop is
+never blocked on disk.
+
+Note:
+    This module requires the optional `aiohttp` dependency (`pip install pic-scanner[async]`).
+
+Classes:
+    AsyncInferenceClient:
+        A pooled, non-blocking HTTP client for a single inference server base URL.
+
+Functions:
+    analyze_image_async:
+        Analyze an image using the inference server without blocking the event loop.
+
+
+Since:
+    1.0
+"""
+import asyncio
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.api import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.api.client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from pic_scanner.api.preprocess import Preprocessor, rescale_prediction
+from pic_scanner.api.transport import is_unix_url, parse_unix_url
+from pic_scanner.helpers.filesystem import provision_path
+
+
+__all__ = [
+    'AsyncInferenceClient',
+    'analyze_image_async',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('aio')
+
+
+DEFAULT_MAX_IN_FLIGHT = 64
+"""
+int:
+    The default maximum number of requests an :class:`AsyncInferenceClient` keeps in flight.
+"""
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise ImportError(
+            "The asyncio scanning engine requires 'aiohttp'. Install it with `pip install pic-scanner[async]`."
+        )
+
+
+class AsyncInferenceClient:
+    """
+    A pooled, non-blocking HTTP client for a single inference server base URL.
+
+    The client must be used from a single event loop. It is an asynchronous context manager; leaving the context closes
+    the session and its pooled connections.
+
+    Properties:
+        base_url (str):
+            The base URL of the inference server.
+
+        max_in_flight (int):
+            The maximum number of requests in flight at once.
+
+        semaphore (asyncio.Semaphore):
+            The semaphore bounding the number of requests in flight.
+
+    Methods:
+        close():
+            Close the session and release its pooled connections.
+
+        infer(image_path, preprocessor):
+            Upload an image to the inference server and return the decoded JSON result.
+    """
+
+    def __init__(
+            self,
+            base_url:        Optional[str] = None,
+            max_in_flight:   int = DEFAULT_MAX_IN_FLIGHT,
+            connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+            read_timeout:    float = DEFAULT_READ_TIMEOUT,
+    ):
+        """
+        The constructor for the AsyncInferenceClient class.
+
+        Parameters:
+            base_url (Optional[str]):
+                The base URL of the inference server. Defaults to :data:`DEFAULT_BASE_URL`. A URL of the form
+                `unix:///path/to/socket[:/request/path]` sends the requests over a UNIX domain socket.
+
+            max_in_flight (int):
+                The maximum number of requests in flight at once. This also bounds the connection pool.
+
+            connect_timeout (float):
+                The number of seconds to wait for a connection to the inference server.
+
+            read_timeout (float):
+                The number of seconds to wait for the inference server to answer.
+
+        Raises:
+            ImportError:
+                If `aiohttp` is not installed.
+
+            ValueError:
+                If `max_in_flight` is not a positive integer.
+        """
+        _require_aiohttp()
+
+        if not isinstance(max_in_flight, int) or max_in_flight < 1:
+            raise ValueError(f"Invalid maximum number of requests in flight: {max_in_flight}!")
+
+        self.__base_url = base_url or DEFAULT_BASE_URL
+        self.__socket_path = None
+        self.__request_url = self.__base_url
+
+        if is_unix_url(self.__base_url):
+            self.__socket_path, self.__request_url = parse_unix_url(self.__base_url)
+
+        self.__max_in_flight = max_in_flight
+        self.__timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.__semaphore = asyncio.Semaphore(max_in_flight)
+        self.__session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __repr__(self):
+        return f'AsyncInferenceClient({self.base_url!r}, max_in_flight={self.max_in_flight})'
+
+    @property
+    def base_url(self) -> str:
+        """
+        Get the base URL of the inference server.
+
+        Returns:
+            str:
+                The base URL of the inference server.
+        """
+        return self.__base_url
+
+    @property
+    def max_in_flight(self) -> int:
+        """
+        Get the maximum number of requests in flight at once.
+
+        Returns:
+            int:
+                The maximum number of requests in flight.
+        """
+        return self.__max_in_flight
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        Get the semaphore bounding the number of requests in flight.
+
+        Returns:
+            asyncio.Semaphore:
+                The semaphore.
+        """
+        return self.__semaphore
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        """
+        Get the pooled session, creating it if needed.
+
+        Returns:
+            aiohttp.ClientSession:
+                The pooled session.
+        """
+        if self.__session is None or self.__session.closed:
+            MOD_LOGGER.debug(f'Creating async session for {self.base_url} (max in flight: {self.max_in_flight})')
+            if self.__socket_path is not None:
+                connector = aiohttp.UnixConnector(path=self.__socket_path, limit=self.max_in_flight)
+            else:
+                connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+
+            self.__session = aiohttp.ClientSession(connector=connector, timeout=self.__timeout)
+
+        return self.__session
+
+    async def infer(self, image_path: Path, preprocessor: Optional[Preprocessor] = None) -> dict:
+        """
+        Upload an image to the inference server and decode the result.
+
+        The file is streamed in chunks read on the default executor, and the request waits on the client's semaphore,
+        so no more than `max_in_flight` requests (and file reads) are outstanding at once.
+
+        Parameters:
+            image_path (Path):
+                The path to the image.
+
+            preprocessor (Optional[Preprocessor]):
+                If given, large images are downscaled (on the default executor) before upload, and the returned boxes
+                are mapped back to the coordinates of the original image.
+
+        Returns:
+            dict:
+                The decoded result of the request.
+
+        Raises:
+            aiohttp.ClientResponseError:
+                If the request was unsuccessful.
+
+            FileNotFoundError:
+                If the file does not exist.
+        """
+        async with self.semaphore:
+            prepared = None
+
+            if preprocessor is not None:
+                prepared = await asyncio.to_thread(preprocessor.prepare, image_path)
+
+            form = aiohttp.FormData()
+
+            handle = None
+
+            if prepared is not None:
+                filename, data, content_type = prepared.as_file()
+                form.add_field('f1', data, filename=filename, content_type=content_type)
+            else:
+                # aiohttp streams an open file in chunks on the default executor, so the file is never fully buffered.
+                handle = await asyncio.to_thread(open, image_path, 'rb')
+                form.add_field('f1', handle, filename=image_path.name)
+
+            try:
+                async with self.session.post(self.__request_url, data=form) as response:
+                    response.raise_for_status()
+                    result = await response.json()
+            finally:
+                if handle is not None:
+                    handle.close()
+
+        if prepared is not None:
+            for prediction in result.get('prediction', []):
+                rescale_prediction(prediction, prepared.scale)
+
+        return result
+
+    async def close(self):
+        """
+        Close the session and release its pooled connections.
+
+        Returns:
+            None
+        """
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+
+async def analyze_image_async(
+        image_path: Union[str, Path],
+        base_url: Optional[str] = None,
+        client: Optional[AsyncInferenceClient] = None,
+        do_not_provision: bool = False,
+        do_not_convert: bool = False,
+        preprocessor: Optional[Preprocessor] = None,
+        **kwargs
+) -> dict:
+    """
+    Analyze an image using the inference server without blocking the event loop.
+
+    Parameters:
+        image_path (Union[str, Path]):
+            The path to the image.
+
+        base_url (Optional[str]):
+            The base URL of the inference server. Ignored when `client` is given.
+
+        client (Optional[AsyncInferenceClient]):
+            The client to send the request with. If not given, a single-use client is created and closed afterward;
+            pass a shared client when analyzing more than one image.
+
+        do_not_provision (bool):
+            A flag indicating whether to provision the path.
+
+        do_not_convert (bool):
+            A flag indicating whether to convert a string to a pathlib.Path object.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`pic_scanner.api.preprocess.Preprocessor`).
+
+    Returns:
+        dict:
+            The result of the analysis, in the same shape as :func:`pic_scanner.api.analyze_image`.
+    """
+    if not do_not_provision:
+        image_path = provision_path(image_path, do_not_convert=do_not_convert, **kwargs)
+
+    if not isinstance(image_path, Path):
+        raise ValueError(f"Invalid path: {image_path}!")
+
+    if client is None:
+        async with AsyncInferenceClient(base_url) as client:
+            result = await client.infer(image_path, preprocessor=preprocessor)
+    else:
+        result = await client.infer(image_path, preprocessor=preprocessor)
+
+    return {
+        'image_path': image_path,
+        'result': result
+    }
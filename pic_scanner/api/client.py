@@ -0,0 +1,524 @@
+"""
+client.py
+
+This module provides a pooled, keep-alive HTTP client for the inference server.
+
+Rather than calling the module-level :func:`requests.post` (which opens and tears down a new connection for every
+image), the :class:`InferenceClient` owns a :class:`requests.Session` with a bounded connection pool that is reused for
+every request made against its base URL. Clients are shared per base URL through :func:`get_client`, which returns a
+shared, load-balancing :class:`~pic_scanner.api.endpoints.EndpointPool` when given several base URLs. Base URLs of the
+form `unix:///path/to/socket` are served over a UNIX domain socket (see :mod:`pic_scanner.api.transport`).
+
+Classes:
+    InferenceClient:
+        A pooled, keep-alive HTTP client for a single inference server base URL.
+
+Functions:
+    get_client:
+        Get (or create) the shared client for a base URL.
+
+    close_clients:
+        Close every shared client.
+
+
+Since:
+    1.0
+"""
+import inspect
+from threading import Lock
+from typing import Optional, Sequence, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.api import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.api.transport import UnixSocketAdapter, is_unix_url, parse_unix_url
+
+
+__all__ = [
+    'InferenceClient',
+    'close_clients',
+    'get_client',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('client')
+
+
+DEFAULT_POOL_SIZE = 10
+"""
+int:
+    The default maximum number of connections kept alive in a client's pool.
+"""
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+"""
+float:
+    The default number of seconds to wait for a connection to the inference server.
+"""
+
+DEFAULT_READ_TIMEOUT = 60.0
+"""
+float:
+    The default number of seconds to wait for the inference server to answer a request.
+"""
+
+
+class InferenceClient:
+    """
+    A pooled, keep-alive HTTP client for a single inference server base URL.
+
+    The underlying session is created lazily, and its connections are warmed on first use so that the first scanned
+    image does not pay for the handshake. The client is safe to share between threads; the pool blocks rather than
+    opening extra connections when every pooled connection is busy (unless `pool_block` is False).
+
+    Properties:
+        base_url (str):
+            The base URL of the inference server.
+
+        pool_size (int):
+            The maximum number of connections kept alive in the pool.
+
+        request_url (str):
+            The URL the requests are sent to (the base URL, or its HTTP form for a UNIX domain socket).
+
+        socket_path (Optional[str]):
+            The path of the UNIX domain socket the requests are sent over, if any.
+
+        timeout (tuple[float, float]):
+            The (connect, read) timeouts, in seconds.
+
+        session (requests.Session):
+            The pooled session (created on first access).
+
+        warmed (bool):
+            Whether the client's connections have been warmed.
+
+    Methods:
+        close():
+            Close the session and release its pooled connections.
+
+        grow_pool(pool_size):
+            Grow the connection pool, without interrupting the requests in flight.
+
+        post(files, payload, **kwargs):
+            Post a multipart body to the inference server and return the raw response.
+
+        infer(files, payload, **kwargs):
+            Post a multipart body to the inference server and return the decoded JSON result.
+
+        warm():
+            Open a connection to the inference server ahead of the first request.
+    """
+
+    def __init__(
+            self,
+            base_url:        Optional[str] = None,
+            pool_size:       int = DEFAULT_POOL_SIZE,
+            connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+            read_timeout:    float = DEFAULT_READ_TIMEOUT,
+            max_retries:     int = 0,
+            pool_block:      bool = True,
+            warm_on_first_use: bool = True
+    ):
+        """
+        The constructor for the InferenceClient class.
+
+        Parameters:
+            base_url (Optional[str]):
+                The base URL of the inference server. Defaults to :data:`DEFAULT_BASE_URL`. A URL of the form
+                `unix:///path/to/socket[:/request/path]` sends the requests over a UNIX domain socket.
+
+            pool_size (int):
+                The maximum number of connections kept alive in the pool.
+
+            connect_timeout (float):
+                The number of seconds to wait for a connection to the inference server.
+
+            read_timeout (float):
+                The number of seconds to wait for the inference server to answer.
+
+            max_retries (int):
+                The number of times a failed connection should be retried.
+
+            pool_block (bool):
+                A flag indicating whether requests should wait for a free pooled connection instead of opening a new,
+                un-pooled one.
+
+            warm_on_first_use (bool):
+                A flag indicating whether the connections should be warmed before the first request.
+
+        Raises:
+            ValueError:
+                If the pool size is not a positive integer, or the UNIX domain socket URL is invalid.
+        """
+        if not isinstance(pool_size, int) or pool_size < 1:
+            raise ValueError(f"Invalid pool size: {pool_size}!")
+
+        self.__base_url = base_url or DEFAULT_BASE_URL
+        self.__socket_path = None
+        self.__request_url = self.__base_url
+
+        if is_unix_url(self.__base_url):
+            self.__socket_path, self.__request_url = parse_unix_url(self.__base_url)
+
+        self.__pool_size = pool_size
+        self.__timeout = (connect_timeout, read_timeout)
+        self.__max_retries = max_retries
+        self.__pool_block = pool_block
+        self.__warm_on_first_use = warm_on_first_use
+
+        self.__lock = Lock()
+        self.__session = None
+        self.__warmed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f'InferenceClient({self.base_url!r}, pool_size={self.pool_size})'
+
+    @property
+    def base_url(self) -> str:
+        """
+        Get the base URL of the inference server.
+
+        Returns:
+            str:
+                The base URL of the inference server.
+        """
+        return self.__base_url
+
+    @property
+    def pool_size(self) -> int:
+        """
+        Get the maximum number of connections kept alive in the pool.
+
+        Returns:
+            int:
+                The pool size.
+        """
+        return self.__pool_size
+
+    @property
+    def request_url(self) -> str:
+        """
+        Get the URL the requests are sent to.
+
+        Returns:
+            str:
+                The base URL, or its HTTP form (such as `http://localhost/infer`) for a UNIX domain socket.
+        """
+        return self.__request_url
+
+    @property
+    def socket_path(self) -> Optional[str]:
+        """
+        Get the path of the UNIX domain socket the requests are sent over.
+
+        Returns:
+            Optional[str]:
+                The socket path, or None if the requests are sent over TCP.
+        """
+        return self.__socket_path
+
+    @property
+    def timeout(self) -> tuple:
+        """
+        Get the (connect, read) timeouts.
+
+        Returns:
+            tuple[float, float]:
+                The connect and read timeouts, in seconds.
+        """
+        return self.__timeout
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Get the pooled session, creating it if needed.
+
+        Returns:
+            requests.Session:
+                The pooled session.
+        """
+        if self.__session is None:
+            with self.__lock:
+                if self.__session is None:
+                    self.__session = self._create_session()
+
+        return self.__session
+
+    @property
+    def warmed(self) -> bool:
+        """
+        Get the warmed status of the client.
+
+        Returns:
+            bool:
+                True if the client's connections have been warmed, False otherwise.
+        """
+        return self.__warmed
+
+    def _create_adapter(self) -> HTTPAdapter:
+        """
+        Create the transport adapter that owns the connection pool.
+
+        Returns:
+            HTTPAdapter:
+                The transport adapter.
+        """
+        if self.socket_path is not None:
+            return UnixSocketAdapter(
+                self.socket_path,
+                pool_connections=1,
+                pool_maxsize=self.pool_size,
+                max_retries=self.__max_retries,
+                pool_block=self.__pool_block
+            )
+
+        return HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=self.__max_retries,
+            pool_block=self.__pool_block
+        )
+
+    def _create_session(self) -> requests.Session:
+        """
+        Create the pooled session.
+
+        Returns:
+            requests.Session:
+                The pooled session.
+        """
+        MOD_LOGGER.debug(f'Creating pooled session for {self.base_url} (pool size: {self.pool_size})')
+        session = requests.Session()
+        adapter = self._create_adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+
+        return session
+
+    def grow_pool(self, pool_size: int):
+        """
+        Grow the connection pool to at least `pool_size` connections, without interrupting the requests in flight.
+
+        If the session exists, a new adapter with the larger pool is mounted on it. Requests in flight finish on the
+        connections of the old adapter, which are dropped once it is released.
+
+        Parameters:
+            pool_size (int):
+                The minimum pool size.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if pool_size <= self.__pool_size:
+                return
+
+            MOD_LOGGER.debug(f'Growing the pool of {self.base_url} from {self.__pool_size} to {pool_size} connections')
+            self.__pool_size = pool_size
+
+            if self.__session is not None:
+                adapter = self._create_adapter()
+                self.__session.mount('http://', adapter)
+                self.__session.mount('https://', adapter)
+
+    def warm(self):
+        """
+        Open a connection to the inference server ahead of the first request.
+
+        The warm-up request is a `HEAD` request; its status is ignored, as only the connection it leaves in the pool
+        matters. Failures are logged and otherwise ignored, so the real request reports any connection errors.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if self.__warmed:
+                return
+
+            self.__warmed = True
+
+        try:
+            self.session.head(self.request_url, timeout=self.timeout).close()
+            MOD_LOGGER.debug(f'Warmed connection to {self.base_url}')
+        except requests.exceptions.RequestException as e:
+            MOD_LOGGER.debug(f'Unable to warm connection to {self.base_url}: {e}')
+
+    def post(self, files=None, payload=None, **kwargs) -> requests.Response:
+        """
+        Post a multipart body to the inference server.
+
+        Parameters:
+            files (Optional[dict]):
+                The multipart files to send, encoded in memory by :mod:`requests`.
+
+            payload (Optional[MultipartPayload]):
+                A streaming multipart body to send instead of `files`.
+
+            **kwargs:
+                Additional keyword arguments passed to :meth:`requests.Session.post`.
+
+        Returns:
+            requests.Response:
+                The response of the inference server.
+        """
+        if self.__warm_on_first_use and not self.__warmed:
+            self.warm()
+
+        kwargs.setdefault('timeout', self.timeout)
+
+        if payload is not None:
+            headers = {**kwargs.pop('headers', {}), 'Content-Type': payload.content_type}
+            return self.session.post(self.request_url, data=payload, headers=headers, **kwargs)
+
+        return self.session.post(self.request_url, files=files, **kwargs)
+
+    def infer(self, files=None, payload=None, **kwargs) -> dict:
+        """
+        Post a multipart body to the inference server and decode the result.
+
+        Parameters:
+            files (Optional[dict]):
+                The multipart files to send, encoded in memory by :mod:`requests`.
+
+            payload (Optional[MultipartPayload]):
+                A streaming multipart body to send instead of `files`.
+
+            **kwargs:
+                Additional keyword arguments passed to :meth:`post`.
+
+        Returns:
+            dict:
+                The decoded result of the request.
+
+        Raises:
+            requests.exceptions.HTTPError:
+                If the request was unsuccessful.
+        """
+        response = self.post(files=files, payload=payload, **kwargs)
+        response.raise_for_status()
+
+        return response.json()
+
+    def close(self):
+        """
+        Close the session and release its pooled connections.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+            self.__warmed = False
+
+
+_CLIENTS = {}
+_CLIENT_SETTINGS = {}
+_CLIENTS_LOCK = Lock()
+
+
+def _default_settings(*classes) -> dict:
+    """
+    Get the default keyword arguments of the constructors of classes, the later classes overriding the earlier ones.
+    """
+    return {
+        name: parameter.default
+        for cls in classes
+        for name, parameter in inspect.signature(cls).parameters.items()
+        if parameter.default is not parameter.empty
+    }
+
+
+def get_client(
+        base_url: Optional[Union[str, Sequence[str]]] = None,
+        pool_size: Optional[int] = None,
+        **kwargs
+) -> InferenceClient:
+    """
+    Get the shared client for a base URL, creating it if needed.
+
+    If a shared client already exists but its pool is smaller than `pool_size`, its pool is grown in place, so the
+    callers already using it are not interrupted.
+
+    Parameters:
+        base_url (Optional[Union[str, Sequence[str]]]):
+            The base URL of the inference server. Defaults to :data:`DEFAULT_BASE_URL`. If several base URLs are
+            given, a shared :class:`~pic_scanner.api.endpoints.EndpointPool` balancing requests across them is
+            returned instead.
+
+        pool_size (Optional[int]):
+            The minimum pool size the client should have.
+
+        **kwargs:
+            Additional keyword arguments passed to :class:`InferenceClient` (or
+            :class:`~pic_scanner.api.endpoints.EndpointPool`) when a new client is created. If the shared client already
+            exists, they must match the settings it was created with.
+
+    Returns:
+        Union[InferenceClient, EndpointPool]:
+            The shared client.
+
+    Raises:
+        ValueError:
+            If the shared client already exists with settings other than `kwargs`.
+    """
+    base_url = base_url or DEFAULT_BASE_URL
+
+    if not isinstance(base_url, str):
+        base_url = tuple(dict.fromkeys(base_url))
+
+        if len(base_url) == 1:
+            base_url = base_url[0]
+
+    from pic_scanner.api.endpoints import EndpointPool
+
+    classes = (InferenceClient, EndpointPool) if isinstance(base_url, tuple) else (InferenceClient,)
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(base_url)
+
+        if client is None:
+            client = classes[-1](base_url, pool_size=pool_size or DEFAULT_POOL_SIZE, **kwargs)
+            _CLIENTS[base_url] = client
+            _CLIENT_SETTINGS[base_url] = kwargs
+
+            return client
+
+        settings = {**_default_settings(*classes), **_CLIENT_SETTINGS[base_url]}
+        conflicts = {name: value for name, value in kwargs.items() if name not in settings or settings[name] != value}
+
+        if conflicts:
+            raise ValueError(f"The shared client for {base_url} was created with other settings than {conflicts}; "
+                             f"close the shared clients first, or create a client of your own!")
+
+        if pool_size and client.pool_size < pool_size:
+            client.grow_pool(pool_size)
+
+    return client
+
+
+def close_clients():
+    """
+    Close every shared client.
+
+    Returns:
+        None
+    """
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+
+        _CLIENTS.clear()
+        _CLIENT_SETTINGS.clear()
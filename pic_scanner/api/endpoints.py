@@ -0,0 +1,583 @@
+"""
+endpoints.py
+
+This module provides client-side load balancing across several inference server replicas.
+
+An :class:`EndpointPool` holds one pooled :class:`~pic_scanner.api.client.InferenceClient` per endpoint and sends each
+request to the healthy endpoint with the fewest outstanding requests (or with the lowest latency average). An endpoint
+that fails several requests in a row is ejected and re-probed in the background until it answers again. The pool has
+the same `post`/`infer` interface as a single client, so it can be passed anywhere a client is accepted, and
+:func:`pic_scanner.api.client.get_client` returns a shared pool when given a list of base URLs.
+
+Classes:
+    Endpoint:
+        The state and statistics of one inference server endpoint.
+
+    EndpointPool:
+        A load-balancing pool of inference server endpoints.
+
+
+Since:
+    1.0
+"""
+from contextlib import contextmanager
+from threading import Event, Lock, Thread, current_thread
+from time import monotonic, perf_counter
+
+import requests
+
+from pic_scanner.api import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.api.client import InferenceClient, DEFAULT_POOL_SIZE
+
+
+__all__ = [
+    'Endpoint',
+    'EndpointPool',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('endpoints')
+
+
+STRATEGIES = ('least_outstanding', 'lowest_latency')
+"""
+tuple[str]:
+    The strategies an :class:`EndpointPool` can choose endpoints by.
+"""
+
+
+class Endpoint:
+    """
+    The state and statistics of one inference server endpoint.
+
+    Properties:
+        client (InferenceClient):
+            The pooled client of the endpoint.
+
+        healthy (bool):
+            Whether the endpoint currently receives requests.
+
+        url (str):
+            The base URL of the endpoint.
+
+    Attributes:
+        outstanding (int):
+            The number of requests currently in flight to the endpoint.
+
+        latency (Optional[float]):
+            The exponentially weighted average latency of the endpoint's successful requests, in seconds.
+
+        consecutive_failures (int):
+            The number of requests that failed in a row.
+
+        completed (int):
+            The number of successful requests.
+
+        errors (int):
+            The number of failed requests.
+    """
+
+    def __init__(self, client: InferenceClient):
+        """
+        The constructor for the Endpoint class.
+
+        Parameters:
+            client (InferenceClient):
+                The pooled client of the endpoint.
+        """
+        self.__client = client
+        self.__healthy = True
+
+        self.outstanding = 0
+        self.latency = None
+        self.consecutive_failures = 0
+        self.completed = 0
+        self.errors = 0
+        self.first_used = None
+        self.last_used = None
+
+    def __repr__(self):
+        return f'Endpoint({self.url!r}, healthy={self.healthy}, outstanding={self.outstanding})'
+
+    @property
+    def client(self) -> InferenceClient:
+        """
+        Get the pooled client of the endpoint.
+
+        Returns:
+            InferenceClient:
+                The pooled client.
+        """
+        return self.__client
+
+    @property
+    def healthy(self) -> bool:
+        """
+        Get the health status of the endpoint.
+
+        Returns:
+            bool:
+                True if the endpoint receives requests, False if it has been ejected.
+        """
+        return self.__healthy
+
+    @healthy.setter
+    def healthy(self, value: bool):
+        self.__healthy = value
+
+    @property
+    def url(self) -> str:
+        """
+        Get the base URL of the endpoint.
+
+        Returns:
+            str:
+                The base URL.
+        """
+        return self.__client.base_url
+
+    @property
+    def throughput(self) -> float:
+        """
+        Get the average number of successful requests per second since the endpoint was first used.
+
+        Returns:
+            float:
+                The throughput, in requests per second.
+        """
+        if self.first_used is None or self.last_used is None or self.last_used <= self.first_used:
+            return 0.0
+
+        return self.completed / (self.last_used - self.first_used)
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the endpoint.
+
+        Returns:
+            dict:
+                The URL, health, outstanding requests, completed and failed requests, average latency and throughput.
+        """
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'completed': self.completed,
+            'errors': self.errors,
+            'latency': self.latency,
+            'throughput': self.throughput,
+        }
+
+
+class EndpointPool:
+    """
+    A load-balancing pool of inference server endpoints.
+
+    Properties:
+        base_url (tuple[str]):
+            The base URLs of the endpoints.
+
+        endpoints (list[Endpoint]):
+            The endpoints of the pool.
+
+        pool_size (int):
+            The connection pool size of each endpoint's client.
+
+    Methods:
+        choose():
+            Choose the endpoint the next request should go to.
+
+        close():
+            Stop the background probe and close every endpoint's client.
+
+        grow_pool(pool_size):
+            Grow the connection pool of every endpoint's client.
+
+        infer(files, payload, **kwargs):
+            Send a request to the best endpoint and decode the result.
+
+        post(files, payload, **kwargs):
+            Send a request to the best endpoint and return the raw response, whatever its status; a server error
+            (5xx) still counts as a failure of the endpoint.
+
+        stats():
+            Get the statistics of every endpoint.
+
+        track(endpoint):
+            Context manager that records the outcome of a request made to an endpoint.
+    """
+
+    def __init__(
+            self,
+            base_urls:      list[str],
+            pool_size:      int = DEFAULT_POOL_SIZE,
+            strategy:       str = 'least_outstanding',
+            max_failures:   int = 3,
+            probe_interval: float = 5.0,
+            smoothing:      float = 0.2,
+            retries:        int = 1,
+            **client_kwargs
+    ):
+        """
+        The constructor for the EndpointPool class.
+
+        Parameters:
+            base_urls (list[str]):
+                The base URLs of the inference server replicas.
+
+            pool_size (int):
+                The connection pool size of each endpoint's client.
+
+            strategy (str):
+                How endpoints are chosen: 'least_outstanding' (fewest requests in flight, then lowest latency) or
+                'lowest_latency' (lowest latency average, then fewest requests in flight).
+
+            max_failures (int):
+                The number of consecutive failures after which an endpoint is ejected.
+
+            probe_interval (float):
+                The number of seconds between background probes of ejected endpoints.
+
+            smoothing (float):
+                The weight of the newest sample in each endpoint's latency average.
+
+            retries (int):
+                The number of times a request that could not reach an endpoint is retried on another one. Only
+                streaming payloads are retried, as they can be rewound.
+
+            **client_kwargs:
+                Additional keyword arguments passed to each endpoint's :class:`InferenceClient`.
+
+        Raises:
+            ValueError:
+                If no base URL or an unknown strategy is given.
+        """
+        if not base_urls:
+            raise ValueError('At least one base URL is required!')
+
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Invalid strategy: {strategy}! Must be one of {STRATEGIES}.")
+
+        self.__endpoints = [
+            Endpoint(InferenceClient(url, pool_size=pool_size, **client_kwargs))
+            for url in dict.fromkeys(base_urls)
+        ]
+        self.__pool_size = pool_size
+        self.__strategy = strategy
+        self.__max_failures = max_failures
+        self.__probe_interval = probe_interval
+        self.__smoothing = smoothing
+        self.__retries = retries
+
+        self.__lock = Lock()
+        self.__stop = Event()
+        self.__prober = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f'EndpointPool({list(self.base_url)!r}, strategy={self.__strategy!r})'
+
+    @property
+    def base_url(self) -> tuple:
+        """
+        Get the base URLs of the endpoints.
+
+        Returns:
+            tuple[str]:
+                The base URLs.
+        """
+        return tuple(endpoint.url for endpoint in self.__endpoints)
+
+    @property
+    def endpoints(self) -> list[Endpoint]:
+        """
+        Get the endpoints of the pool.
+
+        Returns:
+            list[Endpoint]:
+                The endpoints.
+        """
+        return list(self.__endpoints)
+
+    @property
+    def pool_size(self) -> int:
+        """
+        Get the connection pool size of each endpoint's client.
+
+        Returns:
+            int:
+                The pool size.
+        """
+        return self.__pool_size
+
+    def grow_pool(self, pool_size: int):
+        """
+        Grow the connection pool of every endpoint's client to at least `pool_size` connections, without interrupting
+        the requests in flight (see :meth:`InferenceClient.grow_pool`).
+
+        Parameters:
+            pool_size (int):
+                The minimum pool size.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            self.__pool_size = max(self.__pool_size, pool_size)
+
+        for endpoint in self.__endpoints:
+            endpoint.client.grow_pool(pool_size)
+
+    def __rank(self, endpoint: Endpoint) -> tuple:
+        latency = endpoint.latency if endpoint.latency is not None else 0.0
+
+        if self.__strategy == 'lowest_latency':
+            return latency, endpoint.outstanding
+
+        return endpoint.outstanding, latency
+
+    def choose(self, exclude: tuple = ()) -> Endpoint:
+        """
+        Choose the endpoint the next request should go to.
+
+        If every endpoint has been ejected, the pool fails open and chooses among all of them, so a scan slows down
+        rather than failing outright while the replicas recover.
+
+        Parameters:
+            exclude (tuple[Endpoint]):
+                Endpoints that should not be chosen, if any other is available.
+
+        Returns:
+            Endpoint:
+                The chosen endpoint.
+        """
+        with self.__lock:
+            candidates = [e for e in self.__endpoints if e.healthy and e not in exclude]
+
+            if not candidates:
+                candidates = [e for e in self.__endpoints if e not in exclude] or self.__endpoints
+
+            return min(candidates, key=self.__rank)
+
+    @contextmanager
+    def track(self, endpoint: Endpoint):
+        """
+        Record the outcome of a request made to an endpoint inside the context.
+
+        A request is recorded as failed if the context exits with a :class:`requests.exceptions.ConnectionError`,
+        a :class:`requests.exceptions.Timeout` or a server error (5xx) response.
+
+        Parameters:
+            endpoint (Endpoint):
+                The endpoint the request is made to.
+
+        Yields:
+            Endpoint:
+                The endpoint.
+        """
+        with self.__lock:
+            endpoint.outstanding += 1
+
+            if endpoint.first_used is None:
+                endpoint.first_used = monotonic()
+
+        start = perf_counter()
+        success = False
+
+        try:
+            yield endpoint
+            success = True
+        except requests.exceptions.HTTPError as e:
+            success = e.response is not None and e.response.status_code < 500
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            raise
+        except Exception:
+            # Anything else (a bad file, a malformed body) is not the endpoint's fault.
+            success = True
+            raise
+        finally:
+            self.__record(endpoint, perf_counter() - start, success)
+
+    def __record(self, endpoint: Endpoint, latency: float, success: bool):
+        eject = False
+
+        with self.__lock:
+            endpoint.outstanding -= 1
+            endpoint.last_used = monotonic()
+
+            if success:
+                endpoint.completed += 1
+                endpoint.consecutive_failures = 0
+
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += self.__smoothing * (latency - endpoint.latency)
+            else:
+                endpoint.errors += 1
+                endpoint.consecutive_failures += 1
+
+                if endpoint.healthy and endpoint.consecutive_failures >= self.__max_failures:
+                    endpoint.healthy = False
+                    eject = True
+
+        if eject:
+            MOD_LOGGER.warning(f'Ejecting inference endpoint {endpoint.url} after '
+                               f'{endpoint.consecutive_failures} consecutive failures.')
+            self.__start_prober()
+
+    def __start_prober(self):
+        with self.__lock:
+            if self.__prober is not None:
+                return
+
+            self.__prober = Thread(target=self.__probe_loop, args=(self.__stop,), name='EndpointProber', daemon=True)
+            self.__prober.start()
+
+    def __probe_loop(self, stop: Event):
+        while not stop.wait(self.__probe_interval):
+            with self.__lock:
+                ejected = [endpoint for endpoint in self.__endpoints if not endpoint.healthy]
+
+                # Under the lock, so an endpoint ejected as the prober exits starts a new one rather than being missed.
+                # A prober stopped by `close` has already been replaced, and leaves its successor alone.
+                if not ejected:
+                    if self.__prober is current_thread():
+                        self.__prober = None
+
+                    return
+
+            for endpoint in ejected:
+                if self.__probe(endpoint):
+                    MOD_LOGGER.info(f'Inference endpoint {endpoint.url} is answering again; restoring it.')
+
+                    with self.__lock:
+                        endpoint.consecutive_failures = 0
+                        endpoint.healthy = True
+
+    def __probe(self, endpoint: Endpoint) -> bool:
+        try:
+            response = endpoint.client.session.head(endpoint.client.request_url, timeout=endpoint.client.timeout)
+            response.close()
+        except requests.exceptions.RequestException:
+            return False
+
+        # Any answer short of a server error (a 405 for HEAD on the inference route included) means the server is up.
+        return response.status_code < 500
+
+    def post(self, files=None, payload=None, **kwargs) -> requests.Response:
+        """
+        Send a request to the best endpoint and return the raw response.
+
+        The response is returned whatever its status, but a server error (5xx) counts as a failure of the endpoint.
+
+        Parameters:
+            files (Optional[dict]):
+                The multipart files to send.
+
+            payload (Optional[MultipartPayload]):
+                A streaming multipart body to send instead of `files`.
+
+            **kwargs:
+                Additional keyword arguments passed to :meth:`InferenceClient.post`.
+
+        Returns:
+            requests.Response:
+                The response of the endpoint.
+        """
+        return self.__send(lambda client: client.post(files=files, payload=payload, **kwargs), payload, raw=True)
+
+    def infer(self, files=None, payload=None, **kwargs) -> dict:
+        """
+        Send a request to the best endpoint and decode the result.
+
+        Parameters:
+            files (Optional[dict]):
+                The multipart files to send.
+
+            payload (Optional[MultipartPayload]):
+                A streaming multipart body to send instead of `files`.
+
+            **kwargs:
+                Additional keyword arguments passed to :meth:`InferenceClient.post`.
+
+        Returns:
+            dict:
+                The decoded result of the request.
+
+        Raises:
+            requests.exceptions.HTTPError:
+                If the request was unsuccessful.
+        """
+        return self.__send(lambda client: client.infer(files=files, payload=payload, **kwargs), payload)
+
+    def __send(self, request, payload, raw=False):
+        tried = ()
+        attempts = 1 + (self.__retries if payload is not None else 0)
+
+        for attempt in range(attempts):
+            endpoint = self.choose(exclude=tried)
+            response = None
+
+            try:
+                with self.track(endpoint):
+                    response = request(endpoint.client)
+
+                    # A raw response is returned whatever its status, but a server error still counts against the
+                    # endpoint.
+                    if raw and response.status_code >= 500:
+                        raise requests.exceptions.HTTPError(response=response)
+
+                    return response
+            except requests.exceptions.HTTPError as e:
+                if raw and response is not None and e.response is response:
+                    return response
+
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt + 1 >= attempts:
+                    raise
+
+                MOD_LOGGER.debug(f'Request to {endpoint.url} failed ({e}); retrying on another endpoint.')
+                payload.seek(0)
+                tried += (endpoint,)
+
+    def stats(self) -> list[dict]:
+        """
+        Get the statistics of every endpoint.
+
+        Returns:
+            list[dict]:
+                The statistics of each endpoint (see :meth:`Endpoint.stats`).
+        """
+        with self.__lock:
+            return [endpoint.stats() for endpoint in self.__endpoints]
+
+    def close(self):
+        """
+        Stop the background probe and close every endpoint's client.
+
+        The pool is reset rather than disabled: ejected endpoints are restored, and a pool still used afterwards (its
+        clients reopen their sessions on the next request) ejects and probes them afresh.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            stop, self.__stop = self.__stop, Event()
+            self.__prober = None
+
+            for endpoint in self.__endpoints:
+                endpoint.consecutive_failures = 0
+                endpoint.healthy = True
+
+        stop.set()
+
+        for endpoint in self.__endpoints:
+            endpoint.client.close()
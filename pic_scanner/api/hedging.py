@@ -0,0 +1,347 @@
+"""
+hedging.py
+
+This module provides hedged requests, to keep a slow reply (a garbage collection pause or a slow batch on the
+inference server) from stalling a scan.
+
+A :class:`HedgedClient` wraps a client (an :class:`~pic_scanner.api.client.InferenceClient` or an
+:class:`~pic_scanner.api.endpoints.EndpointPool`). If a request has not been answered within a percentile of the recent
+latencies, a duplicate is sent and whichever reply arrives first is used. When the wrapped client is an endpoint pool,
+the duplicate usually goes to another endpoint, as the first one has a request outstanding. Duplicates are limited by a
+global budget, a fraction of the primary requests, so a struggling server is not hit with twice the load.
+
+Classes:
+    HedgedClient:
+        A client wrapper that hedges slow requests.
+
+
+Since:
+    1.0
+"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from time import perf_counter
+from typing import Optional
+
+from pic_scanner.api import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'HedgedClient',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('hedging')
+
+
+class HedgedClient:
+    """
+    A client wrapper that hedges slow requests.
+
+    Only streaming payloads are hedged, as they can be copied and sent twice; requests made with `files` are sent once.
+    A blocking HTTP request cannot be interrupted, so the losing request is cancelled if it has not started yet and
+    otherwise left to finish in the background, its reply discarded.
+
+    Properties:
+        base_url (Union[str, tuple[str]]):
+            The base URL(s) of the wrapped client.
+
+        client (Union[InferenceClient, EndpointPool]):
+            The wrapped client.
+
+        pool_size (int):
+            The connection pool size of the wrapped client.
+
+        threshold (Optional[float]):
+            The current hedging delay, in seconds, or None until enough latencies have been recorded.
+
+    Methods:
+        close():
+            Stop the hedging threads.
+
+        infer(files, payload, **kwargs):
+            Send a request, hedging it if it is slow, and decode the result.
+
+        post(files, payload, **kwargs):
+            Send a request, hedging it if it is slow, and return the response.
+
+        stats():
+            Get the hedging statistics.
+    """
+
+    def __init__(
+            self,
+            client,
+            percentile:  float = 0.95,
+            budget:      float = 0.05,
+            window:      int = 1000,
+            min_samples: int = 50,
+            min_delay:   float = 0.0,
+            max_workers: Optional[int] = None,
+    ):
+        """
+        The constructor for the HedgedClient class.
+
+        Parameters:
+            client (Union[InferenceClient, EndpointPool]):
+                The client to send the requests with.
+
+            percentile (float):
+                The percentile of the recent latencies after which a duplicate request is sent (between 0 and 1).
+
+            budget (float):
+                The maximum number of duplicate requests, as a fraction of the primary requests.
+
+            window (int):
+                The number of recent latencies the percentile is computed over.
+
+            min_samples (int):
+                The number of latencies to record before any request is hedged.
+
+            min_delay (float):
+                The shortest hedging delay, in seconds.
+
+            max_workers (Optional[int]):
+                The number of threads sending requests. Defaults to twice the wrapped client's pool size, so every
+                pooled connection can carry a primary and a duplicate request.
+
+        Raises:
+            ValueError:
+                If the percentile or budget is invalid.
+        """
+        if not 0 < percentile < 1:
+            raise ValueError(f"Invalid hedging percentile: {percentile}!")
+
+        if not 0 <= budget <= 1:
+            raise ValueError(f"Invalid hedging budget: {budget}!")
+
+        self.__client = client
+        self.__percentile = percentile
+        self.__budget = budget
+        self.__min_samples = max(1, min_samples)
+        self.__min_delay = min_delay
+
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers or 2 * client.pool_size,
+            thread_name_prefix='HedgedRequest'
+        )
+
+        self.__lock = Lock()
+        self.__latencies = deque(maxlen=window)
+        self.__threshold = None
+        self.__since_update = 0
+
+        # Each primary request earns `budget` tokens, and each duplicate spends one. The balance is capped, so a long
+        # run of fast requests cannot save up a burst of duplicates.
+        self.__tokens = 0.0
+        self.__max_tokens = max(1.0, budget * window / 10)
+
+        self.__requests = 0
+        self.__hedged = 0
+        self.__hedge_wins = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f'HedgedClient({self.__client!r}, percentile={self.__percentile}, budget={self.__budget})'
+
+    @property
+    def base_url(self):
+        """
+        Get the base URL(s) of the wrapped client.
+
+        Returns:
+            Union[str, tuple[str]]:
+                The base URL(s).
+        """
+        return self.__client.base_url
+
+    @property
+    def client(self):
+        """
+        Get the wrapped client.
+
+        Returns:
+            Union[InferenceClient, EndpointPool]:
+                The wrapped client.
+        """
+        return self.__client
+
+    @property
+    def pool_size(self) -> int:
+        """
+        Get the connection pool size of the wrapped client.
+
+        Returns:
+            int:
+                The pool size.
+        """
+        return self.__client.pool_size
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """
+        Get the current hedging delay.
+
+        Returns:
+            Optional[float]:
+                The delay, in seconds, or None until `min_samples` latencies have been recorded.
+        """
+        return self.__threshold
+
+    def __record(self, latency: float):
+        with self.__lock:
+            self.__latencies.append(latency)
+            self.__since_update += 1
+
+            if len(self.__latencies) < self.__min_samples:
+                return
+
+            # Sorting the window on every request would dominate at high request rates; refresh periodically instead.
+            if self.__threshold is None or self.__since_update >= max(1, len(self.__latencies) // 20):
+                ordered = sorted(self.__latencies)
+                index = min(len(ordered) - 1, int(self.__percentile * len(ordered)))
+                self.__threshold = max(self.__min_delay, ordered[index])
+                self.__since_update = 0
+
+    def __take_token(self) -> bool:
+        with self.__lock:
+            if self.__tokens < 1:
+                return False
+
+            self.__tokens -= 1
+            self.__hedged += 1
+
+            return True
+
+    def __send(self, method: str, payload, kwargs):
+        start = perf_counter()
+
+        try:
+            return getattr(self.__client, method)(payload=payload, **kwargs)
+        finally:
+            payload.close()
+            self.__record(perf_counter() - start)
+
+    def __request(self, method: str, files, payload, kwargs):
+        """
+        Send a request with a method of the wrapped client ('infer' or 'post'), hedging it if it is slow.
+        """
+        with self.__lock:
+            self.__requests += 1
+            self.__tokens = min(self.__max_tokens, self.__tokens + self.__budget)
+            threshold = self.__threshold
+
+        if payload is None:
+            start = perf_counter()
+            result = getattr(self.__client, method)(files=files, **kwargs)
+            self.__record(perf_counter() - start)
+
+            return result
+
+        primary = self.__executor.submit(self.__send, method, payload.copy(), kwargs)
+
+        if threshold is None or not wait([primary], timeout=threshold).not_done or not self.__take_token():
+            return primary.result()
+
+        MOD_LOGGER.debug(f'No reply after {threshold:.3f}s; sending a hedged request.')
+        hedge = self.__executor.submit(self.__send, method, payload.copy(), kwargs)
+        pending = {primary, hedge}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+
+                    if future is hedge:
+                        with self.__lock:
+                            self.__hedge_wins += 1
+
+                    return future.result()
+
+        return primary.result()
+
+    def infer(self, files=None, payload=None, **kwargs) -> dict:
+        """
+        Send a request, hedging it if it is slow, and decode the result.
+
+        Parameters:
+            files (Optional[dict]):
+                The multipart files to send. Requests made with `files` are not hedged.
+
+            payload (Optional[MultipartPayload]):
+                A streaming multipart body to send instead of `files`.
+
+            **kwargs:
+                Additional keyword arguments passed to the wrapped client's `infer` method.
+
+        Returns:
+            dict:
+                The decoded result of the first successful reply.
+
+        Raises:
+            requests.exceptions.RequestException:
+                If every request sent failed; the error of the primary request is raised.
+        """
+        return self.__request('infer', files, payload, kwargs)
+
+    def post(self, files=None, payload=None, **kwargs):
+        """
+        Send a request, hedging it if it is slow, and return the response of the first reply.
+
+        Unlike :meth:`infer`, an error status is a reply like any other: it is returned, not retried on the duplicate.
+
+        Parameters:
+            files (Optional[dict]):
+                The multipart files to send. Requests made with `files` are not hedged.
+
+            payload (Optional[MultipartPayload]):
+                A streaming multipart body to send instead of `files`.
+
+            **kwargs:
+                Additional keyword arguments passed to the wrapped client's `post` method.
+
+        Returns:
+            requests.Response:
+                The response of the first request to complete.
+
+        Raises:
+            requests.exceptions.RequestException:
+                If every request sent failed; the error of the primary request is raised.
+        """
+        return self.__request('post', files, payload, kwargs)
+
+    def stats(self) -> dict:
+        """
+        Get the hedging statistics.
+
+        Returns:
+            dict:
+                The number of requests, the number of duplicate requests sent, how many of them answered first, the
+                fraction of requests hedged and the current hedging delay.
+        """
+        with self.__lock:
+            return {
+                'requests': self.__requests,
+                'hedged': self.__hedged,
+                'hedge_wins': self.__hedge_wins,
+                'hedge_rate': self.__hedged / self.__requests if self.__requests else 0.0,
+                'threshold': self.__threshold,
+            }
+
+    def close(self):
+        """
+        Stop the hedging threads. The wrapped client is left open, as it is usually shared.
+
+        Returns:
+            None
+        """
+        self.__executor.shutdown(wait=False, cancel_futures=True)
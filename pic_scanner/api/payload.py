@@ -0,0 +1,454 @@
+"""
+payload.py
+
+This module provides a context-managed, streaming `multipart/form-data` request body.
+
+A :class:`MultipartPayload` never holds more than one open file at a time: each file is opened when the body is read up
+to it, streamed in fixed-size chunks (or through a read-only memory map) and closed as soon as it has been sent. The total
+length is computed up front from the file sizes, so the request is sent with a `Content-Length` header rather than
+chunked transfer encoding. Buffers that are already in memory (for example, bytes that were read to hash the file) are
+streamed as zero-copy :class:`memoryview` slices.
+
+Classes:
+    MultipartPayload:
+        A streaming `multipart/form-data` request body.
+
+
+Since:
+    1.0
+"""
+import mmap
+import os
+from pathlib import Path
+from typing import Optional, Union
+from uuid import uuid4
+
+
+__all__ = [
+    'DEFAULT_CHUNK_SIZE',
+    'MultipartPayload',
+]
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+"""
+int:
+    The default number of bytes read from a file at a time.
+"""
+
+
+class _FileSegment:
+    """
+    A file that is opened only while its bytes are being read.
+    """
+
+    def __init__(self, path: Path, size: int, chunk_size: int, use_mmap: bool):
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap and size > 0
+        self.__handle = None
+        self.__map = None
+
+    def read(self, offset: int, size: int) -> bytes:
+        size = min(size, self.chunk_size, self.size - offset)
+
+        if self.use_mmap:
+            if self.__map is None:
+                with open(self.path, 'rb') as f:
+                    # The map keeps its own duplicate of the descriptor, so the file itself can be closed right away.
+                    self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            # Reading a page past the end of a file that shrank since it was mapped raises SIGBUS, not an exception.
+            if self.__map.size() < self.size:
+                self.__shrunk()
+
+            return self.__map[offset:offset + size]
+
+        if self.__handle is None:
+            self.__handle = open(self.path, 'rb')
+
+        if self.__handle.tell() != offset:
+            self.__handle.seek(offset)
+
+        chunk = self.__handle.read(size)
+
+        if len(chunk) < size:
+            self.__shrunk()
+
+        return chunk
+
+    def __shrunk(self):
+        self.close()
+
+        raise OSError(f'The file {self.path} is smaller than the {self.size} bytes it had when it was added!')
+
+    def close(self):
+        if self.__handle is not None:
+            self.__handle.close()
+            self.__handle = None
+
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+
+class MultipartPayload:
+    """
+    A streaming `multipart/form-data` request body.
+
+    The payload is a read-only, seekable file-like object (so it can be handed to :mod:`requests` as `data`) and a
+    context manager; leaving the context closes any file that is still open.
+
+    Properties:
+        boundary (str):
+            The multipart boundary.
+
+        content_type (str):
+            The value of the `Content-Type` header of the request.
+
+        field_names (list[str]):
+            The names of the fields added to the payload.
+
+    Methods:
+        add_file(field_name, image_path, data, filename, content_type):
+            Add a file field, backed by a path on disk or by a buffer already in memory.
+
+        close():
+            Close any file that is still open.
+
+        copy():
+            Create an independent payload with the same fields.
+
+        read(size):
+            Read the next bytes of the body.
+
+        seek(offset, whence):
+            Move to a position of the body (used when a request is retried).
+
+        tell():
+            Get the current position in the body.
+
+    Examples:
+        >>> with MultipartPayload() as payload:
+        ...     payload.add_file('f1', Path('image.jpg'))
+        ...     response = session.post(url, data=payload, headers={'Content-Type': payload.content_type})
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, use_mmap: bool = False, boundary: Optional[str] = None):
+        """
+        The constructor for the MultipartPayload class.
+
+        Parameters:
+            chunk_size (int):
+                The maximum number of bytes read from a file at a time.
+
+            use_mmap (bool):
+                A flag indicating whether files should be streamed through a read-only memory map instead of buffered
+                reads.
+
+            boundary (Optional[str]):
+                The multipart boundary. A random boundary is used if not given.
+        """
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError(f"Invalid chunk size: {chunk_size}!")
+
+        self.__boundary = boundary or uuid4().hex
+        self.__chunk_size = chunk_size
+        self.__use_mmap = use_mmap
+        self.__field_names = []
+        self.__segments = []
+        self.__length = 0
+        self.__closed = False
+
+        # The closing boundary is kept as the last segment, and new fields are inserted before it.
+        self.__append(f'--{self.__boundary}--\r\n'.encode())
+
+        self.__position = 0
+        self.__index = 0
+        self.__offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        while chunk := self.read(self.__chunk_size):
+            yield chunk
+
+    def __len__(self):
+        return self.__length
+
+    def __repr__(self):
+        return f'MultipartPayload(fields={self.field_names}, length={len(self)})'
+
+    @property
+    def boundary(self) -> str:
+        """
+        Get the multipart boundary.
+
+        Returns:
+            str:
+                The multipart boundary.
+        """
+        return self.__boundary
+
+    @property
+    def content_type(self) -> str:
+        """
+        Get the value of the `Content-Type` header of the request.
+
+        Returns:
+            str:
+                The content type, including the boundary.
+        """
+        return f'multipart/form-data; boundary={self.__boundary}'
+
+    @property
+    def field_names(self) -> list[str]:
+        """
+        Get the names of the fields added to the payload.
+
+        Returns:
+            list[str]:
+                The field names, in the order they were added.
+        """
+        return list(self.__field_names)
+
+    def __append(self, segment, size: Optional[int] = None, before_closing: bool = False):
+        size = len(segment) if size is None else size
+
+        if before_closing:
+            self.__segments.insert(len(self.__segments) - 1, (segment, size))
+        else:
+            self.__segments.append((segment, size))
+
+        self.__length += size
+
+    def add_file(
+            self,
+            field_name: str,
+            image_path: Optional[Union[str, Path]] = None,
+            data: Optional[Union[bytes, bytearray, memoryview]] = None,
+            filename: Optional[str] = None,
+            content_type: str = 'application/octet-stream'
+    ):
+        """
+        Add a file field to the payload.
+
+        Exactly one of `image_path` and `data` must be given. A path is stat-ed now but only opened while the body is
+        read; a buffer is streamed as zero-copy slices.
+
+        Parameters:
+            field_name (str):
+                The name of the field.
+
+            image_path (Optional[Union[str, Path]]):
+                The path of the file to stream.
+
+            data (Optional[Union[bytes, bytearray, memoryview]]):
+                The bytes of the file, if they are already in memory.
+
+            filename (Optional[str]):
+                The filename sent with the field. Defaults to the name of `image_path`, or to `field_name`.
+
+            content_type (str):
+                The content type of the field.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError:
+                If neither or both of `image_path` and `data` are given, or if the body has already been read.
+
+            FileNotFoundError:
+                If the file does not exist.
+        """
+        if (image_path is None) == (data is None):
+            raise ValueError('Exactly one of `image_path` and `data` must be given!')
+
+        if self.__position:
+            raise ValueError('Cannot add a field to a payload that has already been read!')
+
+        if image_path is not None:
+            image_path = Path(image_path)
+            segment = _FileSegment(image_path, os.stat(image_path).st_size, self.__chunk_size, self.__use_mmap)
+            size = segment.size
+            filename = filename or image_path.name
+        else:
+            segment = memoryview(data).cast('B')
+            size = len(segment)
+            filename = filename or field_name
+
+        header = (
+            f'--{self.__boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode()
+
+        self.__append(header, before_closing=True)
+        self.__append(segment, size, before_closing=True)
+        self.__append(b'\r\n', before_closing=True)
+        self.__field_names.append(field_name)
+
+    def copy(self) -> 'MultipartPayload':
+        """
+        Create an independent payload with the same fields and boundary.
+
+        The copy has its own read position and opens its own files, so both payloads can be sent at the same time (for
+        example, when a request is hedged). Buffers in memory are shared, not copied.
+
+        Returns:
+            MultipartPayload:
+                The copy, positioned at the start of the body.
+        """
+        clone = MultipartPayload(chunk_size=self.__chunk_size, use_mmap=self.__use_mmap, boundary=self.__boundary)
+        clone.__segments = [
+            (_FileSegment(segment.path, segment.size, segment.chunk_size, segment.use_mmap), size)
+            if isinstance(segment, _FileSegment) else (segment, size)
+            for segment, size in self.__segments
+        ]
+        clone.__length = self.__length
+        clone.__field_names = list(self.__field_names)
+
+        return clone
+
+    def read(self, size: int = -1) -> Union[bytes, memoryview]:
+        """
+        Read the next bytes of the body.
+
+        Parameters:
+            size (int):
+                The maximum number of bytes to read. Reads the rest of the body if negative.
+
+        Returns:
+            Union[bytes, memoryview]:
+                The bytes read; empty once the body has been fully read.
+
+        Raises:
+            ValueError:
+                If the payload has been closed.
+
+            OSError:
+                If a file is smaller than it was when it was added.
+        """
+        if self.__closed:
+            raise ValueError('I/O operation on a closed payload!')
+
+        if size is None or size < 0:
+            size = self.__length - self.__position
+
+        chunks = []
+
+        while size > 0 and self.__index < len(self.__segments):
+            segment, segment_size = self.__segments[self.__index]
+
+            if self.__offset >= segment_size:
+                if isinstance(segment, _FileSegment):
+                    # Release the file as soon as it has been sent, so a payload only ever holds one open file.
+                    segment.close()
+
+                self.__index += 1
+                self.__offset = 0
+                continue
+
+            if isinstance(segment, _FileSegment):
+                chunk = segment.read(self.__offset, size)
+            else:
+                chunk = segment[self.__offset:self.__offset + size]
+
+            self.__offset += len(chunk)
+            self.__position += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+
+        if not chunks:
+            return b''
+
+        if len(chunks) == 1:
+            return chunks[0]
+
+        return b''.join(chunks)
+
+    def tell(self) -> int:
+        """
+        Get the current position in the body.
+
+        Returns:
+            int:
+                The number of bytes read so far.
+        """
+        return self.__position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """
+        Move to a position of the body.
+
+        Parameters:
+            offset (int):
+                The offset to move to.
+
+            whence (int):
+                The reference point of `offset` (one of :data:`os.SEEK_SET`, :data:`os.SEEK_CUR` or
+                :data:`os.SEEK_END`).
+
+        Returns:
+            int:
+                The new position.
+        """
+        if whence == os.SEEK_CUR:
+            offset += self.__position
+        elif whence == os.SEEK_END:
+            offset += self.__length
+
+        offset = max(0, min(offset, self.__length))
+
+        self.__close_segments()
+        self.__position = offset
+        self.__index = 0
+
+        for index, (_, segment_size) in enumerate(self.__segments):
+            if offset < segment_size:
+                break
+
+            offset -= segment_size
+            self.__index = index + 1
+
+        self.__offset = offset
+
+        return self.__position
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def __close_segments(self):
+        for segment, _ in self.__segments:
+            if isinstance(segment, _FileSegment):
+                segment.close()
+
+    def close(self):
+        """
+        Close any file that is still open.
+
+        Returns:
+            None
+        """
+        self.__close_segments()
+        self.__closed = True
+
+    @property
+    def closed(self) -> bool:
+        """
+        Get the closed status of the payload.
+
+        Returns:
+            bool:
+                True if the payload has been closed, False otherwise.
+        """
+        return self.__closed
@@ -0,0 +1,193 @@
+"""
+preprocess.py
+
+This module provides the optional client-side preprocessing stage of the upload path.
+
+Large photos are decoded, downscaled so that their longest side is at most :attr:`Preprocessor.max_side` pixels and
+re-encoded before being uploaded, as the detector resizes its input to a few hundred pixels anyway. The boxes returned by
+the inference server are then mapped back to the coordinate space of the original image, so
+:meth:`pic_scanner.models.image.ScannedImage.create_concerns` never sees downscaled coordinates.
+
+Classes:
+    Preprocessor:
+        The settings of the preprocessing stage.
+
+    PreparedImage:
+        A downscaled, re-encoded image ready to be uploaded.
+
+Functions:
+    rescale_box:
+        Map a box from downscaled to original coordinates.
+
+    rescale_prediction:
+        Map every box of a single image's prediction entry back to original coordinates.
+
+
+Since:
+    1.0
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from pic_scanner.api import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.helpers.images import downscale_image
+
+
+__all__ = [
+    'DEFAULT_MAX_SIDE',
+    'DEFAULT_QUALITY',
+    'PreparedImage',
+    'Preprocessor',
+    'rescale_box',
+    'rescale_prediction',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('preprocess')
+
+
+DEFAULT_MAX_SIDE = 1280
+"""
+int:
+    The default maximum length, in pixels, of the longest side of an uploaded image.
+"""
+
+DEFAULT_QUALITY = 85
+"""
+int:
+    The default JPEG quality of a re-encoded image.
+"""
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """
+    A downscaled, re-encoded image ready to be uploaded.
+
+    Properties:
+        image_path (Path):
+            The path to the original image.
+
+        data (bytes):
+            The re-encoded image data.
+
+        scale (tuple[float, float]):
+            The (horizontal, vertical) factors that map downscaled coordinates back to original coordinates.
+    """
+    image_path: Path
+    data: bytes
+    scale: tuple
+
+    def as_file(self) -> tuple:
+        """
+        Get the image as a multipart file tuple.
+
+        Returns:
+            tuple:
+                The (filename, data, content type) tuple.
+        """
+        return f'{self.image_path.stem}.jpg', self.data, 'image/jpeg'
+
+
+@dataclass(frozen=True)
+class Preprocessor:
+    """
+    The settings of the client-side preprocessing stage.
+
+    Properties:
+        max_side (int):
+            The maximum length, in pixels, of the longest side of an uploaded image. Images that are already small enough
+            are uploaded as-is.
+
+        quality (int):
+            The JPEG quality of a re-encoded image.
+
+    Methods:
+        prepare(image_path):
+            Downscale and re-encode an image, if needed.
+    """
+    max_side: int = DEFAULT_MAX_SIDE
+    quality: int = DEFAULT_QUALITY
+
+    def __post_init__(self):
+        if not isinstance(self.max_side, int) or self.max_side < 1:
+            raise ValueError(f"Invalid maximum side length: {self.max_side}!")
+
+        if not isinstance(self.quality, int) or not 1 <= self.quality <= 95:
+            raise ValueError(f"Invalid quality: {self.quality}!")
+
+    def prepare(self, image_path: Path, data: Optional[Union[bytes, memoryview]] = None) -> Optional[PreparedImage]:
+        """
+        Downscale and re-encode an image, if needed.
+
+        Parameters:
+            image_path (Path):
+                The path to the image.
+
+            data (Optional[Union[bytes, memoryview]]):
+                The bytes of the image, if they were already read. The file is then not read again.
+
+        Returns:
+            Optional[PreparedImage]:
+                The prepared image, or None if the image is small enough to be uploaded as-is.
+
+        Raises:
+            FileNotFoundError:
+                If the file does not exist.
+
+            OSError:
+                If the file cannot be opened and identified as an image file.
+        """
+        downscaled = downscale_image(image_path, self.max_side, quality=self.quality, data=data)
+
+        if downscaled is None:
+            return None
+
+        data, (width, height), (new_width, new_height) = downscaled
+        MOD_LOGGER.debug(f'Downscaled {image_path} from {width}x{height} to {new_width}x{new_height}')
+
+        return PreparedImage(image_path, data, (width / new_width, height / new_height))
+
+
+def rescale_box(box: list, scale: tuple) -> list[int]:
+    """
+    Map a box from downscaled to original coordinates.
+
+    Both `[left, top, right, bottom]` and `[x, y, width, height]` boxes are supported, as both keep horizontal values at
+    even indices and vertical values at odd indices.
+
+    Parameters:
+        box (list):
+            The box, in downscaled coordinates.
+
+        scale (tuple[float, float]):
+            The (horizontal, vertical) scale factors.
+
+    Returns:
+        list[int]:
+            The box, in original coordinates.
+    """
+    return [round(value * scale[i % 2]) for i, value in enumerate(box)]
+
+
+def rescale_prediction(prediction: list, scale: tuple) -> list:
+    """
+    Map every box of a single image's prediction entry back to original coordinates.
+
+    Parameters:
+        prediction (list):
+            The detections the inference server returned for one image.
+
+        scale (tuple[float, float]):
+            The (horizontal, vertical) scale factors.
+
+    Returns:
+        list:
+            The prediction entry, with its boxes rescaled in place.
+    """
+    for detection in prediction:
+        if box := detection.get('box'):
+            detection['box'] = rescale_box(box, scale)
+
+    return prediction
@@ -0,0 +1,185 @@
+"""
+transport.py
+
+This module provides a UNIX domain socket transport for an inference server running on the same host as the scanner.
+
+A base URL of the form `unix:///path/to/socket` (optionally followed by `:/request/path`, such as
+`unix:///run/nsfw.sock:/infer`) makes the :class:`~pic_scanner.api.client.InferenceClient` mount a
+:class:`UnixSocketAdapter`, which keeps a bounded pool of keep-alive connections to the socket exactly as the TCP path
+does, without the loopback TCP overhead or the risk of running out of ephemeral ports at high request rates.
+
+Classes:
+    UnixSocketAdapter:
+        A :mod:`requests` transport adapter that connects to a UNIX domain socket.
+
+Functions:
+    is_unix_url:
+        Check whether a base URL points to a UNIX domain socket.
+
+    parse_unix_url:
+        Split a UNIX domain socket base URL into the socket path and an HTTP request URL.
+
+
+Since:
+    1.0
+"""
+import socket
+from functools import partial
+from typing import Optional
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+
+
+__all__ = [
+    'UNIX_SCHEME',
+    'UnixSocketAdapter',
+    'is_unix_url',
+    'parse_unix_url',
+]
+
+
+UNIX_SCHEME = 'unix://'
+"""
+str:
+    The scheme prefix of UNIX domain socket base URLs.
+"""
+
+DEFAULT_REQUEST_PATH = urlparse(DEFAULT_BASE_URL).path or '/'
+"""
+str:
+    The HTTP path requests are sent to when a UNIX domain socket base URL does not name one (the path of
+    :data:`DEFAULT_BASE_URL`).
+"""
+
+
+def is_unix_url(base_url: Optional[str]) -> bool:
+    """
+    Check whether a base URL points to a UNIX domain socket.
+
+    Parameters:
+        base_url (Optional[str]):
+            The base URL.
+
+    Returns:
+        bool:
+            True if the base URL starts with `unix://`, False otherwise.
+    """
+    return isinstance(base_url, str) and base_url.startswith(UNIX_SCHEME)
+
+
+def parse_unix_url(base_url: str) -> tuple[str, str]:
+    """
+    Split a UNIX domain socket base URL into the socket path and an HTTP request URL.
+
+    Parameters:
+        base_url (str):
+            The base URL, such as `unix:///run/nsfw.sock` or `unix:///run/nsfw.sock:/infer`.
+
+    Returns:
+        tuple[str, str]:
+            The path of the socket, and the URL the requests are sent to over it (for example,
+            `http://localhost/infer`).
+
+    Raises:
+        ValueError:
+            If the base URL is not a UNIX domain socket URL or names no socket.
+
+    Examples:
+        >>> parse_unix_url('unix:///run/nsfw.sock:/v2/infer')
+        ('/run/nsfw.sock', 'http://localhost/v2/infer')
+    """
+    if not is_unix_url(base_url):
+        raise ValueError(f"Not a UNIX domain socket URL: {base_url}!")
+
+    socket_path, separator, request_path = base_url[len(UNIX_SCHEME):].partition(':')
+
+    if not socket_path:
+        raise ValueError(f"No socket path in URL: {base_url}!")
+
+    if not separator:
+        request_path = DEFAULT_REQUEST_PATH
+
+    if not request_path.startswith('/'):
+        request_path = f'/{request_path}'
+
+    return socket_path, f'http://localhost{request_path}'
+
+
+class _UnixHTTPConnection(HTTPConnection):
+    """
+    An HTTP connection over a UNIX domain socket.
+    """
+
+    def __init__(self, socket_path: str, *args, **kwargs):
+        self.socket_path = socket_path
+        super().__init__(*args, **kwargs)
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+
+        return sock
+
+
+class _UnixHTTPConnectionPool(HTTPConnectionPool):
+    """
+    A pool of HTTP connections over a UNIX domain socket.
+    """
+
+    def __init__(self, socket_path: str, *args, **kwargs):
+        self.socket_path = socket_path
+        super().__init__(*args, **kwargs)
+
+    def _new_conn(self) -> _UnixHTTPConnection:
+        self.num_connections += 1
+
+        return _UnixHTTPConnection(
+            self.socket_path,
+            host=self.host,
+            port=self.port,
+            timeout=self.timeout.connect_timeout,
+        )
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """
+    A :mod:`requests` transport adapter that sends every request to one UNIX domain socket.
+
+    The adapter takes the same pooling arguments as :class:`requests.adapters.HTTPAdapter`; the host of the request URL
+    is only used for the `Host` header.
+    """
+
+    __attrs__ = [*HTTPAdapter.__attrs__, 'socket_path']
+
+    def __init__(self, socket_path: str, **kwargs):
+        """
+        The constructor for the UnixSocketAdapter class.
+
+        Parameters:
+            socket_path (str):
+                The path of the socket.
+
+            **kwargs:
+                Keyword arguments passed to :class:`requests.adapters.HTTPAdapter` (such as `pool_maxsize`).
+        """
+        self.socket_path = socket_path
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        pool_class = partial(_UnixHTTPConnectionPool, self.socket_path)
+        self.poolmanager.pool_classes_by_scheme = {'http': pool_class, 'https': pool_class}
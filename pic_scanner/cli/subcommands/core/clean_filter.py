@@ -0,0 +1,115 @@
+from rich.console import Console
+from rich.table import Table
+
+from pic_scanner.cli.subcommands.registry import REGISTRY
+
+
+CONSOLE = Console()
+
+
+def handle_clean_filter(args):
+    """
+    Build, merge, rotate or describe the filter of checksums known to be clean.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+    """
+    from pic_scanner.core.cache import ResultCache
+    from pic_scanner.core.clean_filter import CleanFilter
+
+    if args.clean_filter_action == 'build':
+        cache = ResultCache(args.cache, server=args.server, model=args.model)
+        clean_filter = CleanFilter.build(
+            cache.items(),
+            capacity=args.capacity,
+            error_rate=args.error_rate,
+            threshold=args.threshold,
+            path=args.path,
+            server=cache.server,
+            model=cache.model
+        )
+        clean_filter.save()
+        CONSOLE.print(f'Built a clean filter of {len(clean_filter)} checksums at {clean_filter.path}.')
+        return
+
+    clean_filter = CleanFilter.open(
+        args.path,
+        server=args.server,
+        model=args.model,
+        capacity=args.capacity,
+        error_rate=args.error_rate,
+        threshold=args.threshold
+    )
+
+    if args.clean_filter_action == 'merge':
+        for path in args.other or []:
+            clean_filter.merge(CleanFilter.load(path))
+
+        clean_filter.save()
+    elif args.clean_filter_action == 'rotate':
+        clean_filter.rotate()
+        clean_filter.save()
+
+    table = Table(title='Clean Filter')
+    table.add_column('Property', style='cyan', no_wrap=True)
+    table.add_column('Value', style='magenta')
+
+    table.add_row('Path', str(clean_filter.path))
+    table.add_row('Checksums', str(len(clean_filter)))
+    table.add_row('Generations', ', '.join(str(generation.count) for generation in clean_filter.generations))
+    table.add_row('Capacity per Generation', str(clean_filter.capacity))
+    table.add_row('Error Rate per Generation', f'{clean_filter.error_rate:g}')
+    table.add_row('Server', clean_filter.server)
+    table.add_row('Model', clean_filter.model or '-')
+    table.add_row('Threshold', str(clean_filter.threshold))
+    table.add_row('Size', f'{sum(len(generation.bits) for generation in clean_filter.generations) / 1024 ** 2:.1f} MiB')
+
+    CONSOLE.print(table)
+
+
+REGISTRY.register_subcommand(
+        name='clean-filter',
+        help_text='Manage the filter of checksums known to be clean',
+        handler=handle_clean_filter,
+        arguments={
+                'clean_filter_action': {
+                        'choices': ['build', 'merge', 'rotate', 'stats'],
+                        'help':    'Build the filter from the result cache, merge other filters into it, rotate its '
+                                   'generations, or show its statistics'
+                        },
+                '--path':              {
+                        'help': 'The path of the filter (defaults to the clean filter in the cache directory)'
+                        },
+                '--other':             {
+                        'nargs': '*',
+                        'help':  'The paths of the filters to merge into it'
+                        },
+                '--cache':             {
+                        'help': 'The path of the result cache to build from (defaults to the result cache in the '
+                                'cache directory)'
+                        },
+                '--server':            {
+                        'nargs': '*',
+                        'help':  'The base URL(s) of the server whose cached results to build from, or whose filter '
+                                 'to use'
+                        },
+                '--model':             {
+                        'help': 'The model identity whose cached results to build from, or whose filter to use'
+                        },
+                '--threshold':         {
+                        'type':    float,
+                        'default': 0.0,
+                        'help':    'The score a detection must exceed for an image not to count as clean'
+                        },
+                '--capacity':          {
+                        'type':    int,
+                        'default': 1_000_000,
+                        'help':    'The number of checksums each generation of a new filter is sized for'
+                        },
+                '--error-rate':        {
+                        'type':    float,
+                        'default': 1e-6,
+                        'help':    'The false positive rate of each generation of a new filter'
+                        },
+                }
+        )
@@ -13,6 +13,7 @@ DEFAULT_DIRS = {
         'cache': PROG_DIRS.user_cache_path,
         'config': PROG_DIRS.user_config_path,
         'data': PROG_DIRS.user_data_path,
+        'journals': JOURNAL_DIR,
         'pictures': PROG_DIRS.user_pictures_path,
         'temp': TEMP_DIR,
         }
@@ -20,8 +21,11 @@ DEFAULT_DIRS = {
 
 DEFAULT_FILES = {
         'cache': CACHE_FILE_PATH,
+        'clean_filter': CLEAN_FILTER_FILE_PATH,
         'config': CONFIG_FILE_PATH,
         'history': HISTORY_FILE_PATH,
+        'index': INDEX_FILE_PATH,
+        'similarity': SIMILARITY_INDEX_FILE_PATH,
 
         }
 
@@ -5,6 +5,7 @@ from pic_scanner.common.__about__ import PROG_NAME, AUTHOR
 
 __all__ = [
         'DEFAULT_BACKUP_DIR',
+        'JOURNAL_DIR',
         'PROG_DIRS',
         'TEMP_DIR',
     ]
@@ -16,4 +17,6 @@ PROG_DIRS = PlatformDirs(appname=PROG_NAME, appauthor=AUTHOR)
 
 DEFAULT_BACKUP_DIR = PROG_DIRS.user_data_path / 'backups'
 
+JOURNAL_DIR = PROG_DIRS.user_data_path / 'journals'
+
 TEMP_DIR = PROG_DIRS.user_cache_path / 'temp'
@@ -6,20 +6,35 @@ __all__ = [
         'CONFIG_FILE_PATH',
         'CACHE_FILE_NAME',
         'CACHE_FILE_PATH',
+        'CLEAN_FILTER_FILE_NAME',
+        'CLEAN_FILTER_FILE_PATH',
         'DEFAULT_BACKUP_EXTENSION',
         'HISTORY_FILE_NAME',
         'HISTORY_FILE_PATH',
+        'INDEX_FILE_NAME',
+        'INDEX_FILE_PATH',
+        'SIMILARITY_INDEX_FILE_NAME',
+        'SIMILARITY_INDEX_FILE_PATH',
     ]
 
 
 CONFIG_FILE_NAME = 'config.ini'
 CONFIG_FILE_PATH = PROG_DIRS.user_config_path / CONFIG_FILE_NAME
 
-CACHE_FILE_NAME = 'cache.json'
+CACHE_FILE_NAME = 'cache.sqlite3'
 
 CACHE_FILE_PATH = PROG_DIRS.user_cache_path / CACHE_FILE_NAME
 
+CLEAN_FILTER_FILE_NAME = 'clean.bloom'
+CLEAN_FILTER_FILE_PATH = PROG_DIRS.user_cache_path / CLEAN_FILTER_FILE_NAME
+
 DEFAULT_BACKUP_EXTENSION = '.bak'
 
 HISTORY_FILE_NAME = 'history.json'
 HISTORY_FILE_PATH = PROG_DIRS.user_data_path / HISTORY_FILE_NAME
+
+INDEX_FILE_NAME = 'index.sqlite3'
+INDEX_FILE_PATH = PROG_DIRS.user_cache_path / INDEX_FILE_NAME
+
+SIMILARITY_INDEX_FILE_NAME = 'similar.sqlite3'
+SIMILARITY_INDEX_FILE_PATH = PROG_DIRS.user_cache_path / SIMILARITY_INDEX_FILE_NAME
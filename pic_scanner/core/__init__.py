@@ -1,25 +1,62 @@
-from typing import Union, Optional
+from typing import Iterable, Iterator, Union, Optional
 from pathlib import Path
 from pic_scanner.models.image import create_scanned_image, ScannedImageCollection, ScannedImage
 from pic_scanner.helpers.filesystem import provision_path
-from pic_scanner.api import analyze_image
+from pic_scanner.helpers.filesystem.dedup import deduplicate
+from pic_scanner.api import analyze_image, analyze_images_batch, get_client, iter_batches, InferenceClient, EndpointPool, \
+    HedgedClient
+from pic_scanner.api.aio import AsyncInferenceClient, analyze_image_async, DEFAULT_MAX_IN_FLIGHT
+from pic_scanner.api.preprocess import Preprocessor
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.helpers.filesystem.index import FileIndex
+from pic_scanner.helpers.images import DEFAULT_MAX_BUFFERED_SIZE, ImageBuffer, get_image_checksum, iter_image_checksums
 from pic_scanner.log_engine import ROOT_LOGGER as PARENT_LOGGER
 from tqdm import tqdm
-from warnings import warn
-from queue import Queue
-from threading import Thread
+from contextlib import nullcontext
+import asyncio
+import os
+from concurrent.futures import Executor
 
 
 __all__ = [
+    'AdaptiveConcurrencyLimiter',
+    'CleanFilter',
+    'Pipeline',
+    'ResultCache',
+    'ScanFailure',
+    'ScanItem',
+    'ScanJournal',
+    'ScanPipeline',
+    'SimilarityIndex',
+    'Stage',
+    'iter_scan_images',
     'scan_image',
-    'scan_images'
+    'scan_images',
+    'scan_images_async',
 ]
 
 
 MOD_LOGGER = PARENT_LOGGER.get_child('core')
 
 
-def scan_image(image_path: Union[str, Path], base_url: Optional[str] = None) -> ScannedImage:
+from .cache import ResultCache, server_identity
+from .clean_filter import CleanFilter, clean_result
+from .concurrency import AdaptiveConcurrencyLimiter
+from .journal import ScanJournal
+from .pipeline import Pipeline, ScanFailure, ScanItem, ScanPipeline, Stage
+from .similarity import SimilarityIndex
+
+
+def scan_image(
+        image_path: Union[str, Path],
+        base_url: Optional[str] = None,
+        client: Optional[InferenceClient] = None,
+        preprocessor: Optional[Preprocessor] = None,
+        cache: Union[bool, ResultCache, None] = None,
+        index: Union[bool, FileIndex, None] = None,
+        clean_filter: Union[bool, CleanFilter, None] = None,
+        similarity: Union[bool, SimilarityIndex, None] = None
+) -> ScannedImage:
     """
     Scan an image for NSFW content.
 
@@ -30,106 +67,319 @@ def scan_image(image_path: Union[str, Path], base_url: Optional[str] = None) ->
         base_url (Optional[str]):
             The base URL of the API to use.
 
+        client (Optional[InferenceClient]):
+            The client to send the request with. Defaults to the shared client for `base_url`.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`pic_scanner.api.preprocess.Preprocessor`).
+
+        cache (Union[bool, ResultCache, None]):
+            A result cache to consult before uploading the image, and to store the new result in. True for the default
+            cache of the server (see :class:`pic_scanner.core.cache.ResultCache`).
+
+        index (Union[bool, FileIndex, None]):
+            A file index that, if the image is unchanged since it was last scanned, already holds its checksum and
+            result. True for the default index (see :class:`pic_scanner.helpers.filesystem.index.FileIndex`).
+
+        clean_filter (Union[bool, CleanFilter, None]):
+            A filter of the checksums of images known to be clean, consulted before the result cache and the server.
+            It must belong to the server (and the model of the result cache, if any) scanned with. True for the default
+            filter, which is loaded (or discarded, if it belongs to another server or model) and saved again afterwards
+            (see :class:`pic_scanner.core.clean_filter.CleanFilter`).
+
+        similarity (Union[bool, SimilarityIndex, None]):
+            An index of the perceptual hashes of scanned images. An image within its radius of one already scanned (a
+            resized or recompressed copy) reuses that result instead of being uploaded. True for the default index of
+            the server (see :class:`pic_scanner.core.similarity.SimilarityIndex`; requires `numpy`).
+
     Returns:
         ScannedImage:
             The scanned image.
 
     Raises:
         ValueError:
-            If the image path is invalid.
+            If the image path is invalid, or the clean filter belongs to another server or model.
     """
     if MOD_LOGGER.find_child_by_name('scan_image'):
         log = MOD_LOGGER.find_child_by_name('scan_image')[0]
     else:
         log = MOD_LOGGER.get_child('scan_image')
 
-    res_data = analyze_image(image_path, base_url=base_url)
+    cache = _resolve_cache(cache, client, base_url)
+    index = _resolve_index(index, cache, client, base_url)
+    owns_clean_filter = clean_filter is True
+    clean_filter = _resolve_clean_filter(clean_filter, cache, client, base_url)
+    similarity = _resolve_similarity(similarity, client, base_url)
+
+    try:
+        res_data = _analyze_cached(
+            image_path,
+            cache,
+            index,
+            clean_filter,
+            similarity,
+            base_url=base_url,
+            client=client,
+            preprocessor=preprocessor
+        )
+    finally:
+        if owns_clean_filter:
+            clean_filter.save()
+
     log.debug(f'Creating scanned image from result data: {res_data}')
 
-    scanned_image = create_scanned_image(res_data)
+    scanned_image = create_scanned_image(res_data, checksum=res_data.get('checksum'))
     log.debug(f'Scanned image created: {scanned_image}')
 
     return scanned_image
 
 
-class Worker(Thread):
-    def __init__(self, queue, collection, enable_progress_bar=False, prog_bar=None):
-        Thread.__init__(self)
-        self.queue = queue
-        self.collection = collection
-        self.prog_bar = None
-        self.enable_progress_bar = enable_progress_bar
+def _resolve_cache(cache, client, base_url) -> Optional[ResultCache]:
+    if cache is True:
+        return ResultCache(server=getattr(client, 'base_url', None) or base_url)
 
-        if self.enable_progress_bar:
-            self.prog_bar = prog_bar
+    return cache or None
 
-        print(self.getName())
 
-    def run(self):
-        while True:
-            image_path = self.queue.get()
-            if image_path is None:
-                break
+def _resolve_clean_filter(clean_filter, cache, client, base_url) -> Optional[CleanFilter]:
+    if clean_filter is None or clean_filter is False:
+        return None
 
-            try:
-                result = analyze_image(image_path)
-                scanned_image = create_scanned_image(result)
-                self.collection.add_image(scanned_image)
-            except Exception as e:
-                warn(f'Failed to scan image: {image_path}', exc_info=True)
-            finally:
-                self.queue.task_done()
-                if self.enable_progress_bar:
-                    self.prog_bar.update(1)
+    # A filter only holds images that were clean for the server and model it was built with, the identity the result
+    # cache uses; a model is only known from the cache.
+    if cache is not None:
+        server, model = cache.server, cache.model
+    else:
+        server, model = getattr(client, 'base_url', None) or base_url or DEFAULT_BASE_URL, None
 
+    if clean_filter is True:
+        return CleanFilter.open(server=server, model=model or '')
 
+    if not clean_filter.matches(server, model):
+        raise ValueError(f"The clean filter of server {clean_filter.server!r} and model {clean_filter.model!r} does "
+                         f"not belong to server {server_identity(server)!r} and model {model!r}!")
 
-def scan_images(
+    return clean_filter
+
+
+def _resolve_similarity(similarity, client, base_url) -> Optional[SimilarityIndex]:
+    if similarity is True:
+        return SimilarityIndex(server=getattr(client, 'base_url', None) or base_url)
+
+    # An empty index is falsy (it has a length), so test for the flag explicitly.
+    return similarity if similarity is not False else None
+
+
+def _resolve_index(index, cache, client, base_url) -> Optional[FileIndex]:
+    if index is True:
+        # Results are only reused for the server and model they came from, the identity the result cache uses.
+        if cache is not None:
+            return FileIndex(server=cache.server, model=cache.model)
+
+        return FileIndex(server=getattr(client, 'base_url', None) or base_url)
+
+    # An empty index is falsy (it has a length), so test for the flag explicitly.
+    return index if index is not False else None
+
+
+def _lookup_known(
+        image_path,
+        cache: Optional[ResultCache],
+        index: Optional[FileIndex],
+        clean_filter: Optional[CleanFilter] = None,
+        checksum: Optional[str] = None,
+        read: bool = False
+):
+    """
+    Look up what is already known about an image: the file index is consulted first (without reading the file), then
+    the clean filter and the result cache (by checksum).
+
+    Parameters:
+        image_path (Union[str, Path]):
+            The path to the image.
+
+        cache (Optional[ResultCache]):
+            The result cache, if any.
+
+        index (Optional[FileIndex]):
+            The file index, if any.
+
+        clean_filter (Optional[CleanFilter]):
+            The filter of checksums known to be clean, if any.
+
+        checksum (Optional[str]):
+            The checksum of the file, if it was already computed.
+
+        read (bool):
+            A flag indicating whether a file that must be hashed is read into memory (unless it is larger than
+            :data:`DEFAULT_MAX_BUFFERED_SIZE`), so it can be uploaded without being read again.
+
+    Returns:
+        tuple[Optional[str], Optional[dict], Optional[IndexedFile], Optional[ImageBuffer]]:
+            The checksum of the file (None if none of them is used), the known result (None if the image must be
+            analyzed), the classification of the file (None if no index is used) and the buffer of the file (None
+            unless it was read). Release the buffer once it is no longer needed.
+    """
+    indexed = index.classify(image_path) if index is not None else None
+    buffer = None
+
+    if indexed is not None and indexed.unchanged and indexed.result is not None:
+        return indexed.checksum, indexed.result, indexed, buffer
+
+    if cache is None and index is None and clean_filter is None:
+        return None, None, None, buffer
+
+    if checksum is None:
+        if indexed is not None and indexed.unchanged:
+            checksum = indexed.checksum
+        elif read and os.path.getsize(image_path) <= DEFAULT_MAX_BUFFERED_SIZE:
+            buffer = ImageBuffer.read(image_path)
+            checksum = buffer.checksum
+        else:
+            checksum = get_image_checksum(image_path)
+
+    if clean_filter is not None and checksum in clean_filter:
+        return checksum, clean_result(), indexed, buffer
+
+    return checksum, cache.get(checksum) if cache is not None else None, indexed, buffer
+
+
+def _lookup_similar(similarity: SimilarityIndex, image):
+    """
+    Look up the result of a near-duplicate of an image in the similarity index.
+
+    Returns:
+        tuple[Optional[tuple[int, tuple[int, int]]], Optional[dict]]:
+            The perceptual hash and size of the image (None if it cannot be decoded, in which case the server gets the
+            last word) and the result of its closest near-duplicate (None if there is none).
+    """
+    try:
+        perceptual_hash = similarity.hash_image(image)
+    except OSError as e:
+        MOD_LOGGER.debug(f'Could not compute the perceptual hash of {image}: {e}')
+        return None, None
+
+    return perceptual_hash, similarity.lookup(*perceptual_hash)
+
+
+def _remember(
+        image_path,
+        checksum,
+        result,
+        fresh,
+        cache: Optional[ResultCache],
+        index: Optional[FileIndex],
+        indexed,
+        clean_filter: Optional[CleanFilter] = None,
+        similarity: Optional[SimilarityIndex] = None,
+        perceptual_hash=None
+):
+    """
+    Record the result of an image in the result cache, the clean filter and the similarity index (if it was just
+    analyzed) and in the file index (unless the index already holds it).
+    """
+    if fresh and cache is not None:
+        cache.put(checksum, result)
+
+    if fresh and clean_filter is not None:
+        clean_filter.record(checksum, result)
+
+    if fresh and similarity is not None and perceptual_hash is not None:
+        similarity.add(*perceptual_hash, result)
+
+    if index is not None and not (indexed.unchanged and indexed.result is not None):
+        index.update(image_path, checksum, result, fingerprint=indexed.fingerprint)
+
+
+def _analyze_cached(
+        image_path,
+        cache: Optional[ResultCache],
+        index: Optional[FileIndex] = None,
+        clean_filter: Optional[CleanFilter] = None,
+        similarity: Optional[SimilarityIndex] = None,
+        **kwargs
+) -> dict:
+    """
+    Analyze an image, unless the file index, the clean filter or the result cache already knows the result for its
+    contents, or the similarity index knows the result of a near-duplicate.
+
+    Parameters:
+        image_path (Union[str, Path]):
+            The path to the image.
+
+        cache (Optional[ResultCache]):
+            The result cache, if any. New results are stored in it.
+
+        index (Optional[FileIndex]):
+            The file index, if any. The checksum and result of changed and new files are recorded in it.
+
+        clean_filter (Optional[CleanFilter]):
+            The filter of checksums known to be clean, if any. New clean results are added to it.
+
+        similarity (Optional[SimilarityIndex]):
+            The index of the perceptual hashes of scanned images, if any. New results are added to it.
+
+        **kwargs:
+            Keyword arguments passed to :func:`pic_scanner.api.analyze_image`.
+
+    Returns:
+        dict:
+            The result, shaped like the result of :func:`pic_scanner.api.analyze_image`, with the `checksum` of the file
+            when a cache, an index or a clean filter is used.
+    """
+    if cache is None and index is None and clean_filter is None and similarity is None:
+        return analyze_image(image_path, **kwargs)
+
+    # A provisioned path may name another file than the one hashed, so only unprovisioned files are uploaded from the
+    # buffer they were hashed from.
+    checksum, result, indexed, buffer = _lookup_known(
+        image_path, cache, index, clean_filter, read=kwargs.get('do_not_provision', False)
+    )
+
+    perceptual_hash = None
+
+    try:
+        if result is None and similarity is not None:
+            perceptual_hash, result = _lookup_similar(similarity, buffer if buffer is not None else image_path)
+
+        if fresh := result is None:
+            result = analyze_image(image_path, data=buffer.data if buffer is not None else None, **kwargs)['result']
+    finally:
+        if buffer is not None:
+            buffer.release()
+
+    _remember(image_path, checksum, result, fresh, cache, index, indexed, clean_filter, similarity, perceptual_hash)
+
+    return {'image_path': image_path, 'result': result, 'checksum': checksum}
+
+
+def _prepare_image_paths(
+        log,
         image_paths: Union[list[Union[str, Path]], Path],
-        base_url: Optional[str] = None,
         do_not_convert_paths: bool = False,
         do_not_provision_paths: bool = False,
-        prog_bar: bool = False,
-        threaded: bool = False,
-        num_threads: int = 8,
         **kwargs
-) -> ScannedImageCollection:
+) -> list[Path]:
     """
-    Scan a collection of images for NSFW content.
+    Normalize the image paths passed to one of the scanning functions into a list of provisioned Path objects.
 
     Parameters:
+        log:
+            The logger of the calling function.
+
         image_paths (Union[list[Union[str, Path]], Path]):
             The paths to the images to scan.
 
-        base_url (Optional[str]):
-            The base URL of the API to use.
-
         do_not_convert_paths (bool):
             A flag indicating whether to convert the paths to strings.
 
         do_not_provision_paths (bool):
             A flag indicating whether to provision the paths.
 
-        prog_bar (bool):
-               A flag indicating whether to display a progress bar.
-
     Returns:
-        ScannedImageCollection:
-            The scanned images.
-
-    Raises:
-        ValueError:
-            If the image paths are invalid.
-
+        list[Path]:
+            The normalized image paths.
     """
-    scanned_images = ScannedImageCollection()
-    failed_images = []
-
-    if MOD_LOGGER.find_child_by_name('scan_images'):
-        log = MOD_LOGGER.find_child_by_name('scan_images')[0]
-    else:
-        log = MOD_LOGGER.get_child('scan_images')
-
     if not isinstance(image_paths, list):
         log.warning(f'Image paths is not a list: {type(image_paths)}')
 
@@ -159,6 +409,309 @@ def scan_images(
             image_paths[i] = provision_path(image_paths[i], do_not_convert=do_not_convert_paths, **kwargs)
             log.debug(f'Provisioned image path at index {i}: {image_paths[i]}')
 
+    return image_paths
+
+
+def scan_images(
+        image_paths: Union[list[Union[str, Path]], Path],
+        base_url: Optional[Union[str, list[str]]] = None,
+        do_not_convert_paths: bool = False,
+        do_not_provision_paths: bool = False,
+        prog_bar: bool = False,
+        threaded: bool = False,
+        num_threads: int = 8,
+        client: Optional[InferenceClient] = None,
+        batch_size: Optional[int] = None,
+        preprocessor: Optional[Preprocessor] = None,
+        adaptive: bool = False,
+        min_concurrency: int = 1,
+        max_concurrency: Optional[int] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_budget: float = 0.05,
+        stage_workers: Optional[dict] = None,
+        cpu_executor: Union[str, Executor] = 'thread',
+        cache: Union[bool, ResultCache, None] = None,
+        index: Union[bool, FileIndex, None] = None,
+        clean_filter: Union[bool, CleanFilter, None] = None,
+        journal: Union[bool, ScanJournal, None] = None,
+        resume: Optional[str] = None,
+        dedup: bool = False,
+        similarity: Union[bool, SimilarityIndex, None] = None,
+        **kwargs
+) -> ScannedImageCollection:
+    """
+    Scan a collection of images for NSFW content.
+
+    Parameters:
+        image_paths (Union[list[Union[str, Path]], Path]):
+            The paths to the images to scan.
+
+        base_url (Optional[Union[str, list[str]]]):
+            The base URL of the API to use. If several base URLs are given, requests are balanced across them (see
+            :class:`pic_scanner.api.endpoints.EndpointPool`) and each endpoint's throughput is logged after the scan.
+
+        do_not_convert_paths (bool):
+            A flag indicating whether to convert the paths to strings.
+
+        do_not_provision_paths (bool):
+            A flag indicating whether to provision the paths.
+
+        prog_bar (bool):
+               A flag indicating whether to display a progress bar.
+
+        threaded (bool):
+            A flag indicating whether to scan the images with the staged pipeline (see
+            :class:`pic_scanner.core.pipeline.ScanPipeline`), so disk I/O, decoding and requests overlap.
+
+        num_threads (int):
+            The number of requests in flight when `threaded` is True.
+
+        client (Optional[InferenceClient]):
+            The client to send the requests with. Defaults to the shared client for `base_url`, with a connection pool
+            large enough for every worker thread.
+
+        batch_size (Optional[int]):
+            If greater than 1, pack up to this many images into each request to the inference server (see
+            :func:`pic_scanner.api.analyze_images_batch`).
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`pic_scanner.api.preprocess.Preprocessor`).
+
+        adaptive (bool):
+            A flag indicating whether the number of requests in flight should adapt to the measured latency and error
+            rate (see :class:`AdaptiveConcurrencyLimiter`), starting at `num_threads`. Implies `threaded`.
+
+        min_concurrency (int):
+            The lower bound of the adaptive concurrency.
+
+        max_concurrency (Optional[int]):
+            The upper bound of the adaptive concurrency. Defaults to four times `num_threads`.
+
+        limiter (Optional[AdaptiveConcurrencyLimiter]):
+            The limiter to use in adaptive mode, instead of a new one. Pass one to inspect its :meth:`summary` after the
+            scan. Implies `adaptive`.
+
+        hedge_percentile (Optional[float]):
+            If given, a request that has not been answered within this percentile of the recent latencies (for example,
+            0.95) is duplicated, and the first reply is used (see :class:`pic_scanner.api.hedging.HedgedClient`).
+            The shared client then gets two connections per thread, so a duplicate does not wait for a connection; a
+            `client` passed in should have as many.
+
+        hedge_budget (float):
+            The maximum number of duplicate requests, as a fraction of all requests, when hedging.
+
+        stage_workers (Optional[dict]):
+            The sizes of the pipeline stages when `threaded` is True, as keyword arguments of
+            :class:`pic_scanner.core.pipeline.ScanPipeline` (`io_workers`, `cpu_workers`, `build_workers`,
+            `queue_size`).
+
+        cpu_executor (Union[str, Executor]):
+            Where the pipeline runs the CPU-bound preprocessing when `threaded` is True: 'thread', 'process' or an
+            executor of your own.
+
+        cache (Union[bool, ResultCache, None]):
+            A result cache to consult before uploading each image, and to store new results in, so unchanged files are
+            not sent again when a library is rescanned. True for the default cache of the server (see
+            :class:`pic_scanner.core.cache.ResultCache`).
+
+        index (Union[bool, FileIndex, None]):
+            A file index to classify each image against by its stat fingerprint (device, inode, size and modification
+            time), so images unchanged since the last scan are not even read. True for the default index (see
+            :class:`pic_scanner.helpers.filesystem.index.FileIndex`).
+
+        clean_filter (Union[bool, CleanFilter, None]):
+            A filter of the checksums of images known to be clean, consulted before the result cache and the server.
+            It must belong to the server (and the model of the result cache, if any) scanned with. True for the default
+            filter, which is loaded (or discarded, if it belongs to another server or model) and saved again afterwards
+            (see :class:`pic_scanner.core.clean_filter.CleanFilter`).
+
+        journal (Union[bool, ScanJournal, None]):
+            A progress journal to append every result and failure to, so the scan can be resumed if it is interrupted.
+            True for a new job; its ID is logged (see :class:`pic_scanner.core.journal.ScanJournal`). The journal is
+            closed when the scan ends.
+
+        resume (Optional[str]):
+            The ID of an interrupted job to resume. Its journal is replayed to rebuild the results it holds, and only
+            the images without a result are scanned. Implies `journal`.
+
+        dedup (bool):
+            A flag indicating whether byte-identical copies are scanned only once. The files are grouped by size, then
+            by a checksum of their first and last bytes, then by their full checksum (see
+            :func:`pic_scanner.helpers.filesystem.dedup.find_duplicates`), so only files that share their size are
+            read. The result of each group's first file is copied to the others.
+
+        similarity (Union[bool, SimilarityIndex, None]):
+            An index of the perceptual hashes of scanned images. An image within its radius of one already scanned (a
+            resized or recompressed copy) reuses that result instead of being uploaded. True for the default index of
+            the server (see :class:`pic_scanner.core.similarity.SimilarityIndex`; requires `numpy`).
+
+    Returns:
+        ScannedImageCollection:
+            The scanned images.
+
+    Raises:
+        ValueError:
+            If the image paths are invalid, or the clean filter belongs to another server or model.
+
+    """
+    scanned_images = ScannedImageCollection()
+
+    if MOD_LOGGER.find_child_by_name('scan_images'):
+        log = MOD_LOGGER.find_child_by_name('scan_images')[0]
+    else:
+        log = MOD_LOGGER.get_child('scan_images')
+
+    image_paths = _prepare_image_paths(
+        log,
+        image_paths,
+        do_not_convert_paths=do_not_convert_paths,
+        do_not_provision_paths=do_not_provision_paths,
+        **kwargs
+    )
+
+    duplicates = {}
+
+    if dedup:
+        image_paths, duplicates = deduplicate(image_paths)
+        log.info(f'Found {sum(len(group.duplicates) for group in duplicates.values())} duplicates of '
+                 f'{len(duplicates)} images; scanning {len(image_paths)} unique images.')
+
+    if limiter is not None or adaptive:
+        threaded = True
+
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(
+                min_limit=min_concurrency,
+                max_limit=max_concurrency or num_threads * 4,
+                initial_limit=num_threads
+            )
+
+        # One worker per slot the limiter may ever grant; the limiter keeps the surplus idle.
+        num_threads = limiter.max_limit
+
+    owns_hedged_client = hedge_percentile is not None
+
+    if client is None:
+        pool_size = num_threads if threaded else None
+
+        # Every worker may have a duplicate in flight besides its own request. With only one connection per worker,
+        # the duplicate would wait for a connection behind the very requests it is meant to overtake.
+        if owns_hedged_client and pool_size is not None:
+            pool_size *= 2
+
+        client = get_client(base_url, pool_size=pool_size)
+
+    if owns_hedged_client:
+        client = HedgedClient(client, percentile=hedge_percentile, budget=hedge_budget)
+
+    cache = _resolve_cache(cache, client, base_url)
+    index = _resolve_index(index, cache, client, base_url)
+    owns_clean_filter = clean_filter is True
+    clean_filter = _resolve_clean_filter(clean_filter, cache, client, base_url)
+    similarity = _resolve_similarity(similarity, client, base_url)
+
+    if resume is not None or journal is True:
+        journal = ScanJournal(resume)
+
+    if journal:
+        log.info(f'Journaling scan job {journal.job_id}.')
+        image_paths = _replay_journal(log, journal, scanned_images, image_paths)
+
+    try:
+        with journal or nullcontext():
+            return _dispatch_scan(
+                log,
+                scanned_images,
+                image_paths,
+                prog_bar=prog_bar,
+                threaded=threaded,
+                num_threads=num_threads,
+                base_url=base_url,
+                client=client,
+                batch_size=batch_size,
+                preprocessor=preprocessor,
+                limiter=limiter,
+                stage_workers=stage_workers,
+                cpu_executor=cpu_executor,
+                cache=cache,
+                index=index,
+                clean_filter=clean_filter,
+                similarity=similarity,
+                journal=journal or None,
+                duplicates=duplicates
+            )
+    finally:
+        if owns_clean_filter:
+            clean_filter.save()
+
+        if owns_hedged_client:
+            client.close()
+
+
+def _replay_journal(log, journal: ScanJournal, scanned_images, image_paths) -> list:
+    """
+    Rebuild the scanned images recorded in a journal, and return the image paths that remain to be scanned.
+    """
+    remaining = []
+
+    for image_path in image_paths:
+        if (record := journal.results.get(str(image_path))) is None:
+            remaining.append(image_path)
+            continue
+
+        result = {'image_path': image_path, 'result': record['result']}
+        scanned_images.add_image(create_scanned_image(result, checksum=record.get('checksum')))
+
+    log.info(f'Restored {len(image_paths) - len(remaining)} results from the journal; {len(remaining)} images '
+             f'remain to be scanned.')
+
+    return remaining
+
+
+def _add_duplicates(log, scanned_images, duplicates):
+    """
+    Add a copy of the scanned image of each representative for each of its duplicates.
+    """
+    if not duplicates:
+        return
+
+    scanned = {str(image.image_path): image for image in scanned_images.images}
+    copied = 0
+
+    for representative, group in duplicates.items():
+        if (image := scanned.get(str(Path(representative)))) is None:
+            log.warning(f'Failed to scan image: {representative}, nor its {len(group.duplicates)} duplicates!')
+            continue
+
+        for image_path in group.duplicates:
+            scanned_images.add_image(image.copy_for(image_path))
+            copied += 1
+
+    log.debug(f'Copied the results of {len(duplicates)} images to {copied} duplicates.')
+
+
+def _dispatch_scan(
+        log,
+        scanned_images,
+        image_paths,
+        prog_bar,
+        threaded,
+        num_threads,
+        base_url,
+        client,
+        batch_size,
+        preprocessor,
+        limiter,
+        stage_workers,
+        cpu_executor,
+        cache,
+        index,
+        clean_filter,
+        similarity,
+        journal,
+        duplicates
+):
     if threaded:
         return scan_images_threaded(
                 log,
@@ -166,10 +719,75 @@ def scan_images(
                 image_paths,
                 num_threads=num_threads,
                 enable_progress_bar=prog_bar,
-                prog_bar=tqdm(total=len(image_paths), desc='Scanning Images', unit='image')
+                prog_bar=tqdm(total=len(image_paths), desc='Scanning Images', unit='image'),
+                base_url=base_url,
+                client=client,
+                batch_size=batch_size,
+                preprocessor=preprocessor,
+                limiter=limiter,
+                stage_workers=stage_workers,
+                cpu_executor=cpu_executor,
+                cache=cache,
+                index=index,
+                clean_filter=clean_filter,
+                similarity=similarity,
+                journal=journal,
+                duplicates=duplicates
                 )
 
-    if prog_bar:
+    if batch_size and batch_size > 1:
+        return scan_images_batched(
+                log,
+                scanned_images,
+                image_paths,
+                batch_size,
+                enable_progress_bar=prog_bar,
+                base_url=base_url,
+                client=client,
+                preprocessor=preprocessor,
+                cache=cache,
+                index=index,
+                clean_filter=clean_filter,
+                similarity=similarity,
+                journal=journal,
+                duplicates=duplicates
+                )
+
+    return scan_images_serial(
+            log,
+            scanned_images,
+            image_paths,
+            enable_progress_bar=prog_bar,
+            base_url=base_url,
+            client=client,
+            preprocessor=preprocessor,
+            cache=cache,
+            index=index,
+            clean_filter=clean_filter,
+            similarity=similarity,
+            journal=journal,
+            duplicates=duplicates
+            )
+
+
+def scan_images_serial(
+        log,
+        scanned_images,
+        image_paths,
+        enable_progress_bar=False,
+        base_url=None,
+        client=None,
+        preprocessor=None,
+        cache=None,
+        index=None,
+        clean_filter=None,
+        similarity=None,
+        journal=None,
+        duplicates=None
+):
+    failed_images = []
+
+    if enable_progress_bar:
         log.debug('Progress bar flag is set to True.')
         log.debug('Creating progress bar...')
         image_paths = tqdm(image_paths)
@@ -180,10 +798,20 @@ def scan_images(
 
         try:
 
-            result = analyze_image(image_path, base_url=base_url, do_not_provision=True)
+            result = _analyze_cached(
+                image_path,
+                cache,
+                index,
+                clean_filter,
+                similarity,
+                base_url=base_url,
+                do_not_provision=True,
+                client=client,
+                preprocessor=preprocessor
+            )
             log.debug(f'Creating scanned image from result data: {result}')
 
-            scanned_image = create_scanned_image(result)
+            scanned_image = create_scanned_image(result, checksum=result.get('checksum'))
             log.debug(f'Scanned image created: {scanned_image}')
 
         except Exception as e:
@@ -193,52 +821,497 @@ def scan_images(
 
             log.debug(f'Adding image ({image_path} to failed images list...')
             failed_images.append(image_path)
+
+            if journal is not None:
+                journal.record_failure(image_path, e)
+
             continue
 
         log.debug(f'Adding scanned image ({image_path}) to scanned images collection...')
         scanned_images.add_image(scanned_image)
 
+        if journal is not None:
+            journal.record_result(image_path, result['result'], result.get('checksum'))
+
+    _add_duplicates(log, scanned_images, duplicates)
+    _log_client_stats(log, client)
+    _log_cache_stats(log, cache, index, clean_filter, similarity)
+
     scanned_images.finalize()
     return scanned_images
 
 
-# TODO Rename this here and in `scan_images`
-def scan_images_threaded(log, scanned_images, image_paths, num_threads=8, enable_progress_bar=False, prog_bar=None):
+def _log_client_stats(log, client):
+    if isinstance(client, HedgedClient):
+        stats = client.stats()
+        log.info(f'Hedged {stats["hedged"]} of {stats["requests"]} requests ({stats["hedge_rate"]:.1%}); '
+                 f'{stats["hedge_wins"]} hedged requests answered first.')
+        client = client.client
+
+    if not isinstance(client, EndpointPool):
+        return
+
+    for stats in client.stats():
+        latency = f'{stats["latency"] * 1000:.0f}ms' if stats['latency'] is not None else 'n/a'
+        log.info(f'Endpoint {stats["url"]}: {stats["completed"]} requests ({stats["throughput"]:.1f}/s), '
+                 f'{stats["errors"]} errors, average latency {latency}'
+                 f'{"" if stats["healthy"] else " (ejected)"}.')
+
+
+def _log_cache_stats(log, cache, index=None, clean_filter=None, similarity=None):
+    if similarity is not None:
+        stats = similarity.stats()
+        log.info(f'Similarity index: {stats["hits"]} of {stats["hits"] + stats["misses"]} images matched a '
+                 f'near-duplicate ({stats["hit_rate"]:.1%}); {stats["entries"]} perceptual hashes.')
+
+    if clean_filter is not None:
+        stats = clean_filter.stats()
+        log.info(f'Clean filter: {stats["hits"]} of {stats["lookups"]} images known clean ({stats["hit_rate"]:.1%}); '
+                 f'{stats["count"]} checksums in {stats["size"] / 1024 / 1024:.1f} MiB.')
+
+    if index is not None:
+        stats = index.stats()
+        log.info(f'File index: {stats["unchanged"]} unchanged ({stats["moved"]} moved), {stats["changed"]} changed, '
+                 f'{stats["new"]} new files; {stats["entries"]} entries.')
+
+    if cache is not None:
+        stats = cache.stats()
+        log.info(f'Result cache: {stats["hits"]} hits, {stats["misses"]} misses ({stats["hit_rate"]:.1%} hit rate), '
+                 f'{stats["entries"]} entries, {stats["size"] / 1024 / 1024:.1f} MiB.')
+
+
+def iter_scan_images(
+        paths_or_dir: Union[str, Path, Iterable[Union[str, Path]]],
+        base_url: Optional[Union[str, list[str]]] = None,
+        client: Optional[InferenceClient] = None,
+        max_in_flight: int = 8,
+        batch_size: Optional[int] = None,
+        preprocessor: Optional[Preprocessor] = None,
+        recursive: bool = True,
+        do_not_provision_paths: bool = False,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        stage_workers: Optional[dict] = None,
+        cpu_executor: Union[str, Executor] = 'thread',
+        cache: Union[bool, ResultCache, None] = None,
+        index: Union[bool, FileIndex, None] = None,
+        clean_filter: Union[bool, CleanFilter, None] = None,
+        similarity: Union[bool, SimilarityIndex, None] = None,
+        **kwargs
+) -> Iterator[Union[ScannedImage, ScanFailure]]:
+    """
+    Scan images for NSFW content, yielding each result as soon as it is ready.
+
+    Unlike :func:`scan_images`, nothing is collected: the paths are consumed lazily, at most a bounded number of images
+    are in the pipeline at once, and each :class:`ScannedImage` is handed over as soon as it is built. Memory use
+    therefore stays flat however many images are scanned, and results can be stored or acted on while the scan is still
+    running.
+
+    Parameters:
+        paths_or_dir (Union[str, Path, Iterable[Union[str, Path]]]):
+            A directory to scan, a single image, or an iterable (which may be a lazy generator) of image paths and
+            directories.
+
+        base_url (Optional[Union[str, list[str]]]):
+            The base URL(s) of the API to use.
+
+        client (Optional[InferenceClient]):
+            The client to send the requests with. Defaults to the shared client for `base_url`.
+
+        max_in_flight (int):
+            The number of requests in flight at once.
+
+        batch_size (Optional[int]):
+            If greater than 1, pack up to this many waiting images into each request.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`pic_scanner.api.preprocess.Preprocessor`).
+
+        recursive (bool):
+            A flag indicating whether directories are searched recursively.
+
+        do_not_provision_paths (bool):
+            A flag indicating whether to skip provisioning (expanding and resolving) the paths.
+
+        limiter (Optional[AdaptiveConcurrencyLimiter]):
+            If given, the number of requests in flight adapts to the server (up to the limiter's upper bound).
+
+        stage_workers (Optional[dict]):
+            The sizes of the pipeline stages, as keyword arguments of :class:`pic_scanner.core.pipeline.ScanPipeline`.
+
+        cpu_executor (Union[str, Executor]):
+            Where the CPU-bound preprocessing runs: 'thread', 'process' or an executor of your own.
+
+        cache (Union[bool, ResultCache, None]):
+            A result cache to consult before uploading each image, and to store new results in. True for the default
+            cache of the server (see :class:`pic_scanner.core.cache.ResultCache`).
+
+        index (Union[bool, FileIndex, None]):
+            A file index, so images unchanged since the last scan are not read again. True for the default index (see
+            :class:`pic_scanner.helpers.filesystem.index.FileIndex`).
+
+        clean_filter (Union[bool, CleanFilter, None]):
+            A filter of the checksums of images known to be clean, consulted before the result cache and the server.
+            It must belong to the server (and the model of the result cache, if any) scanned with. True for the default
+            filter, which is loaded (or discarded, if it belongs to another server or model) and saved again afterwards
+            (see :class:`pic_scanner.core.clean_filter.CleanFilter`).
+
+        similarity (Union[bool, SimilarityIndex, None]):
+            An index of the perceptual hashes of scanned images. An image within its radius of one already scanned (a
+            resized or recompressed copy) reuses that result instead of being uploaded. True for the default index of
+            the server (see :class:`pic_scanner.core.similarity.SimilarityIndex`; requires `numpy`).
+
+    Yields:
+        Union[ScannedImage, ScanFailure]:
+            The scanned image, or a failure record holding the path and the error, in completion order.
+
+    Examples:
+        >>> for result in iter_scan_images('~/Pictures'):
+        ...     if isinstance(result, ScanFailure):
+        ...         print(f'Failed: {result.image_path}')
+        ...     elif result.concern_count:
+        ...         result.move(quarantine_dir)
+    """
+    if isinstance(paths_or_dir, (str, Path)):
+        paths_or_dir = [paths_or_dir]
+
+    if not do_not_provision_paths:
+        paths_or_dir = (provision_path(path, **kwargs) for path in paths_or_dir)
+
+    cache = _resolve_cache(cache, client, base_url)
+
+    pipeline = ScanPipeline(
+        client=client,
+        base_url=base_url,
+        preprocessor=preprocessor,
+        batch_size=batch_size,
+        limiter=limiter,
+        recursive=recursive,
+        infer_workers=max_in_flight,
+        cpu_executor=cpu_executor,
+        cache=cache,
+        index=_resolve_index(index, cache, client, base_url),
+        clean_filter=_resolve_clean_filter(clean_filter, cache, client, base_url),
+        similarity=_resolve_similarity(similarity, client, base_url),
+        **(stage_workers or {})
+    )
+
+    try:
+        for item in pipeline.run(paths_or_dir):
+            if item.failed:
+                yield ScanFailure(item.image_path, item.error)
+            else:
+                yield item.scanned_image
+    finally:
+        if clean_filter is True:
+            pipeline.clean_filter.save()
+
+
+def scan_images_threaded(
+        log,
+        scanned_images,
+        image_paths,
+        num_threads=8,
+        enable_progress_bar=False,
+        prog_bar=None,
+        base_url=None,
+        client=None,
+        batch_size=None,
+        preprocessor=None,
+        limiter=None,
+        stage_workers=None,
+        cpu_executor='thread',
+        cache=None,
+        index=None,
+        clean_filter=None,
+        similarity=None,
+        journal=None,
+        duplicates=None
+):
     log.debug('Threading flag is set to True.')
-    log.debug('Creating queue...')
-    queue = Queue()
-    log.debug('Queue created.')
+    log.debug('Creating scan pipeline...')
+    pipeline = ScanPipeline(
+        client=client,
+        base_url=base_url,
+        preprocessor=preprocessor,
+        batch_size=batch_size,
+        limiter=limiter,
+        infer_workers=num_threads,
+        cpu_executor=cpu_executor,
+        cache=cache,
+        index=index,
+        clean_filter=clean_filter,
+        similarity=similarity,
+        **(stage_workers or {})
+    )
+    log.debug(f'Scan pipeline created: {", ".join(f"{s.name} ({s.workers})" for s in pipeline.pipeline.stages)}.')
 
-    log.debug('Creating worker threads...')
-    workers = [Worker(queue, scanned_images, enable_progress_bar=enable_progress_bar,prog_bar=prog_bar) for _ in range(
-            num_threads)]
-    log.debug(f'{len(workers)} Worker threads created.')
+    failed_images = []
 
-    log.debug('Starting worker threads...')
-    for worker in workers:
-        worker.start()
-    log.debug('Worker threads started.')
+    for item in pipeline.run(image_paths):
+        if item.failed:
+            log.warning(f'Failed to scan image: {item.image_path} ({item.error})')
+            failed_images.append(item.image_path)
 
-    log.debug('Adding image paths to queue...')
-    for image_path in image_paths:
-        queue.put(image_path)
-    log.debug('Image paths added to queue.')
+            if journal is not None:
+                journal.record_failure(item.image_path, item.error)
+        else:
+            scanned_images.add_image(item.scanned_image)
+
+            if journal is not None:
+                journal.record_result(item.image_path, item.result, item.checksum)
 
-    log.debug('Waiting for queue to empty...')
-    queue.join()
-    log.debug('Queue emptied.')
+        if enable_progress_bar:
+            prog_bar.update(1)
 
-    log.debug('Adding None to queue to signal end of processing...')
-    for _ in range(num_threads):
-        queue.put(None)
-    log.debug('None added to queue.')
+    log.debug(f'Scanned {scanned_images.image_count} images; {len(failed_images)} failed.')
 
-    log.debug('Waiting for worker threads to finish...')
-    for worker in workers:
-        worker.join()
+    if limiter is not None:
+        summary = limiter.summary()
+        log.info(f'Adaptive concurrency settled at {summary["limit"]} requests in flight (peak {summary["peak_limit"]}, '
+                 f'bounds {summary["min_limit"]}..{summary["max_limit"]}, error rate {summary["error_rate"]:.1%}).')
 
-    log.debug('Worker threads finished.')
+    _add_duplicates(log, scanned_images, duplicates)
+    _log_client_stats(log, client)
+    _log_cache_stats(log, cache, index, clean_filter, similarity)
 
     scanned_images.finalize()
 
     return scanned_images
+
+
+def scan_images_batched(
+        log,
+        scanned_images,
+        image_paths,
+        batch_size,
+        enable_progress_bar=False,
+        base_url=None,
+        client=None,
+        preprocessor=None,
+        cache=None,
+        index=None,
+        clean_filter=None,
+        similarity=None,
+        journal=None,
+        duplicates=None
+):
+    log.debug(f'Batch size is set to {batch_size}.')
+    prog_bar = None
+
+    if enable_progress_bar:
+        log.debug('Creating progress bar...')
+        prog_bar = tqdm(total=len(image_paths), desc='Scanning Images', unit='image')
+
+    failed_images = []
+    prehashed = None
+
+    if index is None and (cache is not None or clean_filter is not None):
+        # Hash the next batches on a thread pool while the current one is being uploaded. (With a file index, most
+        # files need no hashing at all.)
+        prehashed = iter_image_checksums(image_paths, prefetch=2 * batch_size)
+
+    for batch in iter_batches(image_paths, batch_size):
+        log.debug(f'Scanning batch of {len(batch)} images starting with: {batch[0]}')
+
+        results, pending, known = [], batch, {}
+
+        if cache is not None or index is not None or clean_filter is not None or similarity is not None:
+            pending = []
+
+            for image_path in batch:
+                try:
+                    if prehashed is not None and (hashed := next(prehashed)).error is not None:
+                        raise hashed.error
+
+                    checksum, cached, indexed, _ = _lookup_known(
+                        image_path, cache, index, clean_filter, checksum=hashed.checksum if prehashed else None
+                    )
+                except Exception as e:
+                    results.append({'image_path': image_path, 'error': e})
+                    continue
+
+                perceptual_hash = None
+
+                if cached is None and similarity is not None:
+                    perceptual_hash, cached = _lookup_similar(similarity, image_path)
+
+                if cached is not None:
+                    results.append({'image_path': image_path, 'result': cached})
+                else:
+                    pending.append(image_path)
+
+                known[image_path] = checksum, indexed, perceptual_hash
+
+        if pending:
+            results.extend(analyze_images_batch(
+                pending,
+                batch_size=batch_size,
+                base_url=base_url,
+                client=client,
+                do_not_provision=True,
+                preprocessor=preprocessor
+            ))
+
+        for result in results:
+            image_path = result['image_path']
+            checksum, indexed, perceptual_hash = known.get(image_path, (None, None, None))
+
+            try:
+                if 'error' in result:
+                    raise result['error']
+
+                if image_path in known:
+                    _remember(
+                        image_path,
+                        checksum,
+                        result['result'],
+                        image_path in pending,
+                        cache,
+                        index,
+                        indexed,
+                        clean_filter,
+                        similarity,
+                        perceptual_hash
+                    )
+
+                scanned_image = create_scanned_image(result, checksum=checksum)
+            except Exception as e:
+                log.warning(f'Failed to scan image: {image_path}!')
+                failed_images.append(image_path)
+
+                if journal is not None:
+                    journal.record_failure(image_path, e)
+
+                continue
+
+            scanned_images.add_image(scanned_image)
+
+            if journal is not None:
+                journal.record_result(image_path, result['result'], checksum)
+
+        if prog_bar is not None:
+            prog_bar.update(len(batch))
+
+    if prog_bar is not None:
+        prog_bar.close()
+
+    log.debug(f'Scanned {scanned_images.image_count} images; {len(failed_images)} failed.')
+
+    _add_duplicates(log, scanned_images, duplicates)
+    _log_client_stats(log, client)
+    _log_cache_stats(log, cache, index, clean_filter, similarity)
+
+    scanned_images.finalize()
+
+    return scanned_images
+
+async def scan_images_async(
+        image_paths: Union[list[Union[str, Path]], Path],
+        base_url: Optional[str] = None,
+        do_not_convert_paths: bool = False,
+        do_not_provision_paths: bool = False,
+        prog_bar: bool = False,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        client: Optional[AsyncInferenceClient] = None,
+        preprocessor: Optional[Preprocessor] = None,
+        **kwargs
+) -> ScannedImageCollection:
+    """
+    Scan a collection of images for NSFW content on the running event loop.
+
+    Instead of one OS thread per concurrent request, a fixed number of coroutines pull paths from a shared iterator,
+    and the client's semaphore bounds the number of requests in flight.
+
+    Parameters:
+        image_paths (Union[list[Union[str, Path]], Path]):
+            The paths to the images to scan.
+
+        base_url (Optional[str]):
+            The base URL of the API to use. Ignored when `client` is given.
+
+        do_not_convert_paths (bool):
+            A flag indicating whether to convert the paths to strings.
+
+        do_not_provision_paths (bool):
+            A flag indicating whether to provision the paths.
+
+        prog_bar (bool):
+            A flag indicating whether to display a progress bar.
+
+        max_in_flight (int):
+            The maximum number of requests in flight at once.
+
+        client (Optional[AsyncInferenceClient]):
+            The client to send the requests with. If not given, one is created for `base_url` and closed once the
+            scan is finished.
+
+        preprocessor (Optional[Preprocessor]):
+            If given, large images are downscaled before upload (see :class:`pic_scanner.api.preprocess.Preprocessor`).
+
+    Returns:
+        ScannedImageCollection:
+            The scanned images.
+
+    Raises:
+        ValueError:
+            If the image paths are invalid.
+    """
+    scanned_images = ScannedImageCollection()
+    failed_images = []
+
+    if MOD_LOGGER.find_child_by_name('scan_images_async'):
+        log = MOD_LOGGER.find_child_by_name('scan_images_async')[0]
+    else:
+        log = MOD_LOGGER.get_child('scan_images_async')
+
+    image_paths = _prepare_image_paths(
+        log,
+        image_paths,
+        do_not_convert_paths=do_not_convert_paths,
+        do_not_provision_paths=do_not_provision_paths,
+        **kwargs
+    )
+
+    owns_client = client is None
+    if owns_client:
+        client = AsyncInferenceClient(base_url, max_in_flight=max_in_flight)
+
+    progress = tqdm(total=len(image_paths), desc='Scanning Images', unit='image') if prog_bar else None
+    pending = iter(image_paths)
+
+    async def worker():
+        for image_path in pending:
+            log.debug(f'Scanning image: {image_path}')
+
+            try:
+                result = await analyze_image_async(
+                    image_path,
+                    client=client,
+                    do_not_provision=True,
+                    preprocessor=preprocessor
+                )
+                scanned_image = create_scanned_image(result)
+            except Exception:
+                log.warning(f'Failed to scan image: {image_path}!')
+                failed_images.append(image_path)
+            else:
+                scanned_images.add_image(scanned_image)
+            finally:
+                if progress is not None:
+                    progress.update(1)
+
+    log.debug(f'Starting {max_in_flight} scanning coroutines...')
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(max_in_flight, len(image_paths))))))
+    finally:
+        if owns_client:
+            await client.close()
+
+        if progress is not None:
+            progress.close()
+
+    log.debug(f'Scanned {scanned_images.image_count} images; {len(failed_images)} failed.')
+
+    scanned_images.finalize()
+    return scanned_images
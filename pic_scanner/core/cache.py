@@ -0,0 +1,380 @@
+"""
+cache.py
+
+This module provides a persistent, content-addressed cache of inference results.
+
+The :class:`ResultCache` is an SQLite database (at :data:`CACHE_FILE_PATH` by default) mapping the checksum of an image
+file to the result the inference server returned for it. Entries are also keyed by the identity of the server (its base
+URL) and of the model, so results from a different server or model are never mixed up. A rescan of an unchanged
+library then only costs hashing.
+
+The database runs in write-ahead-log mode with a busy timeout, and each thread uses its own connection, so it is safe
+for the scan pipeline's workers and for several scanner processes to read and write at the same time. Entries are
+evicted when they grow older than `max_age`, and the oldest entries are evicted when there are more than `max_entries`.
+
+Classes:
+    ResultCache:
+        A persistent cache of inference results.
+
+
+Since:
+    1.0
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from time import time
+from typing import Iterator, Optional, Union
+
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.common.constants.defaults.files import CACHE_FILE_PATH
+from pic_scanner.core import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'ResultCache',
+    'server_identity',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('cache')
+
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+"""
+int:
+    The default maximum number of entries kept in the cache.
+"""
+
+EVICT_EVERY = 1000
+"""
+int:
+    The number of new entries after which the eviction policy is applied again.
+"""
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    checksum  TEXT NOT NULL,
+    server    TEXT NOT NULL,
+    model     TEXT NOT NULL,
+    result    TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (checksum, server, model)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at);
+'''
+
+
+def server_identity(base_url) -> str:
+    """
+    Get the identity of an inference server, for use as a cache key.
+
+    Parameters:
+        base_url (Union[str, list[str], tuple[str]]):
+            The base URL of the server, or the base URLs of its replicas.
+
+    Returns:
+        str:
+            The identity of the server; replicas of one server share an identity regardless of their order.
+    """
+    if isinstance(base_url, str):
+        return base_url
+
+    return ','.join(sorted(base_url))
+
+
+class ResultCache:
+    """
+    A persistent cache of inference results, keyed by file checksum and by server and model identity.
+
+    The cache is thread-safe and may be shared with other processes.
+
+    Properties:
+        model (str):
+            The identity of the model the results belong to.
+
+        path (Path):
+            The path of the database.
+
+        server (str):
+            The identity of the server the results belong to.
+
+    Methods:
+        clear():
+            Remove every entry of this server and model.
+
+        close():
+            Close the calling thread's connection.
+
+        evict():
+            Apply the age and size limits.
+
+        get(checksum):
+            Get the cached result for a checksum.
+
+        items():
+            Iterate over the checksums and results of this server and model.
+
+        put(checksum, result):
+            Store the result for a checksum.
+
+        stats():
+            Get the hit, miss and size statistics of the cache.
+    """
+
+    def __init__(
+            self,
+            path:        Optional[Union[str, Path]] = None,
+            server:      Optional[Union[str, list[str], tuple[str]]] = None,
+            model:       Optional[str] = None,
+            max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+            max_age:     Optional[float] = None,
+            timeout:     float = 30.0,
+    ):
+        """
+        The constructor for the ResultCache class.
+
+        Parameters:
+            path (Optional[Union[str, Path]]):
+                The path of the database. Defaults to :data:`CACHE_FILE_PATH`.
+
+            server (Optional[Union[str, list[str], tuple[str]]]):
+                The base URL(s) of the inference server the results come from. Defaults to :data:`DEFAULT_BASE_URL`.
+
+            model (Optional[str]):
+                The identity of the model (for example, its name and version). Change it when the model changes, so
+                stale results are not reused.
+
+            max_entries (Optional[int]):
+                The maximum number of entries kept (across every server and model). None for no limit.
+
+            max_age (Optional[float]):
+                The number of seconds an entry is kept. None for no limit.
+
+            timeout (float):
+                The number of seconds to wait for another writer to release the database.
+        """
+        self.__path = Path(path or CACHE_FILE_PATH)
+        self.__server = server_identity(server or DEFAULT_BASE_URL)
+        self.__model = model or ''
+        self.__max_entries = max_entries
+        self.__max_age = max_age
+        self.__timeout = timeout
+
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__puts = 0
+        self.__evicted = 0
+        self.__since_evict = 0
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection.executescript(_SCHEMA)
+        self.evict()
+
+    def __repr__(self):
+        return f'ResultCache({str(self.path)!r}, server={self.server!r}, model={self.model!r})'
+
+    @property
+    def model(self) -> str:
+        """
+        Get the identity of the model the results belong to.
+
+        Returns:
+            str:
+                The model identity.
+        """
+        return self.__model
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the path of the database.
+
+        Returns:
+            Path:
+                The path of the database.
+        """
+        return self.__path
+
+    @property
+    def server(self) -> str:
+        """
+        Get the identity of the server the results belong to.
+
+        Returns:
+            str:
+                The server identity.
+        """
+        return self.__server
+
+    @property
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.__path, timeout=self.__timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+
+        return connection
+
+    def get(self, checksum: Optional[str]) -> Optional[dict]:
+        """
+        Get the cached result for a checksum.
+
+        Parameters:
+            checksum (Optional[str]):
+                The checksum of the image file.
+
+        Returns:
+            Optional[dict]:
+                The cached result (`{'prediction': [...]}`), or None on a miss.
+        """
+        if checksum is None:
+            return None
+
+        row = self.__connection.execute(
+            'SELECT result, stored_at FROM results WHERE checksum = ? AND server = ? AND model = ?',
+            (checksum, self.__server, self.__model)
+        ).fetchone()
+
+        if row is not None and self.__max_age is not None and row[1] < time() - self.__max_age:
+            row = None
+
+        with self.__lock:
+            if row is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+
+        return json.loads(row[0]) if row is not None else None
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        """
+        Iterate over the checksums and results of this server and model (for example, to build a
+        :class:`pic_scanner.core.clean_filter.CleanFilter`).
+
+        Yields:
+            tuple[str, dict]:
+                Each checksum and its result.
+        """
+        rows = self.__connection.execute(
+            'SELECT checksum, result FROM results WHERE server = ? AND model = ?', (self.__server, self.__model)
+        )
+
+        for checksum, result in rows:
+            yield checksum, json.loads(result)
+
+    def put(self, checksum: str, result: dict):
+        """
+        Store the result for a checksum, replacing any older result.
+
+        Parameters:
+            checksum (str):
+                The checksum of the image file.
+
+            result (dict):
+                The result of the inference server.
+
+        Returns:
+            None
+        """
+        self.__connection.execute(
+            'INSERT OR REPLACE INTO results (checksum, server, model, result, stored_at) VALUES (?, ?, ?, ?, ?)',
+            (checksum, self.__server, self.__model, json.dumps(result, separators=(',', ':')), time())
+        )
+
+        with self.__lock:
+            self.__puts += 1
+            self.__since_evict += 1
+            evict = self.__since_evict >= EVICT_EVERY
+
+            if evict:
+                self.__since_evict = 0
+
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Apply the age and size limits, removing expired entries and then the oldest entries over `max_entries`.
+
+        Returns:
+            int:
+                The number of entries removed.
+        """
+        removed = 0
+
+        if self.__max_age is not None:
+            removed += self.__connection.execute(
+                'DELETE FROM results WHERE stored_at < ?', (time() - self.__max_age,)
+            ).rowcount
+
+        if self.__max_entries is not None:
+            count = self.__connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+            if count > self.__max_entries:
+                removed += self.__connection.execute(
+                    'DELETE FROM results WHERE (checksum, server, model) IN '
+                    '(SELECT checksum, server, model FROM results ORDER BY stored_at LIMIT ?)',
+                    (count - self.__max_entries,)
+                ).rowcount
+
+        if removed:
+            MOD_LOGGER.debug(f'Evicted {removed} entries from the result cache.')
+
+            with self.__lock:
+                self.__evicted += removed
+
+        return removed
+
+    def clear(self):
+        """
+        Remove every entry of this server and model.
+
+        Returns:
+            None
+        """
+        self.__connection.execute('DELETE FROM results WHERE server = ? AND model = ?', (self.__server, self.__model))
+
+    def stats(self) -> dict:
+        """
+        Get the hit, miss and size statistics of the cache.
+
+        Returns:
+            dict:
+                The number of hits, misses, stored and evicted entries (since this object was created), the hit rate,
+                the number of entries in the database and the size of the database file, in bytes.
+        """
+        entries = self.__connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        size = sum(path.stat().st_size for path in self.__path.parent.glob(f'{self.__path.name}*') if path.is_file())
+
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'puts': self.__puts,
+                'evicted': self.__evicted,
+                'hit_rate': self.__hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'size': size,
+            }
+
+    def close(self):
+        """
+        Close the calling thread's connection to the database.
+
+        Returns:
+            None
+        """
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
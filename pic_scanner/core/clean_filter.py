@@ -0,0 +1,854 @@
+"""
+clean_filter.py
+
+This module provides a compact, persistent set of the checksums of images known to be clean.
+
+Most images never produce a concern, and a result cache that keeps every one of them grows with the library. A
+:class:`CleanFilter` instead remembers only which checksums scanned clean, in a Bloom filter of a few bytes per image,
+so a membership test is a handful of bit lookups and the whole set fits in memory even for a hundred million files.
+
+A Bloom filter has no false negatives, but a small, configurable rate of false positives: an image that was never
+scanned (or that has concerns) may be reported as clean with probability `error_rate`. The default rate is deliberately
+tiny (one in a million). To keep the rate bounded as the library grows and changes, the filter is split into
+generations: new checksums go into the newest one, and when it is full (or when :meth:`CleanFilter.rotate` is called)
+the oldest generation is dropped, so checksums that are not seen again eventually age out.
+
+Like the :class:`pic_scanner.core.cache.ResultCache`, a filter belongs to the identity of a server and of a model: an
+image that was clean for one model may not be for another, so a saved filter is only used for the server and model it
+was built with.
+
+Classes:
+    BloomFilter:
+        A fixed-size Bloom filter of strings.
+
+    CleanFilter:
+        A generational Bloom filter of the checksums of images known to be clean.
+
+Functions:
+    clean_result:
+        Get the result used for an image found in the clean filter.
+
+    is_clean:
+        Check whether a result holds no detection above a threshold.
+
+
+Since:
+    1.0
+"""
+import json
+import math
+import os
+import threading
+from hashlib import blake2b
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.common.constants.defaults.files import CLEAN_FILTER_FILE_PATH
+from pic_scanner.core import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.core.cache import server_identity
+
+
+__all__ = [
+    'BloomFilter',
+    'CleanFilter',
+    'clean_result',
+    'is_clean',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('clean_filter')
+
+
+_MAGIC = b'PSCLEAN2'
+
+
+def clean_result() -> dict:
+    """
+    Get the result used for an image found in the clean filter: one image without detections.
+
+    Returns:
+        dict:
+            A new result (`{'prediction': [[]]}`), so a caller changing it does not change any other.
+    """
+    return {'prediction': [[]]}
+
+
+def is_clean(result: dict, threshold: float = 0.0) -> bool:
+    """
+    Check whether a result of the inference server holds no detection above a threshold.
+
+    Parameters:
+        result (dict):
+            The result (`{'prediction': [[...]]}`).
+
+        threshold (float):
+            The score a detection must exceed to count.
+
+    Returns:
+        bool:
+            True if no detection scored above the threshold, False otherwise.
+    """
+    return not any(
+        detection.get('score', 0.0) > threshold
+        for detections in result.get('prediction', [])
+        for detection in detections
+    )
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter of strings.
+
+    Properties:
+        capacity (int):
+            The number of items the filter is sized for.
+
+        count (int):
+            The number of items added.
+
+        error_rate (float):
+            The false positive rate at capacity.
+
+        hash_count (int):
+            The number of bits set per item.
+
+        size (int):
+            The number of bits.
+
+    Methods:
+        add(key):
+            Add a key.
+
+        update(keys):
+            Add several keys.
+
+        union(other):
+            Get a filter holding the keys of both filters.
+    """
+
+    def __init__(
+            self,
+            capacity:   int = 1_000_000,
+            error_rate: float = 1e-6,
+            bits:       Optional[bytearray] = None,
+            count:      int = 0
+    ):
+        """
+        The constructor for the BloomFilter class.
+
+        Parameters:
+            capacity (int):
+                The number of items the filter is sized for. Past it, the false positive rate climbs above
+                `error_rate`.
+
+            error_rate (float):
+                The false positive rate at capacity.
+
+            bits (Optional[bytearray]):
+                The bits of a saved filter with the same capacity and error rate.
+
+            count (int):
+                The number of items in `bits`.
+
+        Raises:
+            ValueError:
+                If the capacity, error rate or bits are invalid.
+        """
+        if capacity < 1:
+            raise ValueError(f"Invalid capacity: {capacity}!")
+
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Invalid error rate: {error_rate}!")
+
+        self.__capacity = capacity
+        self.__error_rate = error_rate
+        optimal_size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        # Rounded up to a power of two, so every odd step is coprime with the size (see `__positions`).
+        self.__size = 1 << max(3, (optimal_size - 1).bit_length())
+        self.__hash_count = max(1, round(self.__size / capacity * math.log(2)))
+
+        if bits is None:
+            bits = bytearray((self.__size + 7) // 8)
+        elif len(bits) != (self.__size + 7) // 8:
+            raise ValueError(f"Expected {(self.__size + 7) // 8} bytes of bits, received {len(bits)}!")
+
+        self.__bits = bits
+        self.__count = count
+        self.__lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.__bits
+
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+    def __len__(self):
+        return self.__count
+
+    def __or__(self, other: 'BloomFilter') -> 'BloomFilter':
+        return self.union(other)
+
+    def __repr__(self):
+        return f'BloomFilter(capacity={self.__capacity}, error_rate={self.__error_rate}, count={self.__count})'
+
+    @property
+    def bits(self) -> bytearray:
+        """
+        Get the bits of the filter.
+
+        Returns:
+            bytearray:
+                The bits.
+        """
+        return self.__bits
+
+    @property
+    def capacity(self) -> int:
+        """
+        Get the number of items the filter is sized for.
+
+        Returns:
+            int:
+                The capacity.
+        """
+        return self.__capacity
+
+    @property
+    def count(self) -> int:
+        """
+        Get the number of items added (duplicates included).
+
+        Returns:
+            int:
+                The number of items.
+        """
+        return self.__count
+
+    @property
+    def error_rate(self) -> float:
+        """
+        Get the false positive rate at capacity.
+
+        Returns:
+            float:
+                The error rate.
+        """
+        return self.__error_rate
+
+    @property
+    def full(self) -> bool:
+        """
+        Get the full status of the filter.
+
+        Returns:
+            bool:
+                True if the filter holds as many items as it is sized for, False otherwise.
+        """
+        return self.__count >= self.__capacity
+
+    @property
+    def hash_count(self) -> int:
+        """
+        Get the number of bits set per item.
+
+        Returns:
+            int:
+                The number of hash functions.
+        """
+        return self.__hash_count
+
+    @property
+    def size(self) -> int:
+        """
+        Get the number of bits of the filter.
+
+        Returns:
+            int:
+                The number of bits.
+        """
+        return self.__size
+
+    def __positions(self, key: str):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        # The size is a power of two, so an odd step is coprime with it and visits distinct positions for every hash
+        # function.
+        step = int.from_bytes(digest[8:], 'little') | 1
+        mask = self.__size - 1
+
+        return ((first + i * step) & mask for i in range(self.__hash_count))
+
+    def add(self, key: str):
+        """
+        Add a key to the filter.
+
+        Parameters:
+            key (str):
+                The key.
+
+        Returns:
+            None
+        """
+        positions = list(self.__positions(key))
+
+        with self.__lock:
+            bits = self.__bits
+
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+
+            self.__count += 1
+
+    def update(self, keys: Iterable[str]):
+        """
+        Add several keys to the filter.
+
+        Parameters:
+            keys (Iterable[str]):
+                The keys.
+
+        Returns:
+            None
+        """
+        for key in keys:
+            self.add(key)
+
+    def union(self, other: 'BloomFilter') -> 'BloomFilter':
+        """
+        Get a filter holding the keys of both filters.
+
+        Parameters:
+            other (BloomFilter):
+                A filter of the same capacity and error rate.
+
+        Returns:
+            BloomFilter:
+                The union of the filters.
+
+        Raises:
+            ValueError:
+                If the filters are not the same size.
+        """
+        if (other.capacity, other.error_rate) != (self.__capacity, self.__error_rate):
+            raise ValueError('Only filters of the same capacity and error rate can be merged!')
+
+        length = len(self.__bits)
+        bits = int.from_bytes(self.__bits, 'little') | int.from_bytes(other.bits, 'little')
+
+        return BloomFilter(
+            self.__capacity,
+            self.__error_rate,
+            bytearray(bits.to_bytes(length, 'little')),
+            self.__count + other.count
+        )
+
+
+class CleanFilter:
+    """
+    A generational Bloom filter of the checksums of images known to be clean.
+
+    Properties:
+        capacity (int):
+            The number of checksums each generation is sized for.
+
+        error_rate (float):
+            The false positive rate of each generation at capacity.
+
+        generations (list[BloomFilter]):
+            The generations, oldest first.
+
+        model (str):
+            The identity of the model the filter belongs to.
+
+        path (Optional[Path]):
+            The path the filter is saved to.
+
+        server (str):
+            The identity of the server the filter belongs to.
+
+        threshold (float):
+            The score a detection must exceed for an image not to count as clean.
+
+    Methods:
+        add(checksum):
+            Add the checksum of a clean image.
+
+        build(records, ...):
+            Build a filter from checksums and results.
+
+        load(path=None, server=None, model=None):
+            Load a saved filter.
+
+        matches(server, model=None):
+            Check whether the filter belongs to a server and model.
+
+        merge(other):
+            Add the checksums of another filter.
+
+        open(path=None, server=None, model=None, **kwargs):
+            Load a saved filter, or create a new one.
+
+        record(checksum, result):
+            Add a checksum if its result is clean.
+
+        rotate():
+            Drop the oldest generation and start a new one.
+
+        save(path=None):
+            Save the filter.
+
+        stats():
+            Get the statistics of the filter.
+    """
+
+    def __init__(
+            self,
+            capacity:    int = 1_000_000,
+            error_rate:  float = 1e-6,
+            threshold:   float = 0.0,
+            generations: int = 2,
+            path:        Optional[Union[str, Path]] = None,
+            server:      Optional[Union[str, list[str], tuple[str]]] = None,
+            model:       Optional[str] = None,
+    ):
+        """
+        The constructor for the CleanFilter class.
+
+        Parameters:
+            capacity (int):
+                The number of checksums each generation is sized for. A generation that is full is rotated out.
+
+            error_rate (float):
+                The false positive rate of each generation at capacity. The rate of the whole filter is at most
+                `generations` times this.
+
+            threshold (float):
+                The score a detection must exceed for an image not to count as clean.
+
+            generations (int):
+                The number of generations kept.
+
+            path (Optional[Union[str, Path]]):
+                The path the filter is saved to by :meth:`save`. Defaults to :data:`CLEAN_FILTER_FILE_PATH`.
+
+            server (Optional[Union[str, list[str], tuple[str]]]):
+                The base URL(s) of the inference server the results come from. Defaults to :data:`DEFAULT_BASE_URL`.
+
+            model (Optional[str]):
+                The identity of the model (see :class:`pic_scanner.core.cache.ResultCache`).
+        """
+        if generations < 1:
+            raise ValueError(f"Invalid number of generations: {generations}!")
+
+        self.__capacity = capacity
+        self.__error_rate = error_rate
+        self.__threshold = threshold
+        self.__max_generations = generations
+        self.__path = Path(path or CLEAN_FILTER_FILE_PATH)
+        self.__server = server_identity(server or DEFAULT_BASE_URL)
+        self.__model = model or ''
+        self.__generations = [BloomFilter(capacity, error_rate)]
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__lookups = 0
+
+    def __contains__(self, checksum: Optional[str]) -> bool:
+        if checksum is None:
+            return False
+
+        found = any(checksum in generation for generation in reversed(self.__generations))
+
+        with self.__lock:
+            self.__lookups += 1
+            self.__hits += found
+
+        return found
+
+    def __len__(self):
+        return sum(generation.count for generation in self.__generations)
+
+    def __repr__(self):
+        return (f'CleanFilter(capacity={self.__capacity}, error_rate={self.__error_rate}, '
+                f'threshold={self.__threshold}, server={self.__server!r}, model={self.__model!r}, count={len(self)})')
+
+    @property
+    def capacity(self) -> int:
+        """
+        Get the number of checksums each generation is sized for.
+
+        Returns:
+            int:
+                The capacity.
+        """
+        return self.__capacity
+
+    @property
+    def error_rate(self) -> float:
+        """
+        Get the false positive rate of each generation at capacity.
+
+        Returns:
+            float:
+                The error rate.
+        """
+        return self.__error_rate
+
+    @property
+    def generations(self) -> list:
+        """
+        Get the generations, oldest first.
+
+        Returns:
+            list[BloomFilter]:
+                The generations.
+        """
+        return self.__generations
+
+    @property
+    def model(self) -> str:
+        """
+        Get the identity of the model the filter belongs to.
+
+        Returns:
+            str:
+                The model identity.
+        """
+        return self.__model
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the path the filter is saved to.
+
+        Returns:
+            Path:
+                The path.
+        """
+        return self.__path
+
+    @property
+    def server(self) -> str:
+        """
+        Get the identity of the server the filter belongs to.
+
+        Returns:
+            str:
+                The server identity.
+        """
+        return self.__server
+
+    @property
+    def threshold(self) -> float:
+        """
+        Get the score a detection must exceed for an image not to count as clean.
+
+        Returns:
+            float:
+                The threshold.
+        """
+        return self.__threshold
+
+    def matches(self, server, model: Optional[str] = None) -> bool:
+        """
+        Check whether the filter belongs to a server and model.
+
+        Parameters:
+            server (Union[str, list[str], tuple[str]]):
+                The base URL(s) of the server.
+
+            model (Optional[str]):
+                The identity of the model. None to check the server only.
+
+        Returns:
+            bool:
+                True if the filter belongs to them, False otherwise.
+        """
+        return server_identity(server) == self.__server and (model is None or model == self.__model)
+
+    def add(self, checksum: str):
+        """
+        Add the checksum of a clean image, rotating the generations first if the newest one is full.
+
+        Parameters:
+            checksum (str):
+                The checksum.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if self.__generations[-1].full:
+                self.__rotate()
+
+            generation = self.__generations[-1]
+
+        generation.add(checksum)
+
+    def record(self, checksum: Optional[str], result: dict) -> bool:
+        """
+        Add a checksum if its result is clean.
+
+        Parameters:
+            checksum (Optional[str]):
+                The checksum of the image file.
+
+            result (dict):
+                The result of the inference server for the image.
+
+        Returns:
+            bool:
+                True if the checksum was added, False otherwise.
+        """
+        if checksum is None or not is_clean(result, self.__threshold):
+            return False
+
+        self.add(checksum)
+
+        return True
+
+    def __rotate(self):
+        self.__generations.append(BloomFilter(self.__capacity, self.__error_rate))
+        del self.__generations[:-self.__max_generations]
+
+    def rotate(self):
+        """
+        Drop the oldest generation (if all are in use) and start a new, empty one.
+
+        Checksums that were not added again since the oldest generation was started are forgotten, and will be scanned
+        again.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            self.__rotate()
+
+        MOD_LOGGER.debug(f'Rotated the clean filter; {len(self.__generations)} generations.')
+
+    def merge(self, other: 'CleanFilter'):
+        """
+        Add the checksums of another filter (for example, one built on another machine) to this one.
+
+        The generations are merged newest with newest; both filters must have the same capacity and error rate.
+
+        Parameters:
+            other (CleanFilter):
+                The other filter.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError:
+                If the filters have a different capacity, error rate, threshold, server or model.
+        """
+        if not other.matches(self.__server, self.__model):
+            raise ValueError(f"Cannot merge a filter of server {other.server!r} and model {other.model!r} into one of "
+                             f"server {self.__server!r} and model {self.__model!r}!")
+
+        if other.threshold != self.__threshold:
+            raise ValueError(f"Cannot merge a filter with threshold {other.threshold} into one with threshold "
+                             f"{self.__threshold}!")
+
+        with self.__lock:
+            generations = self.__generations
+            others = other.generations
+
+            while len(generations) < len(others) and len(generations) < self.__max_generations:
+                generations.insert(0, BloomFilter(self.__capacity, self.__error_rate))
+
+            for offset in range(1, min(len(generations), len(others)) + 1):
+                generations[-offset] = generations[-offset] | others[-offset]
+
+    @classmethod
+    def build(cls, records: Iterable[tuple[str, dict]], **kwargs) -> 'CleanFilter':
+        """
+        Build a filter from checksums and the results of their images.
+
+        Parameters:
+            records (Iterable[tuple[str, dict]]):
+                The checksums and results, such as the items of a :class:`pic_scanner.core.cache.ResultCache`.
+
+            **kwargs:
+                Keyword arguments for the constructor.
+
+        Returns:
+            CleanFilter:
+                The filter, holding the checksums of the clean results.
+        """
+        clean_filter = cls(**kwargs)
+
+        for checksum, result in records:
+            clean_filter.record(checksum, result)
+
+        MOD_LOGGER.debug(f'Built a clean filter of {len(clean_filter)} checksums.')
+
+        return clean_filter
+
+    def save(self, path: Optional[Union[str, Path]] = None):
+        """
+        Save the filter, atomically.
+
+        Parameters:
+            path (Optional[Union[str, Path]]):
+                The path to save to. Defaults to :attr:`path`.
+
+        Returns:
+            None
+        """
+        path = Path(path or self.__path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self.__lock:
+            generations = list(self.__generations)
+
+        header = json.dumps({
+            'capacity': self.__capacity,
+            'error_rate': self.__error_rate,
+            'threshold': self.__threshold,
+            'generations': self.__max_generations,
+            'server': self.__server,
+            'model': self.__model,
+            'counts': [generation.count for generation in generations],
+        }).encode()
+
+        temp_path = path.with_name(f'{path.name}.tmp')
+
+        with open(temp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(len(header).to_bytes(4, 'little'))
+            f.write(header)
+
+            for generation in generations:
+                f.write(generation.bits)
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(
+            cls,
+            path:   Optional[Union[str, Path]] = None,
+            server: Optional[Union[str, list[str], tuple[str]]] = None,
+            model:  Optional[str] = None
+    ) -> 'CleanFilter':
+        """
+        Load a saved filter.
+
+        Parameters:
+            path (Optional[Union[str, Path]]):
+                The path of the filter. Defaults to :data:`CLEAN_FILTER_FILE_PATH`.
+
+            server (Optional[Union[str, list[str], tuple[str]]]):
+                The base URL(s) of the server the filter must belong to. None to accept any server.
+
+            model (Optional[str]):
+                The identity of the model the filter must belong to. None to accept any model.
+
+        Returns:
+            CleanFilter:
+                The filter.
+
+        Raises:
+            OSError:
+                If the file cannot be read.
+
+            ValueError:
+                If the file is not a saved clean filter, or belongs to another server or model.
+        """
+        path = Path(path or CLEAN_FILTER_FILE_PATH)
+
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Not a clean filter: {path}!")
+
+            header = json.loads(f.read(int.from_bytes(f.read(4), 'little')))
+
+            clean_filter = cls(
+                capacity=header['capacity'],
+                error_rate=header['error_rate'],
+                threshold=header['threshold'],
+                generations=header['generations'],
+                path=path,
+                server=header['server'],
+                model=header['model']
+            )
+
+            mismatched = (
+                server is not None and server_identity(server) != clean_filter.server
+                or model is not None and model != clean_filter.model
+            )
+
+            if mismatched:
+                raise ValueError(f"The clean filter {path} belongs to server {clean_filter.server!r} and model "
+                                 f"{clean_filter.model!r}!")
+            length = len(clean_filter.generations[0].bits)
+
+            clean_filter.generations[:] = [
+                BloomFilter(header['capacity'], header['error_rate'], bytearray(f.read(length)), count)
+                for count in header['counts']
+            ]
+
+        return clean_filter
+
+    @classmethod
+    def open(
+            cls,
+            path:   Optional[Union[str, Path]] = None,
+            server: Optional[Union[str, list[str], tuple[str]]] = None,
+            model:  Optional[str] = None,
+            **kwargs
+    ) -> 'CleanFilter':
+        """
+        Load a saved filter, or create a new one if there is none.
+
+        A saved filter that belongs to another server or model (or that cannot be read) is discarded, and a new one
+        created in its place: reusing it would report images as clean that were never scanned by this server and model.
+
+        Parameters:
+            path (Optional[Union[str, Path]]):
+                The path of the filter. Defaults to :data:`CLEAN_FILTER_FILE_PATH`.
+
+            server (Optional[Union[str, list[str], tuple[str]]]):
+                The base URL(s) of the server the filter must belong to. None to accept any server.
+
+            model (Optional[str]):
+                The identity of the model the filter must belong to. None to accept any model.
+
+            **kwargs:
+                Keyword arguments for the constructor, if a new filter is created.
+
+        Returns:
+            CleanFilter:
+                The filter.
+        """
+        path = Path(path or CLEAN_FILTER_FILE_PATH)
+
+        if path.exists():
+            try:
+                return cls.load(path, server=server, model=model)
+            except (KeyError, ValueError) as e:
+                MOD_LOGGER.warning(f'Discarding the clean filter {path}: {e}')
+
+        return cls(path=path, server=server, model=model, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the filter.
+
+        Returns:
+            dict:
+                The number of checksums held, of generations, the size in bytes, the number of lookups and hits (since
+                this object was created) and the hit rate.
+        """
+        with self.__lock:
+            return {
+                'count': len(self),
+                'generations': len(self.__generations),
+                'size': sum(len(generation.bits) for generation in self.__generations),
+                'lookups': self.__lookups,
+                'hits': self.__hits,
+                'hit_rate': self.__hits / self.__lookups if self.__lookups else 0.0,
+            }
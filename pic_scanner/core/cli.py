@@ -13,6 +13,7 @@ def load_modules():
 
 def main():
     # Load core modules
+    import pic_scanner.cli.subcommands.core.clean_filter
     import pic_scanner.cli.subcommands.core.version_info
 
     # Load community modules
@@ -0,0 +1,339 @@
+"""
+concurrency.py
+
+This module provides an adaptive (AIMD) concurrency limiter for the scan workers.
+
+Instead of a hand-tuned, fixed number of requests in flight, the :class:`AdaptiveConcurrencyLimiter` measures the
+latency and outcome of every request and adjusts its limit the way TCP congestion control does: the limit grows by one
+after a full window of healthy requests (additive increase) and is cut by a constant factor when a request fails or its
+latency climbs well above the baseline latency recently observed (multiplicative decrease). The limit always stays within the
+configured bounds.
+
+Classes:
+    AdaptiveConcurrencyLimiter:
+        An AIMD limiter on the number of requests in flight.
+
+
+Since:
+    1.0
+"""
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition
+from time import perf_counter
+from typing import Optional
+
+from pic_scanner.core import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'AdaptiveConcurrencyLimiter',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('concurrency')
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    An AIMD (additive increase, multiplicative decrease) limiter on the number of requests in flight.
+
+    The limiter is thread-safe. Each request is wrapped in :meth:`track`, which blocks until a slot is free, then times
+    the request and feeds its latency and outcome back into the limit.
+
+    Properties:
+        baseline_latency (Optional[float]):
+            The lowest latency observed over the recent requests.
+
+        limit (int):
+            The current number of requests allowed in flight.
+
+        in_flight (int):
+            The number of requests currently in flight.
+
+        min_limit (int):
+            The lower bound of the limit.
+
+        max_limit (int):
+            The upper bound of the limit.
+
+    Methods:
+        acquire():
+            Wait for a free slot.
+
+        release(latency, success):
+            Free a slot and record the outcome of its request.
+
+        summary():
+            Get the statistics of the limiter.
+
+        track():
+            Context manager that acquires a slot, times the request inside it and releases the slot.
+    """
+
+    def __init__(
+            self,
+            min_limit: int = 1,
+            max_limit: int = 64,
+            initial_limit: Optional[int] = None,
+            decrease_factor: float = 0.7,
+            latency_tolerance: float = 2.0,
+            smoothing: float = 0.2,
+            baseline_samples: int = 1000,
+    ):
+        """
+        The constructor for the AdaptiveConcurrencyLimiter class.
+
+        Parameters:
+            min_limit (int):
+                The lower bound of the limit.
+
+            max_limit (int):
+                The upper bound of the limit.
+
+            initial_limit (Optional[int]):
+                The limit to start at. Defaults to `min_limit`.
+
+            decrease_factor (float):
+                The factor the limit is multiplied by when a request fails or is too slow.
+
+            latency_tolerance (float):
+                How many times the baseline latency the smoothed latency may reach before the server is considered
+                overloaded.
+
+            smoothing (float):
+                The weight of the newest sample in the exponentially weighted latency and error rate averages.
+
+            baseline_samples (int):
+                The approximate number of recent requests whose lowest latency forms the baseline latency.
+
+        Raises:
+            ValueError:
+                If the bounds or factors are invalid.
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"Invalid concurrency bounds: {min_limit}..{max_limit}!")
+
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"Invalid decrease factor: {decrease_factor}!")
+
+        if baseline_samples < 10:
+            raise ValueError(f"Invalid number of baseline samples: {baseline_samples}!")
+
+        if latency_tolerance <= 1:
+            raise ValueError(f"Invalid latency tolerance: {latency_tolerance}!")
+
+        if not 0 < smoothing <= 1:
+            raise ValueError(f"Invalid smoothing factor: {smoothing}!")
+
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__limit = max(min_limit, min(initial_limit or min_limit, max_limit))
+        self.__decrease_factor = decrease_factor
+        self.__latency_tolerance = latency_tolerance
+        self.__smoothing = smoothing
+
+        self.__condition = Condition()
+        self.__in_flight = 0
+
+        # The baseline is the lowest latency seen over the last `baseline_samples` requests (kept as the minima of ten
+        # buckets) rather than ever, so a lasting change in request cost (larger images, a different model) does not pin
+        # the limit at its lower bound.
+        self.__bucket_size = baseline_samples // 10
+        self.__bucket_minima = deque(maxlen=10)
+        self.__bucket_min = None
+        self.__bucket_count = 0
+        self.__latency = None
+        self.__error_rate = 0.0
+
+        # The number of requests completed since the limit last changed; a change only happens once a full window
+        # (one request per slot) has completed, so requests that were already in flight cannot trigger a second cut.
+        self.__window = 0
+
+        self.__completed = 0
+        self.__errors = 0
+        self.__peak_limit = self.__limit
+
+    def __repr__(self):
+        return (f'AdaptiveConcurrencyLimiter(limit={self.limit}, min_limit={self.min_limit}, '
+                f'max_limit={self.max_limit})')
+
+    @property
+    def limit(self) -> int:
+        """
+        Get the current number of requests allowed in flight.
+
+        Returns:
+            int:
+                The current limit.
+        """
+        return self.__limit
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Get the number of requests currently in flight.
+
+        Returns:
+            int:
+                The number of requests in flight.
+        """
+        return self.__in_flight
+
+    @property
+    def min_limit(self) -> int:
+        """
+        Get the lower bound of the limit.
+
+        Returns:
+            int:
+                The lower bound.
+        """
+        return self.__min_limit
+
+    @property
+    def max_limit(self) -> int:
+        """
+        Get the upper bound of the limit.
+
+        Returns:
+            int:
+                The upper bound.
+        """
+        return self.__max_limit
+
+    @property
+    def baseline_latency(self) -> Optional[float]:
+        """
+        Get the lowest latency observed over the recent requests.
+
+        Returns:
+            Optional[float]:
+                The baseline latency, in seconds, or None if no request has succeeded yet.
+        """
+        samples = [*self.__bucket_minima, *([self.__bucket_min] if self.__bucket_min is not None else [])]
+
+        return min(samples) if samples else None
+
+    def acquire(self):
+        """
+        Wait for a free slot.
+
+        Returns:
+            None
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__in_flight < self.__limit)
+            self.__in_flight += 1
+
+    def release(self, latency: float, success: bool = True):
+        """
+        Free a slot and record the outcome of its request.
+
+        Parameters:
+            latency (float):
+                The latency of the request, in seconds.
+
+            success (bool):
+                A flag indicating whether the request succeeded.
+
+        Returns:
+            None
+        """
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__record(latency, success)
+            self.__condition.notify_all()
+
+    @contextmanager
+    def track(self):
+        """
+        Acquire a slot, time the request made inside the context and release the slot.
+
+        A request is recorded as failed if the context exits with an exception.
+
+        Yields:
+            None
+        """
+        self.acquire()
+        start = perf_counter()
+        success = False
+
+        try:
+            yield
+            success = True
+        finally:
+            self.release(perf_counter() - start, success)
+
+    def __record(self, latency: float, success: bool):
+        alpha = self.__smoothing
+
+        self.__completed += 1
+        self.__window += 1
+        self.__error_rate += alpha * ((0.0 if success else 1.0) - self.__error_rate)
+
+        if not success:
+            self.__errors += 1
+            self.__decrease('request failed')
+            return
+
+        self.__latency = latency if self.__latency is None else self.__latency + alpha * (latency - self.__latency)
+
+        if self.__bucket_min is None or latency < self.__bucket_min:
+            self.__bucket_min = latency
+
+        self.__bucket_count += 1
+
+        if self.__bucket_count >= self.__bucket_size:
+            self.__bucket_minima.append(self.__bucket_min)
+            self.__bucket_min = None
+            self.__bucket_count = 0
+
+        baseline = self.baseline_latency
+
+        if self.__latency > baseline * self.__latency_tolerance:
+            self.__decrease(f'latency {self.__latency:.3f}s exceeds {self.__latency_tolerance}x the baseline '
+                            f'({baseline:.3f}s)')
+        elif self.__window >= self.__limit:
+            self.__set_limit(min(self.__limit + 1, self.__max_limit))
+
+    def __decrease(self, reason: str):
+        if self.__window < self.__limit:
+            return
+
+        new_limit = max(self.__min_limit, int(self.__limit * self.__decrease_factor))
+
+        if new_limit != self.__limit:
+            MOD_LOGGER.debug(f'Decreasing concurrency limit from {self.__limit} to {new_limit}: {reason}')
+
+        self.__set_limit(new_limit)
+
+        # Let the smoothed latency settle at the lower limit before it is compared again.
+        self.__latency = self.baseline_latency
+
+    def __set_limit(self, limit: int):
+        self.__limit = limit
+        self.__window = 0
+        self.__peak_limit = max(self.__peak_limit, limit)
+
+    def summary(self) -> dict:
+        """
+        Get the statistics of the limiter.
+
+        Returns:
+            dict:
+                The current, peak and bounding limits, the number of completed and failed requests, the smoothed error
+                rate and the smoothed and baseline latencies (in seconds).
+        """
+        with self.__condition:
+            return {
+                'limit': self.__limit,
+                'peak_limit': self.__peak_limit,
+                'min_limit': self.__min_limit,
+                'max_limit': self.__max_limit,
+                'completed': self.__completed,
+                'errors': self.__errors,
+                'error_rate': self.__error_rate,
+                'latency': self.__latency,
+                'baseline_latency': self.baseline_latency,
+            }
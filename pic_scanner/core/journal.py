@@ -0,0 +1,370 @@
+"""
+journal.py
+
+This module provides the on-disk progress journal that makes long scans resumable.
+
+Each scan job has an append-only journal (a JSON Lines file in :data:`JOURNAL_DIR`) to which the result of every
+scanned image, and every failure, is appended as soon as it is known. Writes are buffered and flushed to disk (with
+`fsync`) in batches, so journaling costs a few system calls per hundred images, and at most one batch is lost when the
+process dies. The scan history (:data:`HISTORY_FILE_PATH`) lists the jobs with their start and finish times and counts.
+
+Resuming a job replays its journal: the recorded results rebuild the scanned images without touching the inference
+server, and only the images without a result (never scanned, or failed) are scanned again.
+
+Classes:
+    ScanJournal:
+        The progress journal of a scan job.
+
+Functions:
+    get_scan_history:
+        Get the scan jobs recorded in the scan history.
+
+
+Since:
+    1.0
+"""
+import json
+import os
+import secrets
+import threading
+from datetime import datetime
+from pathlib import Path
+from time import monotonic, time
+from typing import Optional, Union
+
+from pic_scanner.common.constants.defaults.dirs import JOURNAL_DIR
+from pic_scanner.common.constants.defaults.files import HISTORY_FILE_PATH
+from pic_scanner.core import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'ScanJournal',
+    'get_scan_history',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('journal')
+
+
+_HISTORY_LOCK = threading.Lock()
+
+
+def get_scan_history(history_path: Optional[Union[str, Path]] = None) -> dict:
+    """
+    Get the scan jobs recorded in the scan history.
+
+    Parameters:
+        history_path (Optional[Union[str, Path]]):
+            The path of the history file. Defaults to :data:`HISTORY_FILE_PATH`.
+
+    Returns:
+        dict:
+            The jobs, by job ID, each with its `journal` path, `started` and `finished` times (`finished` is None for a
+            job that was interrupted) and the number of images `scanned` and `failed`.
+    """
+    history_path = Path(history_path or HISTORY_FILE_PATH)
+
+    try:
+        with open(history_path, encoding='utf-8') as f:
+            return json.load(f).get('jobs', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_history(history_path: Path, job_id: str, **fields):
+    with _HISTORY_LOCK:
+        jobs = get_scan_history(history_path)
+        jobs.setdefault(job_id, {}).update(fields)
+
+        history_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = history_path.with_name(f'{history_path.name}.tmp')
+
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': jobs}, f, indent=2)
+
+        os.replace(temp_path, history_path)
+
+
+class ScanJournal:
+    """
+    The progress journal of a scan job.
+
+    The journal is thread-safe. Use it as a context manager, or call :meth:`close` once the scan is finished.
+
+    Properties:
+        failed (dict[str, str]):
+            The images that could not be scanned, with their errors.
+
+        job_id (str):
+            The ID of the job.
+
+        path (Path):
+            The path of the journal file.
+
+        results (dict[str, dict]):
+            The recorded results, by image path.
+
+    Methods:
+        close(finished=True):
+            Flush the journal and close it.
+
+        is_done(image_path):
+            Check whether an image already has a result.
+
+        record_failure(image_path, error):
+            Append the failure of an image.
+
+        record_result(image_path, result, checksum=None):
+            Append the result of an image.
+
+        sync():
+            Flush the buffered records to disk.
+    """
+
+    def __init__(
+            self,
+            job_id:        Optional[str] = None,
+            directory:     Optional[Union[str, Path]] = None,
+            history_path:  Optional[Union[str, Path]] = None,
+            sync_every:    int = 100,
+            sync_interval: float = 1.0,
+    ):
+        """
+        The constructor for the ScanJournal class.
+
+        Parameters:
+            job_id (Optional[str]):
+                The ID of the job. If the job has a journal already, it is replayed and appended to. Defaults to a new
+                ID based on the current time.
+
+            directory (Optional[Union[str, Path]]):
+                The directory of the journal files. Defaults to :data:`JOURNAL_DIR`.
+
+            history_path (Optional[Union[str, Path]]):
+                The path of the scan history. Defaults to :data:`HISTORY_FILE_PATH`.
+
+            sync_every (int):
+                The number of records after which the journal is flushed to disk.
+
+            sync_interval (float):
+                The number of seconds after which buffered records are flushed to disk, however few there are.
+        """
+        self.__job_id = job_id or f'{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}'
+        self.__path = Path(directory or JOURNAL_DIR) / f'{self.__job_id}.jsonl'
+        self.__history_path = Path(history_path or HISTORY_FILE_PATH)
+        self.__sync_every = max(1, sync_every)
+        self.__sync_interval = sync_interval
+
+        self.__lock = threading.Lock()
+        self.__results = {}
+        self.__failed = {}
+        self.__pending = 0
+        self.__last_sync = monotonic()
+
+        resumed = self.__path.exists()
+
+        if resumed:
+            self.__replay()
+            MOD_LOGGER.info(f'Resuming scan job {self.__job_id}: {len(self.__results)} results and '
+                            f'{len(self.__failed)} failures recorded.')
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__file = open(self.__path, 'a', encoding='utf-8')
+
+        _update_history(
+            self.__history_path,
+            self.__job_id,
+            journal=str(self.__path),
+            finished=None,
+            **({} if resumed else {'started': time()})
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(finished=exc_type is None)
+
+    def __repr__(self):
+        return f'ScanJournal({self.__job_id!r}, results={len(self.__results)}, failed={len(self.__failed)})'
+
+    @property
+    def failed(self) -> dict:
+        """
+        Get the images that could not be scanned (and have no result since).
+
+        Returns:
+            dict[str, str]:
+                The errors, by image path.
+        """
+        return self.__failed
+
+    @property
+    def job_id(self) -> str:
+        """
+        Get the ID of the job.
+
+        Returns:
+            str:
+                The ID of the job, to pass as `resume` to :func:`pic_scanner.core.scan_images`.
+        """
+        return self.__job_id
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the path of the journal file.
+
+        Returns:
+            Path:
+                The path of the journal file.
+        """
+        return self.__path
+
+    @property
+    def results(self) -> dict:
+        """
+        Get the recorded results.
+
+        Returns:
+            dict[str, dict]:
+                The records (`{'image_path': ..., 'result': ..., 'checksum': ...}`), by image path.
+        """
+        return self.__results
+
+    def __replay(self):
+        complete = 0
+
+        with open(self.__path, 'rb') as f:
+            for number, line in enumerate(f, start=1):
+                if not line.endswith(b'\n'):
+                    # The process died in the middle of a write; everything before it is intact. The partial line is
+                    # cut off below, so the next record does not get appended to it.
+                    MOD_LOGGER.warning(f'Dropping truncated record {number} of journal {self.__path}.')
+                    break
+
+                complete += len(line)
+
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    MOD_LOGGER.warning(f'Skipping unreadable record {number} of journal {self.__path}.')
+                    continue
+
+                if 'result' in record:
+                    self.__results[record['image_path']] = record
+                    self.__failed.pop(record['image_path'], None)
+                else:
+                    self.__failed[record['image_path']] = record.get('error')
+
+        if complete < self.__path.stat().st_size:
+            os.truncate(self.__path, complete)
+
+    def is_done(self, image_path: Union[str, Path]) -> bool:
+        """
+        Check whether an image already has a result in the journal.
+
+        Parameters:
+            image_path (Union[str, Path]):
+                The path of the image.
+
+        Returns:
+            bool:
+                True if the image has a result, False otherwise.
+        """
+        return str(image_path) in self.__results
+
+    def record_result(self, image_path: Union[str, Path], result: dict, checksum: Optional[str] = None):
+        """
+        Append the result of an image to the journal.
+
+        Parameters:
+            image_path (Union[str, Path]):
+                The path of the image.
+
+            result (dict):
+                The result of the inference server.
+
+            checksum (Optional[str]):
+                The checksum of the image file, if known.
+
+        Returns:
+            None
+        """
+        record = {'image_path': str(image_path), 'result': result, 'checksum': checksum}
+
+        with self.__lock:
+            self.__results[record['image_path']] = record
+            self.__failed.pop(record['image_path'], None)
+            self.__append(record)
+
+    def record_failure(self, image_path: Union[str, Path], error):
+        """
+        Append the failure of an image to the journal.
+
+        Parameters:
+            image_path (Union[str, Path]):
+                The path of the image.
+
+            error:
+                The error that stopped the image from being scanned.
+
+        Returns:
+            None
+        """
+        record = {'image_path': str(image_path), 'error': repr(error) if error is not None else None}
+
+        with self.__lock:
+            self.__failed[record['image_path']] = record['error']
+            self.__append(record)
+
+    def __append(self, record: dict):
+        self.__file.write(json.dumps(record, separators=(',', ':')))
+        self.__file.write('\n')
+        self.__pending += 1
+
+        if self.__pending >= self.__sync_every or monotonic() - self.__last_sync >= self.__sync_interval:
+            self.__sync()
+
+    def __sync(self):
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__pending = 0
+        self.__last_sync = monotonic()
+
+    def sync(self):
+        """
+        Flush the buffered records to disk.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if not self.__file.closed:
+                self.__sync()
+
+    def close(self, finished: bool = True):
+        """
+        Flush the journal to disk, close it and update the scan history.
+
+        Parameters:
+            finished (bool):
+                A flag indicating whether the scan ran to completion. An unfinished job can be resumed later.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if self.__file.closed:
+                return
+
+            self.__sync()
+            self.__file.close()
+
+        _update_history(
+            self.__history_path,
+            self.__job_id,
+            finished=time() if finished else None,
+            scanned=len(self.__results),
+            failed=len(self.__failed)
+        )
@@ -0,0 +1,808 @@
+"""
+pipeline.py
+
+This module provides the staged scanning pipeline behind the threaded scanning mode.
+
+Rather than every worker thread discovering, reading, uploading and modelling one image after another, the work is split
+into stages that each have their own pool of workers, connected by bounded queues:
+
+    discover -> stat/hash/clean filter -> cache lookup -> preprocess -> infer -> build
+
+Disk I/O, image decoding and network requests therefore overlap, and a slow stage applies back-pressure to the stages
+before it instead of letting work pile up in memory. The CPU-bound preprocessing stage can run on threads or on a process
+pool.
+
+Classes:
+    Stage:
+        A step of a :class:`Pipeline`.
+
+    Pipeline:
+        A chain of stages connected by bounded queues.
+
+    ScanItem:
+        The state of one image as it moves through the scan pipeline.
+
+    ScanFailure:
+        The record of an image that could not be scanned.
+
+    ScanPipeline:
+        The scan pipeline.
+
+
+Since:
+    1.0
+"""
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Union
+
+from pic_scanner.api import InferenceClient, get_client, rescale_prediction
+from pic_scanner.api.payload import MultipartPayload
+from pic_scanner.api.preprocess import Preprocessor
+from pic_scanner.core import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.core.clean_filter import CleanFilter, clean_result
+from pic_scanner.core.concurrency import AdaptiveConcurrencyLimiter
+from pic_scanner.core.similarity import SimilarityIndex
+from pic_scanner.helpers import iter_picture_files
+from pic_scanner.helpers.filesystem.index import UNCHANGED, FileIndex
+from pic_scanner.helpers.images import DEFAULT_MAX_BUFFERED_SIZE, ImageBuffer, get_image_checksum, get_image_data
+from pic_scanner.models.image import create_scanned_image
+
+
+__all__ = [
+    'Pipeline',
+    'ScanFailure',
+    'ScanItem',
+    'ScanPipeline',
+    'Stage',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('pipeline')
+
+
+_DONE = object()
+
+
+class _Failure:
+    """
+    An unexpected exception raised by a stage, carried to the consumer.
+    """
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+@dataclass
+class Stage:
+    """
+    A step of a :class:`Pipeline`.
+
+    Attributes:
+        name (str):
+            The name of the stage (used to name its threads).
+
+        func (Callable):
+            The work of the stage. It receives one item (or, if `batch_size` is greater than 1, a list of up to
+            `batch_size` items) and returns an iterable of the items to pass on, so a stage can drop, keep or fan out
+            items.
+
+        workers (int):
+            The number of threads running the stage.
+
+        queue_size (Optional[int]):
+            The capacity of the queue feeding the stage. Defaults to twice the number of workers.
+
+        batch_size (int):
+            The maximum number of items handed to `func` at once. Items already waiting are batched; a worker never
+            waits for a batch to fill up.
+    """
+    name: str
+    func: Callable
+    workers: int = 1
+    queue_size: Optional[int] = None
+    batch_size: int = 1
+
+    def __post_init__(self):
+        if self.workers < 1:
+            raise ValueError(f"Invalid number of workers for stage {self.name!r}: {self.workers}!")
+
+        if self.batch_size < 1:
+            raise ValueError(f"Invalid batch size for stage {self.name!r}: {self.batch_size}!")
+
+
+class Pipeline:
+    """
+    A chain of stages connected by bounded queues.
+
+    Each stage runs on its own threads. Items leave the pipeline in the order they complete, not the order they entered.
+
+    Methods:
+        run(source):
+            Feed items through the stages and yield them as they come out of the last one.
+    """
+
+    def __init__(self, stages: list[Stage], output_size: Optional[int] = None):
+        """
+        The constructor for the Pipeline class.
+
+        Parameters:
+            stages (list[Stage]):
+                The stages, in order.
+
+            output_size (Optional[int]):
+                The capacity of the queue holding finished items until they are consumed. Defaults to twice the number
+                of workers of the last stage.
+        """
+        if not stages:
+            raise ValueError('A pipeline needs at least one stage!')
+
+        self.__stages = stages
+        self.__output_size = output_size or 2 * stages[-1].workers
+
+    @property
+    def stages(self) -> list[Stage]:
+        """
+        Get the stages of the pipeline.
+
+        Returns:
+            list[Stage]:
+                The stages, in order.
+        """
+        return list(self.__stages)
+
+    def run(self, source: Iterable) -> Iterator:
+        """
+        Feed items through the stages and yield them as they come out of the last one.
+
+        The source is consumed lazily by a feeder thread, at the pace the first stage accepts items. If the consumer
+        stops iterating early, the stages are stopped.
+
+        Parameters:
+            source (Iterable):
+                The items to feed into the first stage.
+
+        Yields:
+            The items coming out of the last stage, in completion order.
+
+        Raises:
+            Exception:
+                Any exception raised by the source or by a stage's function.
+        """
+        stop = Event()
+        queues = [
+            Queue(maxsize=max(stage.queue_size or 2 * stage.workers, stage.workers))
+            for stage in self.__stages
+        ]
+        queues.append(Queue(maxsize=self.__output_size))
+
+        threads = [Thread(target=self.__feed, args=(source, queues[0], stop), name='Pipeline-feed', daemon=True)]
+
+        for index, stage in enumerate(self.__stages):
+            remaining = [stage.workers]
+            lock = Lock()
+
+            threads.extend(
+                Thread(
+                    target=self.__work,
+                    args=(stage, queues[index], queues[index + 1], stop, remaining, lock),
+                    name=f'Pipeline-{stage.name}-{number}',
+                    daemon=True
+                )
+                for number in range(stage.workers)
+            )
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+
+                if item is _DONE:
+                    break
+
+                if isinstance(item, _Failure):
+                    raise item.exception
+
+                yield item
+        finally:
+            stop.set()
+
+    @staticmethod
+    def __put(queue: Queue, item, stop: Event) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+
+        return False
+
+    @staticmethod
+    def __get(queue: Queue, stop: Event):
+        while not stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+
+        return _DONE
+
+    def __feed(self, source: Iterable, queue: Queue, stop: Event):
+        try:
+            for item in source:
+                if not self.__put(queue, item, stop):
+                    return
+        except Exception as e:
+            MOD_LOGGER.error(f'Pipeline source failed: {e}')
+            self.__put(queue, _Failure(e), stop)
+
+        self.__put(queue, _DONE, stop)
+
+    def __work(self, stage: Stage, inbox: Queue, outbox: Queue, stop: Event, remaining: list, lock: Lock):
+        while True:
+            item = self.__get(inbox, stop)
+
+            if item is _DONE:
+                # Let the other workers of this stage see the end of the input too; the last one to leave passes it on.
+                self.__put(inbox, _DONE, stop)
+
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+
+                if last:
+                    self.__put(outbox, _DONE, stop)
+
+                return
+
+            if isinstance(item, _Failure):
+                self.__put(outbox, item, stop)
+                continue
+
+            try:
+                if stage.batch_size > 1:
+                    batch = [item]
+
+                    while len(batch) < stage.batch_size:
+                        try:
+                            extra = inbox.get_nowait()
+                        except Empty:
+                            break
+
+                        if extra is _DONE or isinstance(extra, _Failure):
+                            self.__put(inbox, extra, stop)
+                            break
+
+                        batch.append(extra)
+
+                    outputs = stage.func(batch)
+                else:
+                    outputs = stage.func(item)
+
+                for output in outputs:
+                    if not self.__put(outbox, output, stop):
+                        return
+            except Exception as e:
+                MOD_LOGGER.error(f'Pipeline stage {stage.name!r} failed: {e}')
+                self.__put(outbox, _Failure(e), stop)
+
+
+class ScanItem:
+    """
+    The state of one image as it moves through the scan pipeline.
+
+    Attributes:
+        image_path (Path):
+            The path of the image.
+
+        size (Optional[int]):
+            The size of the file, in bytes.
+
+        mtime_ns (Optional[int]):
+            The modification time of the file, in nanoseconds.
+
+        fingerprint (Optional[Fingerprint]):
+            The stat fingerprint of the file, if a file index is used.
+
+        state (Optional[str]):
+            'unchanged', 'changed' or 'new', if a file index is used.
+
+        buffer (Optional[ImageBuffer]):
+            The bytes of the file, read once by the stat stage and shared by the hashing, preprocessing, upload and
+            thumbnail steps, until they are released.
+
+        checksum (Optional[str]):
+            The checksum of the file, if it was hashed.
+
+        perceptual_hash (Optional[tuple[int, tuple[int, int]]]):
+            The perceptual hash and the size of the image, if a similarity index is used.
+
+        cached (bool):
+            Whether the result was found in the file index or the result cache.
+
+        prepared (Optional[PreparedImage]):
+            The downscaled image to upload, if it was downscaled.
+
+        result (Optional[dict]):
+            The result of the inference server (`{'prediction': [...]}`).
+
+        scanned_image (Optional[ScannedImage]):
+            The scanned image built from the result.
+
+        thumbnail (Optional[bytes]):
+            The PNG thumbnail of the image, if the pipeline makes thumbnails.
+
+        error (Optional[Exception]):
+            The error that stopped the image from being scanned, if any. Failed items skip the remaining stages.
+    """
+
+    __slots__ = (
+        'image_path', 'size', 'mtime_ns', 'fingerprint', 'state', 'buffer', 'checksum', 'perceptual_hash', 'cached',
+        'prepared', 'result', 'scanned_image', 'thumbnail', 'error'
+    )
+
+    def __init__(self, image_path: Path):
+        self.image_path = image_path
+        self.size = None
+        self.mtime_ns = None
+        self.fingerprint = None
+        self.state = None
+        self.buffer = None
+        self.checksum = None
+        self.perceptual_hash = None
+        self.cached = False
+        self.prepared = None
+        self.result = None
+        self.scanned_image = None
+        self.thumbnail = None
+        self.error = None
+
+    def __repr__(self):
+        state = f'error={self.error!r}' if self.error is not None else f'scanned={self.scanned_image is not None}'
+
+        return f'ScanItem({str(self.image_path)!r}, {state})'
+
+    @property
+    def failed(self) -> bool:
+        """
+        Get the failure status of the item.
+
+        Returns:
+            bool:
+                True if the image could not be scanned, False otherwise.
+        """
+        return self.error is not None
+
+    def release_buffer(self):
+        """
+        Release the buffer of the file, if it holds one.
+
+        Returns:
+            None
+        """
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+
+
+class ScanFailure(NamedTuple):
+    """
+    The record of an image that could not be scanned.
+
+    Attributes:
+        image_path (Path):
+            The path of the image.
+
+        error (Exception):
+            The error that stopped the image from being scanned.
+    """
+    image_path: Path
+    error: Exception
+
+
+def _guarded(func: Callable) -> Callable:
+    """
+    Wrap a per-item stage function so failed items pass through untouched and errors are recorded on the item.
+    """
+    def stage(item: ScanItem):
+        if item.error is None:
+            try:
+                func(item)
+            except Exception as e:
+                item.error = e
+
+        return (item,)
+
+    return stage
+
+
+class ScanPipeline:
+    """
+    The scan pipeline: discover -> stat/hash/clean filter -> cache lookup -> similarity/preprocess -> infer -> build.
+
+    Properties:
+        pipeline (Pipeline):
+            The underlying pipeline of stages.
+
+    Methods:
+        run(image_paths):
+            Scan images and yield a :class:`ScanItem` for each as soon as it is done.
+    """
+
+    def __init__(
+            self,
+            client:             Optional[InferenceClient] = None,
+            base_url:           Optional[str] = None,
+            preprocessor:       Optional[Preprocessor] = None,
+            cache=None,
+            index:              Optional[FileIndex] = None,
+            clean_filter:       Optional[CleanFilter] = None,
+            similarity:         Optional[SimilarityIndex] = None,
+            hash_files:         bool = False,
+            checksum_algorithm: Optional[str] = None,
+            buffer_files:       bool = True,
+            max_buffered_size:  int = DEFAULT_MAX_BUFFERED_SIZE,
+            thumbnail_size:     Optional[tuple[int, int]] = None,
+            batch_size:         Optional[int] = None,
+            limiter:            Optional[AdaptiveConcurrencyLimiter] = None,
+            recursive:          bool = True,
+            io_workers:         int = 4,
+            cpu_workers:        Optional[int] = None,
+            infer_workers:      int = 8,
+            build_workers:      int = 1,
+            cpu_executor:       Union[str, Executor] = 'thread',
+            queue_size:         Optional[int] = None,
+    ):
+        """
+        The constructor for the ScanPipeline class.
+
+        Parameters:
+            client (Optional[InferenceClient]):
+                The client to send the requests with. Defaults to the shared client for `base_url`, with a connection
+                pool large enough for every infer worker.
+
+            base_url (Optional[str]):
+                The base URL of the inference server, if `client` is not given.
+
+            preprocessor (Optional[Preprocessor]):
+                If given, large images are downscaled before upload.
+
+            cache:
+                A result cache to consult before uploading an image, and to store new results in. It must provide
+                `get(checksum)` (returning a result or None) and `put(checksum, result)`. Implies `hash_files`.
+
+            index (Optional[FileIndex]):
+                A file index to classify each file against by its stat fingerprint. Unchanged files are neither read nor
+                uploaded again; the checksum and result of every other file are recorded in it. Implies `hash_files`.
+
+            clean_filter (Optional[CleanFilter]):
+                A filter of the checksums of images known to be clean, consulted before the result cache and the
+                server. The checksums of new clean results are added to it. Implies `hash_files`.
+
+            similarity (Optional[SimilarityIndex]):
+                An index of the perceptual hashes of scanned images. The preprocess stage hashes each image that is not
+                cached yet, and reuses the result of a near-duplicate instead of uploading it; new results are added to
+                it.
+
+            hash_files (bool):
+                A flag indicating whether the checksum of every file should be computed (and set on the scanned image).
+                Files are hashed by the stat stage's threads, streaming, in parallel.
+
+            checksum_algorithm (Optional[str]):
+                The checksum algorithm (see :func:`pic_scanner.helpers.images.get_image_checksum`). Defaults to
+                :data:`pic_scanner.helpers.images.DEFAULT_CHECKSUM_ALGORITHM`.
+
+            buffer_files (bool):
+                A flag indicating whether each file is read into memory once, by the stat stage (hashing it as it is
+                read), and shared by the later stages (see :class:`pic_scanner.helpers.images.ImageBuffer`). Otherwise,
+                each stage that needs the bytes reads the file again.
+
+            max_buffered_size (int):
+                The size, in bytes, above which a file is not buffered but streamed from disk.
+
+            thumbnail_size (Optional[tuple[int, int]]):
+                If given, the build stage makes a PNG thumbnail of at most this size for each image, from its buffer
+                (see :attr:`ScanItem.thumbnail`).
+
+            batch_size (Optional[int]):
+                If greater than 1, the infer stage packs up to this many waiting images into each request.
+
+            limiter (Optional[AdaptiveConcurrencyLimiter]):
+                If given, requests are made through the limiter, and the infer stage has one worker per slot the limiter
+                may grant.
+
+            recursive (bool):
+                A flag indicating whether directories among the input paths are searched recursively.
+
+            io_workers (int):
+                The number of threads stat-ing and hashing files.
+
+            cpu_workers (Optional[int]):
+                The number of preprocessing workers. Defaults to the number of CPUs.
+
+            infer_workers (int):
+                The number of requests in flight.
+
+            build_workers (int):
+                The number of threads building scanned images from the results.
+
+            cpu_executor (Union[str, Executor]):
+                Where the CPU-bound preprocessing runs: 'thread' (on the stage's threads), 'process' (on a process pool
+                of `cpu_workers` processes) or an executor of your own.
+
+            queue_size (Optional[int]):
+                The capacity of every queue between stages. Defaults to twice the number of workers of the stage each
+                queue feeds.
+        """
+        if batch_size is None or batch_size < 1:
+            batch_size = 1
+
+        if limiter is not None:
+            infer_workers = limiter.max_limit
+
+        cpu_workers = cpu_workers or os.cpu_count() or 1
+
+        self.__client = client or get_client(base_url, pool_size=infer_workers)
+        self.__preprocessor = preprocessor
+        self.__cache = cache
+        self.__index = index
+        self.__clean_filter = clean_filter
+        self.__similarity = similarity
+        self.__checksum_algorithm = checksum_algorithm
+        self.__buffer_files = buffer_files
+        self.__max_buffered_size = max_buffered_size
+        self.__thumbnail_size = thumbnail_size
+        self.__build_item = _guarded(self.__build)
+        self.__hash_files = hash_files or cache is not None or index is not None or clean_filter is not None
+        self.__limiter = limiter
+        self.__recursive = recursive
+
+        if cpu_executor == 'process':
+            cpu_executor = ProcessPoolExecutor(max_workers=cpu_workers)
+        elif cpu_executor == 'thread':
+            cpu_executor = None
+        elif not isinstance(cpu_executor, Executor):
+            raise ValueError(f"Invalid CPU executor: {cpu_executor}! Must be 'thread', 'process' or an Executor.")
+
+        self.__cpu_executor = cpu_executor
+
+        self.__pipeline = Pipeline(
+            [
+                Stage('discover', self.__discover, workers=1, queue_size=queue_size),
+                Stage('stat', _guarded(self.__stat), workers=io_workers, queue_size=queue_size),
+                Stage('cache', _guarded(self.__lookup), workers=1, queue_size=queue_size),
+                Stage('preprocess', _guarded(self.__preprocess), workers=cpu_workers, queue_size=queue_size),
+                Stage('infer', self.__infer, workers=infer_workers, queue_size=queue_size, batch_size=batch_size),
+                Stage('build', self.__finish, workers=build_workers, queue_size=queue_size),
+            ],
+            output_size=queue_size
+        )
+
+    @property
+    def clean_filter(self) -> Optional[CleanFilter]:
+        """
+        Get the filter of checksums known to be clean.
+
+        Returns:
+            Optional[CleanFilter]:
+                The clean filter, if one is used.
+        """
+        return self.__clean_filter
+
+    @property
+    def pipeline(self) -> Pipeline:
+        """
+        Get the underlying pipeline of stages.
+
+        Returns:
+            Pipeline:
+                The pipeline.
+        """
+        return self.__pipeline
+
+    def run(self, image_paths: Iterable[Union[str, Path]]) -> Iterator[ScanItem]:
+        """
+        Scan images and yield a :class:`ScanItem` for each as soon as it is done.
+
+        Parameters:
+            image_paths (Iterable[Union[str, Path]]):
+                The paths of the images, consumed lazily. Directories are searched for pictures.
+
+        Yields:
+            ScanItem:
+                The scanned (or failed) image, in completion order.
+        """
+        try:
+            yield from self.__pipeline.run(image_paths)
+        finally:
+            if isinstance(self.__cpu_executor, ProcessPoolExecutor):
+                self.__cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+    def __discover(self, image_path):
+        image_path = Path(image_path)
+
+        if image_path.is_dir():
+            return (ScanItem(path) for path in iter_picture_files(image_path, recursive=self.__recursive))
+
+        return (ScanItem(image_path),)
+
+    def __stat(self, item: ScanItem):
+        stat = os.stat(item.image_path)
+        item.size = stat.st_size
+        item.mtime_ns = stat.st_mtime_ns
+
+        if self.__index is not None:
+            indexed = self.__index.classify(item.image_path, stat)
+            item.fingerprint = indexed.fingerprint
+            item.state = indexed.state
+
+            if indexed.unchanged:
+                item.checksum = indexed.checksum
+
+                if indexed.result is not None:
+                    item.result = indexed.result
+                    item.cached = True
+
+                return
+
+        if self.__buffer_files and stat.st_size <= self.__max_buffered_size:
+            item.buffer = ImageBuffer.read(
+                item.image_path,
+                self.__checksum_algorithm if self.__hash_files else False
+            )
+            item.checksum = item.buffer.checksum
+        elif self.__hash_files:
+            item.checksum = get_image_checksum(item.image_path, self.__checksum_algorithm)
+
+        if self.__clean_filter is not None and item.checksum in self.__clean_filter:
+            item.result = clean_result()
+            item.cached = True
+            self.__done_uploading(item)
+
+    def __lookup(self, item: ScanItem):
+        if self.__cache is None or item.cached:
+            return
+
+        if (result := self.__cache.get(item.checksum)) is not None:
+            item.result = result
+            item.cached = True
+            self.__done_uploading(item)
+
+    def __preprocess(self, item: ScanItem):
+        if item.cached or (self.__similarity is not None and self.__match_similar(item)):
+            return
+
+        if self.__preprocessor is None:
+            return
+
+        if self.__cpu_executor is None:
+            item.prepared = self.__preprocessor.prepare(
+                item.image_path,
+                data=item.buffer.data if item.buffer is not None else None
+            )
+        else:
+            # Sending the buffer to another process would copy it; the worker reads the file itself.
+            item.prepared = self.__cpu_executor.submit(self.__preprocessor.prepare, item.image_path).result()
+
+    def __match_similar(self, item: ScanItem) -> bool:
+        source = item.buffer if item.buffer is not None else item.image_path
+
+        try:
+            item.perceptual_hash = self.__similarity.hash_image(source)
+        except OSError as e:
+            # The server gets the last word on files Pillow cannot identify.
+            MOD_LOGGER.debug(f'Could not compute the perceptual hash of {item.image_path}: {e}')
+            return False
+
+        if (result := self.__similarity.lookup(*item.perceptual_hash)) is None:
+            return False
+
+        item.result = result
+        item.cached = True
+        self.__done_uploading(item)
+
+        return True
+
+    def __infer(self, items):
+        if not isinstance(items, list):
+            items = [items]
+
+        pending = [item for item in items if item.error is None and not item.cached]
+
+        if len(pending) > 1:
+            try:
+                self.__request(pending)
+                pending = []
+            except Exception as e:
+                MOD_LOGGER.warning(f'Batch request for {len(pending)} images failed ({e}); falling back to single '
+                                   f'requests.')
+
+        for item in pending:
+            try:
+                self.__request([item])
+            except Exception as e:
+                item.error = e
+
+        for item in items:
+            self.__done_uploading(item)
+
+            if item.error is None:
+                self.__remember(item)
+
+        return items
+
+    def __done_uploading(self, item: ScanItem):
+        # The thumbnail is the last consumer of the buffer, if there is one.
+        if self.__thumbnail_size is None:
+            item.release_buffer()
+
+    def __remember(self, item: ScanItem):
+        if self.__cache is not None and not item.cached and item.checksum is not None:
+            self.__cache.put(item.checksum, item.result)
+
+        if self.__clean_filter is not None and not item.cached:
+            self.__clean_filter.record(item.checksum, item.result)
+
+        if self.__similarity is not None and not item.cached and item.perceptual_hash is not None:
+            self.__similarity.add(*item.perceptual_hash, item.result)
+
+        if self.__index is not None and not (item.state == UNCHANGED and item.cached):
+            self.__index.update(item.image_path, item.checksum, item.result, fingerprint=item.fingerprint)
+
+    def __request(self, items: list[ScanItem]):
+        with MultipartPayload() as payload:
+            for number, item in enumerate(items, start=1):
+                if item.prepared is not None:
+                    filename, data, content_type = item.prepared.as_file()
+                    payload.add_file(f'f{number}', data=data, filename=filename, content_type=content_type)
+                elif item.buffer is not None:
+                    payload.add_file(f'f{number}', data=item.buffer.data, filename=item.image_path.name)
+                else:
+                    payload.add_file(f'f{number}', image_path=item.image_path)
+
+            if self.__limiter is not None:
+                with self.__limiter.track():
+                    result = self.__client.infer(payload=payload)
+            else:
+                result = self.__client.infer(payload=payload)
+
+        predictions = result.get('prediction', [])
+
+        if len(predictions) != len(items):
+            raise ValueError(f'Expected {len(items)} predictions from the inference server, '
+                             f'received {len(predictions)}!')
+
+        for item, prediction in zip(items, predictions):
+            if item.prepared is not None:
+                rescale_prediction(prediction, item.prepared.scale)
+                # The downscaled bytes are no longer needed; do not keep them alive until the item is consumed.
+                item.prepared = None
+
+            item.result = {'prediction': [prediction]}
+
+    def __build(self, item: ScanItem):
+        item.scanned_image = create_scanned_image(
+            {'image_path': item.image_path, 'result': item.result},
+            checksum=item.checksum
+        )
+
+        if self.__thumbnail_size is not None:
+            source = item.buffer if item.buffer is not None else str(item.image_path)
+
+            try:
+                item.thumbnail = get_image_data(source, self.__thumbnail_size)
+            except (OSError, ValueError) as e:
+                MOD_LOGGER.warning(f'Could not make a thumbnail of {item.image_path}: {e}')
+
+    def __finish(self, item: ScanItem):
+        try:
+            return self.__build_item(item)
+        finally:
+            item.release_buffer()
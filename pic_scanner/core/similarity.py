@@ -0,0 +1,363 @@
+"""
+similarity.py
+
+This module provides a persistent index of the perceptual hashes of scanned images, so a resized or recompressed copy
+of a picture that was already scanned can reuse its result instead of being sent to the inference server.
+
+The :class:`SimilarityIndex` is an SQLite database (at :data:`SIMILARITY_INDEX_FILE_PATH` by default) mapping the
+perceptual hash of each scanned image (see :func:`pic_scanner.helpers.images.get_perceptual_hash`) to its size and its
+result, keyed, like the :class:`pic_scanner.core.cache.ResultCache`, by the identity of the server and of the model.
+The hashes are loaded into a :class:`pic_scanner.helpers.bk_tree.BKTree`, so looking up the nearest hash within the
+radius does not compare the query to every hash. A reused result has its boxes rescaled to the size of the copy.
+
+Perceptual hashing requires the optional `numpy` dependency (`pip install pic-scanner[numpy]`).
+
+Classes:
+    SimilarityIndex:
+        A persistent index of the perceptual hashes and results of scanned images.
+
+
+Since:
+    1.0
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from time import time
+from typing import Optional, Union
+
+from PIL import Image
+
+from pic_scanner.api import rescale_prediction
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.common.constants.defaults.files import SIMILARITY_INDEX_FILE_PATH
+from pic_scanner.core import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.core.cache import server_identity
+from pic_scanner.helpers.bk_tree import BKTree
+from pic_scanner.helpers.images import (
+    DEFAULT_PERCEPTUAL_HASH_SIZE,
+    DEFAULT_SIMILARITY_RADIUS,
+    ImageBuffer,
+    get_perceptual_hash,
+)
+
+
+__all__ = [
+    'SimilarityIndex',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('similarity')
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hashes (
+    hash      TEXT NOT NULL,
+    method    TEXT NOT NULL,
+    server    TEXT NOT NULL,
+    model     TEXT NOT NULL,
+    width     INTEGER NOT NULL,
+    height    INTEGER NOT NULL,
+    result    TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (hash, method, server, model)
+) WITHOUT ROWID;
+'''
+
+
+class SimilarityIndex:
+    """
+    A persistent index of the perceptual hashes and results of scanned images, keyed by server and model identity.
+
+    The index is thread-safe. The hashes are loaded into memory when it is created; hashes added by other processes
+    afterwards are not seen until it is created again.
+
+    Properties:
+        method (str):
+            The perceptual hash method and size, for example 'dhash-8'.
+
+        path (Path):
+            The path of the database.
+
+        radius (int):
+            The maximum Hamming distance of a match.
+
+    Methods:
+        add(hash_value, size, result):
+            Store the result of an image.
+
+        close():
+            Close the calling thread's connection.
+
+        find(hash_value, radius=None):
+            Find the stored results within a radius of a hash.
+
+        hash_image(image):
+            Get the perceptual hash and the size of an image.
+
+        lookup(hash_value, size=None):
+            Get the result of the closest image within the radius.
+
+        stats():
+            Get the hit, miss and size statistics of the index.
+    """
+
+    def __init__(
+            self,
+            path:      Optional[Union[str, Path]] = None,
+            server:    Optional[Union[str, list[str], tuple[str]]] = None,
+            model:     Optional[str] = None,
+            method:    str = 'dhash',
+            hash_size: int = DEFAULT_PERCEPTUAL_HASH_SIZE,
+            radius:    int = DEFAULT_SIMILARITY_RADIUS,
+            timeout:   float = 30.0,
+    ):
+        """
+        The constructor for the SimilarityIndex class.
+
+        Parameters:
+            path (Optional[Union[str, Path]]):
+                The path of the database. Defaults to :data:`SIMILARITY_INDEX_FILE_PATH`.
+
+            server (Optional[Union[str, list[str], tuple[str]]]):
+                The base URL(s) of the inference server the results come from. Defaults to :data:`DEFAULT_BASE_URL`.
+
+            model (Optional[str]):
+                The identity of the model (see :class:`pic_scanner.core.cache.ResultCache`).
+
+            method (str):
+                The perceptual hash method, 'dhash' or 'phash' (see
+                :func:`pic_scanner.helpers.images.get_perceptual_hash`).
+
+            hash_size (int):
+                The side of the perceptual hash grid.
+
+            radius (int):
+                The maximum Hamming distance between two hashes for one image to reuse the result of the other. Keep it
+                small: a false match reuses the result of another picture.
+
+            timeout (float):
+                The number of seconds to wait for another writer to release the database.
+        """
+        self.__path = Path(path or SIMILARITY_INDEX_FILE_PATH)
+        self.__server = server_identity(server or DEFAULT_BASE_URL)
+        self.__model = model or ''
+        self.__hash_method = method
+        self.__hash_size = hash_size
+        self.__method = f'{method}-{hash_size}'
+        self.__radius = radius
+        self.__timeout = timeout
+
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__tree = BKTree()
+        self.__hits = 0
+        self.__misses = 0
+        self.__puts = 0
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection.executescript(_SCHEMA)
+
+        rows = self.__connection.execute(
+            'SELECT hash, width, height, result FROM hashes WHERE method = ? AND server = ? AND model = ?',
+            (self.__method, self.__server, self.__model)
+        )
+
+        for hash_hex, width, height, result in rows:
+            self.__tree.add(int(hash_hex, 16), (width, height, result))
+
+        MOD_LOGGER.debug(f'Loaded {len(self.__tree)} perceptual hashes from {self.__path}.')
+
+    def __len__(self):
+        return len(self.__tree)
+
+    def __repr__(self):
+        return f'SimilarityIndex({str(self.path)!r}, method={self.method!r}, radius={self.radius})'
+
+    @property
+    def method(self) -> str:
+        """
+        Get the perceptual hash method and size.
+
+        Returns:
+            str:
+                The method and size, for example 'dhash-8'.
+        """
+        return self.__method
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the path of the database.
+
+        Returns:
+            Path:
+                The path of the database.
+        """
+        return self.__path
+
+    @property
+    def radius(self) -> int:
+        """
+        Get the maximum Hamming distance of a match.
+
+        Returns:
+            int:
+                The radius.
+        """
+        return self.__radius
+
+    @property
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.__path, timeout=self.__timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+
+        return connection
+
+    def hash_image(self, image: Union[str, Path, ImageBuffer]) -> tuple[int, tuple[int, int]]:
+        """
+        Get the perceptual hash and the size of an image.
+
+        Parameters:
+            image (Union[str, Path, ImageBuffer]):
+                The path of the image, or its buffer.
+
+        Returns:
+            tuple[int, tuple[int, int]]:
+                The hash and the (width, height) of the image.
+
+        Raises:
+            ImportError:
+                If `numpy` is not installed.
+
+            OSError:
+                If the image cannot be opened and identified.
+        """
+        with Image.open(image.open() if isinstance(image, ImageBuffer) else image) as opened:
+            size = opened.size
+
+            return get_perceptual_hash(opened, self.__hash_method, self.__hash_size), size
+
+    @staticmethod
+    def __decode(value, size: Optional[tuple[int, int]]) -> dict:
+        width, height, result = value
+        result = json.loads(result)
+
+        if size is not None and size != (width, height):
+            for prediction in result.get('prediction', []):
+                rescale_prediction(prediction, (size[0] / width, size[1] / height))
+
+        return result
+
+    def lookup(self, hash_value: int, size: Optional[tuple[int, int]] = None) -> Optional[dict]:
+        """
+        Get the result of the closest stored image within the radius of a hash.
+
+        Parameters:
+            hash_value (int):
+                The perceptual hash of the image.
+
+            size (Optional[tuple[int, int]]):
+                The (width, height) of the image. If given, the boxes of the result are rescaled to it.
+
+        Returns:
+            Optional[dict]:
+                The result (`{'prediction': [...]}`), or None if no stored image is close enough.
+        """
+        with self.__lock:
+            match = self.__tree.nearest(hash_value, self.__radius)
+
+            if match is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+
+        return self.__decode(match[2], size) if match is not None else None
+
+    def find(self, hash_value: int, radius: Optional[int] = None) -> list[tuple[int, dict]]:
+        """
+        Find the stored results within a radius of a hash.
+
+        Parameters:
+            hash_value (int):
+                The perceptual hash.
+
+            radius (Optional[int]):
+                The maximum Hamming distance. Defaults to the radius of the index.
+
+        Returns:
+            list[tuple[int, dict]]:
+                The distance and result of every match, closest first.
+        """
+        with self.__lock:
+            matches = self.__tree.find(hash_value, self.__radius if radius is None else radius)
+
+        return [(distance, self.__decode(value, None)) for distance, _, value in matches]
+
+    def add(self, hash_value: int, size: tuple[int, int], result: dict):
+        """
+        Store the result of an image, replacing the result of an image with the same hash.
+
+        Parameters:
+            hash_value (int):
+                The perceptual hash of the image.
+
+            size (tuple[int, int]):
+                The (width, height) of the image.
+
+            result (dict):
+                The result of the inference server.
+
+        Returns:
+            None
+        """
+        result = json.dumps(result, separators=(',', ':'))
+
+        self.__connection.execute(
+            'INSERT OR REPLACE INTO hashes (hash, method, server, model, width, height, result, stored_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (f'{hash_value:x}', self.__method, self.__server, self.__model, *size, result, time())
+        )
+
+        with self.__lock:
+            self.__tree.add(hash_value, (*size, result))
+            self.__puts += 1
+
+    def stats(self) -> dict:
+        """
+        Get the hit, miss and size statistics of the index.
+
+        Returns:
+            dict:
+                The number of hits, misses and stored results (since this object was created), the hit rate and the
+                number of hashes in memory.
+        """
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'puts': self.__puts,
+                'hit_rate': self.__hits / lookups if lookups else 0.0,
+                'entries': len(self.__tree),
+            }
+
+    def close(self):
+        """
+        Close the calling thread's connection to the database.
+
+        Returns:
+            None
+        """
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
@@ -56,11 +56,73 @@ def is_instance(obj):
     return not is_class(obj)
 
 
+def iter_picture_files(
+        directory: Union[str, Path],
+        recursive: bool = False,
+        exclude_dir_names: list[str] = None,
+        index: 'FileIndex' = None):
+    """
+    Lazily iterate over the picture files in a directory.
+
+    Unlike :func:`get_picture_files`, files are yielded as the directory is walked, so scanning can start before a large
+    tree has been fully listed. Directories are excluded the same way (case-insensitive, at any depth).
+
+    Parameters:
+        directory (str or Path):
+            The directory to search for picture files.
+
+        recursive (bool):
+            A flag indicating whether to search recursively.
+
+        exclude_dir_names (list):
+            A list of directory names to exclude.
+
+        index (FileIndex):
+            If given, each file is classified against this index (see
+            :class:`pic_scanner.helpers.filesystem.index.FileIndex`) and yielded as an `IndexedFile`, so unchanged
+            files need not be read again.
+
+    Yields:
+        Path:
+            The path of each picture file found (an `IndexedFile` if `index` is given).
+
+    Example:
+        >>> next(iter_picture_files('path/to/directory', recursive=True))
+        Path('path/to/directory/image1.jpg')
+    """
+    if index is not None:
+        yield from index.classify_many(iter_picture_files(directory, recursive, exclude_dir_names))
+        return
+
+    directory = Path(directory)
+
+    if not directory.is_dir():
+        warn(f"Invalid directory: {directory}!")
+        return
+
+    if not recursive:
+        for file in directory.iterdir():
+            if file.suffix.lower() in IMAGE_EXTENSIONS:
+                yield file
+
+        return
+
+    for root, _, filenames in os.walk(directory):
+        if exclude_dir_names and any(name.lower() in root.lower() for name in exclude_dir_names):
+            excluded.append(root)
+            continue
+
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                yield Path(root) / filename
+
+
 def get_picture_files(
         directory: Union[str, Path],
         recursive: bool = False,
         do_not_provision: bool = False,
         exclude_dir_names: list[str] = None,
+        index: 'FileIndex' = None,
         **kwargs) -> list:
     """
     Get a list of picture files in a directory.
@@ -88,12 +150,16 @@ def get_picture_files(
         exclude_dir_names (list):
             A list of directory names to exclude.
 
+        index (FileIndex):
+            If given, each file is classified against this index as unchanged, changed or new (see
+            :class:`pic_scanner.helpers.filesystem.index.FileIndex`), using only its stat fingerprint.
+
         **kwargs:
             Additional keyword arguments.
 
     Returns:
         list[Path]:
-            A list of picture files in the directory.
+            A list of picture files in the directory (of `IndexedFile` objects if `index` is given).
 
     Example:
         >>> get_picture_files('path/to/directory', recursive=True)
@@ -135,6 +201,10 @@ def get_picture_files(
             for file in directory.iterdir()
             if file.suffix.lower() in IMAGE_EXTENSIONS
                 )
+
+    if index is not None:
+        return list(index.classify_many(files))
+
     return files
 
 
@@ -0,0 +1,183 @@
+"""
+bk_tree.py
+
+This module provides a BK-tree of perceptual hashes, for finding every hash within a Hamming radius of another without
+comparing it to all of them.
+
+Each node keeps its children by their distance from it; by the triangle inequality, a search for the hashes within
+radius `r` of a query at distance `d` from a node only needs to visit the children at distances `d - r` to `d + r`. For
+the small radii used to find near-duplicate images, a query visits a small fraction of the tree.
+
+Classes:
+    BKTree:
+        A BK-tree of integer hashes under the Hamming distance.
+
+
+Since:
+    1.0
+"""
+from typing import Any, Iterable, Iterator, Optional
+
+from pic_scanner.helpers.images import hamming_distance
+
+
+__all__ = [
+    'BKTree',
+]
+
+
+class BKTree:
+    """
+    A BK-tree of integer hashes under the Hamming distance, each with the values stored for it.
+
+    The tree is not thread-safe; guard it with a lock if several threads use it.
+
+    Methods:
+        add(hash_value, value=None):
+            Add a hash (and a value stored for it).
+
+        find(hash_value, radius):
+            Find the hashes within a radius of a hash.
+
+        nearest(hash_value, radius):
+            Find the closest hash within a radius of a hash.
+    """
+
+    def __init__(self, items: Optional[Iterable[tuple[int, Any]]] = None):
+        """
+        The constructor for the BKTree class.
+
+        Parameters:
+            items (Optional[Iterable[tuple[int, Any]]]):
+                The (hash, value) pairs to add.
+        """
+        # A node is [hash, values, children by distance].
+        self.__root = None
+        self.__count = 0
+
+        for hash_value, value in items or ():
+            self.add(hash_value, value)
+
+    def __len__(self):
+        return self.__count
+
+    def __iter__(self) -> Iterator[tuple[int, Any]]:
+        nodes = [self.__root] if self.__root is not None else []
+
+        while nodes:
+            hash_value, values, children = nodes.pop()
+            nodes.extend(children.values())
+
+            for value in values:
+                yield hash_value, value
+
+    def __repr__(self):
+        return f'BKTree({self.__count} hashes)'
+
+    def add(self, hash_value: int, value: Any = None):
+        """
+        Add a hash, and a value stored for it.
+
+        Parameters:
+            hash_value (int):
+                The hash.
+
+            value (Any):
+                The value stored for the hash (a hash may have several).
+
+        Returns:
+            None
+        """
+        self.__count += 1
+
+        if self.__root is None:
+            self.__root = [hash_value, [value], {}]
+            return
+
+        node = self.__root
+
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+
+            if distance == 0:
+                node[1].append(value)
+                return
+
+            if (child := node[2].get(distance)) is None:
+                node[2][distance] = [hash_value, [value], {}]
+                return
+
+            node = child
+
+    def find(self, hash_value: int, radius: int) -> list[tuple[int, int, Any]]:
+        """
+        Find the hashes within a radius of a hash.
+
+        Parameters:
+            hash_value (int):
+                The hash to search around.
+
+            radius (int):
+                The maximum Hamming distance.
+
+        Returns:
+            list[tuple[int, int, Any]]:
+                The (distance, hash, value) of every match, closest first.
+        """
+        matches = []
+        nodes = [self.__root] if self.__root is not None else []
+
+        while nodes:
+            node_hash, values, children = nodes.pop()
+            distance = hamming_distance(hash_value, node_hash)
+
+            if distance <= radius:
+                matches.extend((distance, node_hash, value) for value in values)
+
+            nodes.extend(
+                child for child_distance, child in children.items()
+                if distance - radius <= child_distance <= distance + radius
+            )
+
+        matches.sort(key=lambda match: match[0])
+
+        return matches
+
+    def nearest(self, hash_value: int, radius: int) -> Optional[tuple[int, int, Any]]:
+        """
+        Find the closest hash within a radius of a hash.
+
+        Parameters:
+            hash_value (int):
+                The hash to search around.
+
+            radius (int):
+                The maximum Hamming distance.
+
+        Returns:
+            Optional[tuple[int, int, Any]]:
+                The (distance, hash, value) of the closest match (the most recently added value, if the hash has
+                several), or None if no hash is that close.
+        """
+        best = None
+        nodes = [self.__root] if self.__root is not None else []
+
+        while nodes:
+            node_hash, values, children = nodes.pop()
+            distance = hamming_distance(hash_value, node_hash)
+
+            if distance <= radius and (best is None or distance < best[0]):
+                best = (distance, node_hash, values[-1])
+
+                if distance == 0:
+                    break
+
+                # Nothing farther than the best match so far is of interest.
+                radius = distance
+
+            nodes.extend(
+                child for child_distance, child in children.items()
+                if distance - radius <= child_distance <= distance + radius
+            )
+
+        return best
@@ -213,6 +213,7 @@ def gather_files_in_dir(
         file_types: Union[str, list] = None,
         ignore_dirs: list = None,
         ignore_case: bool = False,
+        index=None,
         **kwargs
 ) -> list:
     """
@@ -234,9 +235,13 @@ def gather_files_in_dir(
         ignore_case (bool):
             A flag indicating whether to ignore case when matching directory names.
 
+        index (Optional[FileIndex]):
+            If given, each file is classified against this index as unchanged, changed or new (see
+            :class:`pic_scanner.helpers.filesystem.index.FileIndex`), using only its stat fingerprint.
+
     Returns:
         list:
-            A list of files in the directory.
+            A list of files in the directory (of `IndexedFile` objects if `index` is given).
     """
     _name = 'gather_files_in_dir'
 
@@ -305,6 +310,10 @@ def gather_files_in_dir(
     log.debug(f'Files gathered: {files}')
     log.debug(f'Gathered {len(files)} files in directory: {directory} | Recursive: {recursive}')
 
+    if index is not None:
+        files = list(index.classify_many(files))
+        log.debug(f'Classified {len(files)} files against the file index: {index.stats()}')
+
     return files
 
 
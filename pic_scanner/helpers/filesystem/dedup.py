@@ -0,0 +1,270 @@
+"""
+dedup.py
+
+This module finds byte-identical copies of files, reading as little of them as possible.
+
+Files are grouped in three passes, each only over the files that are still candidates:
+
+    1. By size, from :func:`os.stat` alone. A file whose size is unique has no copy and is never read.
+    2. By a partial checksum of the first and last :data:`PARTIAL_CHECKSUM_SIZE` bytes. Files that differ usually
+       differ there (headers, EXIF data and trailers), so this splits most same-size groups after two small reads.
+    3. By a full checksum. Files no larger than twice :data:`PARTIAL_CHECKSUM_SIZE` were read whole by the second pass,
+       and are not read again.
+
+Classes:
+    DuplicateGroup:
+        A group of byte-identical files.
+
+Functions:
+    deduplicate:
+        Split paths into the ones to scan and the duplicates of each.
+
+    find_duplicates:
+        Find the groups of byte-identical files among paths.
+
+    get_partial_checksum:
+        Get the checksum of the first and last bytes of a file.
+
+
+Since:
+    1.0
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional, Union
+
+from pic_scanner.helpers.filesystem import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.helpers.images import iter_image_checksums
+
+
+__all__ = [
+    'PARTIAL_CHECKSUM_SIZE',
+    'DuplicateGroup',
+    'deduplicate',
+    'find_duplicates',
+    'get_partial_checksum',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('dedup')
+
+
+PARTIAL_CHECKSUM_SIZE = 8 * 1024
+"""
+int:
+    The number of bytes read from each end of a file for its partial checksum.
+"""
+
+
+class DuplicateGroup(NamedTuple):
+    """
+    A group of byte-identical files: the representative (the first of them in input order) and its duplicates.
+
+    `checksum` is the full checksum of the files, if it was computed (it is not for files small enough to be compared
+    whole by their partial checksum).
+    """
+    representative: Union[str, Path]
+    duplicates: tuple
+    checksum: Optional[str] = None
+
+    @property
+    def paths(self) -> tuple:
+        """
+        Get the paths of all the files of the group.
+
+        Returns:
+            tuple:
+                The representative, followed by its duplicates.
+        """
+        return (self.representative, *self.duplicates)
+
+
+def get_partial_checksum(
+        path: Union[str, Path],
+        size: Optional[int] = None,
+        partial_size: int = PARTIAL_CHECKSUM_SIZE
+) -> str:
+    """
+    Get the checksum of the first and last bytes of a file (of the whole file, if it is small enough).
+
+    Parameters:
+        path (Union[str, Path]):
+            The path of the file.
+
+        size (Optional[int]):
+            The size of the file, if it was already stat-ed.
+
+        partial_size (int):
+            The number of bytes read from each end of the file.
+
+    Returns:
+        str:
+            The partial checksum. Only files of the same size may be compared by it.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+
+    with open(path, 'rb', buffering=0) as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+
+        if size <= 2 * partial_size:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(partial_size))
+            f.seek(-partial_size, os.SEEK_END)
+            hasher.update(f.read(partial_size))
+
+    return hasher.hexdigest()
+
+
+def _split(groups: Iterable[list], key) -> list:
+    """
+    Split each group of (path, size) pairs by a key, keeping only the subgroups with more than one file. Files whose key
+    cannot be computed are dropped (they are not duplicates of anything).
+    """
+    split = []
+
+    for group in groups:
+        by_key = {}
+
+        for path, size in group:
+            try:
+                by_key.setdefault(key(path, size), []).append((path, size))
+            except OSError as e:
+                MOD_LOGGER.warning(f'Could not read {path}: {e}')
+
+        split.extend(subgroup for subgroup in by_key.values() if len(subgroup) > 1)
+
+    return split
+
+
+def find_duplicates(
+        paths: Iterable[Union[str, Path]],
+        partial_size: int = PARTIAL_CHECKSUM_SIZE,
+        algorithm: Optional[str] = None,
+        workers: Optional[int] = None
+) -> list:
+    """
+    Find the groups of byte-identical files among paths.
+
+    Parameters:
+        paths (Iterable[Union[str, Path]]):
+            The paths of the files. A path given twice counts once.
+
+        partial_size (int):
+            The number of bytes read from each end of a file for its partial checksum.
+
+        algorithm (Optional[str]):
+            The algorithm of the full checksums. Defaults to
+            :data:`pic_scanner.helpers.images.DEFAULT_CHECKSUM_ALGORITHM`.
+
+        workers (Optional[int]):
+            The number of threads computing the full checksums.
+
+    Returns:
+        list[DuplicateGroup]:
+            The groups of two or more identical files, in the input order of their representatives. Files that cannot be
+            stat-ed or read are left out.
+    """
+    by_size = {}
+    seen = set()
+    order = {}
+
+    for path in paths:
+        if (key := str(path)) in seen:
+            continue
+
+        seen.add(key)
+        order[key] = len(order)
+
+        try:
+            size = os.stat(path).st_size
+        except OSError as e:
+            MOD_LOGGER.warning(f'Could not stat {path}: {e}')
+            continue
+
+        by_size.setdefault(size, []).append((path, size))
+
+    candidates = [group for group in by_size.values() if len(group) > 1]
+    MOD_LOGGER.debug(f'{sum(map(len, candidates))} of {len(order)} files share their size with another.')
+
+    candidates = _split(candidates, lambda path, size: get_partial_checksum(path, size, partial_size))
+
+    groups = []
+    to_hash = []
+
+    for group in candidates:
+        if group[0][1] <= 2 * partial_size:
+            # The partial checksum covered the whole file.
+            groups.append(([path for path, _ in group], None))
+        else:
+            to_hash.append(group)
+
+    if to_hash:
+        checksums = {}
+
+        for path, checksum, error in iter_image_checksums(
+                (path for group in to_hash for path, _ in group),
+                algorithm=algorithm,
+                workers=workers
+        ):
+            if error is not None:
+                MOD_LOGGER.warning(f'Could not hash {path}: {error}')
+            else:
+                checksums[str(path)] = checksum
+
+        # Files that could not be hashed are left out, like those that could not be stat-ed or partially hashed.
+        to_hash = [[(path, size) for path, size in group if str(path) in checksums] for group in to_hash]
+
+        for group in _split(to_hash, lambda path, size: checksums[str(path)]):
+            groups.append(([path for path, _ in group], checksums[str(group[0][0])]))
+
+    groups = [
+        DuplicateGroup(paths[0], tuple(paths[1:]), checksum)
+        for paths, checksum in (
+            (sorted(paths, key=lambda path: order[str(path)]), checksum) for paths, checksum in groups
+        )
+    ]
+    groups.sort(key=lambda group: order[str(group.representative)])
+
+    MOD_LOGGER.debug(f'Found {len(groups)} groups of identical files, with '
+                     f'{sum(len(group.duplicates) for group in groups)} duplicates.')
+
+    return groups
+
+
+def deduplicate(paths: Iterable[Union[str, Path]], **kwargs) -> tuple:
+    """
+    Split paths into the ones to scan and the duplicates of each.
+
+    Parameters:
+        paths (Iterable[Union[str, Path]]):
+            The paths of the files.
+
+        **kwargs:
+            Keyword arguments passed to :func:`find_duplicates`.
+
+    Returns:
+        tuple[list, dict]:
+            The paths without their duplicates (in input order), and the :class:`DuplicateGroup` of each representative
+            that has duplicates, by its path.
+
+    Examples:
+        >>> unique, groups = deduplicate(paths)
+        >>> for representative, group in groups.items():
+        ...     print(representative, 'has', len(group.duplicates), 'copies')
+    """
+    paths = list(paths)
+    groups = find_duplicates(paths, **kwargs)
+    duplicates = {str(path) for group in groups for path in group.duplicates}
+
+    unique = []
+    seen = set()
+
+    for path in paths:
+        if (key := str(path)) not in duplicates and key not in seen:
+            seen.add(key)
+            unique.append(path)
+
+    return unique, {group.representative: group for group in groups}
@@ -0,0 +1,495 @@
+"""
+index.py
+
+This module provides a persistent index of the files seen by earlier scans, keyed by their stat fingerprint.
+
+A file's fingerprint is its device, inode, size and modification time (in nanoseconds), which :func:`os.stat` returns
+without reading a byte of the file. The :class:`FileIndex` maps each path to the fingerprint it had when it was last
+scanned, along with its checksum and scan result (and the server and model identity the result came from, as in
+:class:`pic_scanner.core.cache.ResultCache`), so discovery can classify every file as unchanged, changed or new,
+and only changed and new files need to be read and hashed again. A file that was moved or renamed within a device keeps
+its inode, and is recognized as unchanged at its new path.
+
+Classes:
+    FileIndex:
+        A persistent index of scanned files, keyed by path and stat fingerprint.
+
+    Fingerprint:
+        The stat fingerprint of a file.
+
+    IndexedFile:
+        A file classified against the index.
+
+
+Since:
+    1.0
+"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from time import time
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+from pic_scanner.common.constants import DEFAULT_BASE_URL
+from pic_scanner.common.constants.defaults.files import INDEX_FILE_PATH
+from pic_scanner.helpers.filesystem import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'CHANGED',
+    'NEW',
+    'UNCHANGED',
+    'FileIndex',
+    'Fingerprint',
+    'IndexedFile',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('index')
+
+
+UNCHANGED = 'unchanged'
+"""
+str:
+    The state of a file whose fingerprint matches the index.
+"""
+
+CHANGED = 'changed'
+"""
+str:
+    The state of a file the index knows, whose fingerprint no longer matches.
+"""
+
+NEW = 'new'
+"""
+str:
+    The state of a file the index does not know.
+"""
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path       TEXT PRIMARY KEY,
+    device     INTEGER NOT NULL,
+    inode      INTEGER NOT NULL,
+    size       INTEGER NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    checksum   TEXT,
+    result     TEXT,
+    server     TEXT,
+    model      TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_inode ON files (device, inode);
+'''
+
+# Columns added after the first version of the schema, added to older databases when they are opened.
+_ADDED_COLUMNS = {
+    'server': 'TEXT',
+    'model': 'TEXT',
+}
+
+_COLUMNS = 'device, inode, size, mtime_ns, checksum, result, server, model'
+
+
+class Fingerprint(NamedTuple):
+    """
+    The stat fingerprint of a file: if any field differs, the file must be read again.
+    """
+    device: int
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, stat: os.stat_result) -> 'Fingerprint':
+        """
+        Get the fingerprint from the result of :func:`os.stat`.
+
+        Parameters:
+            stat (os.stat_result):
+                The status of the file.
+
+        Returns:
+            Fingerprint:
+                The fingerprint of the file.
+        """
+        return cls(stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def of(cls, path: Union[str, Path]) -> 'Fingerprint':
+        """
+        Get the fingerprint of a file.
+
+        Parameters:
+            path (Union[str, Path]):
+                The path of the file.
+
+        Returns:
+            Fingerprint:
+                The fingerprint of the file.
+        """
+        return cls.from_stat(os.stat(path))
+
+
+class IndexedFile(NamedTuple):
+    """
+    A file classified against the index.
+
+    For an unchanged file, `checksum` is the one recorded by the last scan, and so is `result` if it came from the same
+    server and model as the index's; for a changed or new file both are None, and the file has to be read.
+    """
+    path: Path
+    state: str
+    fingerprint: Fingerprint
+    checksum: Optional[str] = None
+    result: Optional[dict] = None
+
+    @property
+    def unchanged(self) -> bool:
+        """
+        Get the unchanged status of the file.
+
+        Returns:
+            bool:
+                True if the file is unchanged since it was last scanned, False otherwise.
+        """
+        return self.state == UNCHANGED
+
+
+class FileIndex:
+    """
+    A persistent index of scanned files, keyed by path and stat fingerprint.
+
+    The index is an SQLite database in write-ahead-log mode; it is thread-safe and may be shared with other processes.
+
+    Properties:
+        model (str):
+            The identity of the model the recorded results come from.
+
+        path (Path):
+            The path of the database.
+
+        server (str):
+            The identity of the inference server the recorded results come from.
+
+    Methods:
+        classify(path, stat=None):
+            Classify a file as unchanged, changed or new.
+
+        classify_many(paths):
+            Classify several files.
+
+        close():
+            Close the calling thread's connection.
+
+        prune():
+            Remove the entries of files that no longer exist.
+
+        remove(path):
+            Remove the entry of a file.
+
+        stats():
+            Get the classification statistics of the index.
+
+        update(path, checksum, result=None, fingerprint=None):
+            Record the checksum and scan result of a file.
+    """
+
+    def __init__(
+            self,
+            path:    Optional[Union[str, Path]] = None,
+            timeout: float = 30.0,
+            server:  Optional[Union[str, list[str], tuple[str]]] = None,
+            model:   Optional[str] = None,
+    ):
+        """
+        The constructor for the FileIndex class.
+
+        Parameters:
+            path (Optional[Union[str, Path]]):
+                The path of the database. Defaults to :data:`INDEX_FILE_PATH`.
+
+            timeout (float):
+                The number of seconds to wait for another writer to release the database.
+
+            server (Optional[Union[str, list[str], tuple[str]]]):
+                The base URL(s) of the inference server the results come from. Defaults to :data:`DEFAULT_BASE_URL`.
+
+            model (Optional[str]):
+                The identity of the model (see :class:`pic_scanner.core.cache.ResultCache`). A result recorded for
+                another server or model is not reused; only the checksum of the file is.
+        """
+        self.__path = Path(path or INDEX_FILE_PATH)
+        self.__timeout = timeout
+
+        # Imported here, as the core package imports this module while it initializes.
+        from pic_scanner.core.cache import server_identity
+
+        # The identity the result cache keys its results by, so the index reuses the same results.
+        self.__server = server_identity(server or DEFAULT_BASE_URL)
+        self.__model = model or ''
+
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__counts = {UNCHANGED: 0, CHANGED: 0, NEW: 0}
+        self.__moved = 0
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection.executescript(_SCHEMA)
+        self.__migrate()
+
+    def __repr__(self):
+        return f'FileIndex({str(self.path)!r}, server={self.__server!r}, model={self.__model!r})'
+
+    def __migrate(self):
+        columns = {row[1] for row in self.__connection.execute('PRAGMA table_info(files)')}
+
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in columns:
+                try:
+                    self.__connection.execute(f'ALTER TABLE files ADD COLUMN {column} {column_type}')
+                except sqlite3.OperationalError:
+                    # Another process added it first.
+                    pass
+
+    def __len__(self):
+        return self.__connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    @property
+    def model(self) -> str:
+        """
+        Get the identity of the model the recorded results come from.
+
+        Returns:
+            str:
+                The identity of the model.
+        """
+        return self.__model
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the path of the database.
+
+        Returns:
+            Path:
+                The path of the database.
+        """
+        return self.__path
+
+    @property
+    def server(self) -> str:
+        """
+        Get the identity of the inference server the recorded results come from.
+
+        Returns:
+            str:
+                The identity of the server.
+        """
+        return self.__server
+
+    @property
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.__path, timeout=self.__timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+
+        return connection
+
+    def classify(self, path: Union[str, Path], stat: Optional[os.stat_result] = None) -> IndexedFile:
+        """
+        Classify a file as unchanged, changed or new, without reading it.
+
+        Parameters:
+            path (Union[str, Path]):
+                The path of the file.
+
+            stat (Optional[os.stat_result]):
+                The status of the file, if it was already stat-ed.
+
+        Returns:
+            IndexedFile:
+                The classified file.
+
+        Raises:
+            OSError:
+                If the file cannot be stat-ed.
+        """
+        path = Path(path)
+        fingerprint = Fingerprint.from_stat(stat or os.stat(path))
+
+        row = self.__connection.execute(f'SELECT {_COLUMNS} FROM files WHERE path = ?', (str(path),)).fetchone()
+
+        moved = False
+
+        if row is None:
+            # A file moved within its device keeps its inode; look for it under its old path.
+            row = self.__connection.execute(
+                f'SELECT {_COLUMNS} FROM files WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? LIMIT 1',
+                fingerprint
+            ).fetchone()
+            moved = row is not None
+
+        if row is None:
+            state = NEW
+        elif Fingerprint(*row[:4]) != fingerprint or row[4] is None:
+            state = CHANGED
+        else:
+            state = UNCHANGED
+
+        with self.__lock:
+            self.__counts[state] += 1
+            self.__moved += moved and state == UNCHANGED
+
+        if state != UNCHANGED:
+            return IndexedFile(path, state, fingerprint)
+
+        checksum, result, server, model = row[4:]
+
+        if moved:
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO files '
+                '(path, device, inode, size, mtime_ns, checksum, result, server, model, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (str(path), *fingerprint, checksum, result, server, model, time())
+            )
+
+        # A result from another server or model is not reused; the result cache may still hold one for the checksum.
+        if result is not None and (server, model) == (self.__server, self.__model):
+            result = json.loads(result)
+        else:
+            result = None
+
+        return IndexedFile(path, state, fingerprint, checksum, result)
+
+    def classify_many(self, paths: Iterable[Union[str, Path]]) -> Iterator[IndexedFile]:
+        """
+        Classify several files, lazily. Files that cannot be stat-ed are skipped with a warning.
+
+        Parameters:
+            paths (Iterable[Union[str, Path]]):
+                The paths of the files.
+
+        Yields:
+            IndexedFile:
+                Each classified file.
+        """
+        for path in paths:
+            try:
+                yield self.classify(path)
+            except OSError as e:
+                MOD_LOGGER.warning(f'Could not stat {path}: {e}')
+
+    def update(
+            self,
+            path:        Union[str, Path],
+            checksum:    str,
+            result:      Optional[dict] = None,
+            fingerprint: Optional[Fingerprint] = None
+    ):
+        """
+        Record the checksum and scan result of a file.
+
+        Parameters:
+            path (Union[str, Path]):
+                The path of the file.
+
+            checksum (str):
+                The checksum of the file.
+
+            result (Optional[dict]):
+                The result of the inference server for the file, recorded with the server and model identity of the
+                index.
+
+            fingerprint (Optional[Fingerprint]):
+                The fingerprint of the file when it was read. Pass the fingerprint taken before reading, so a file
+                modified while it was being scanned is classified as changed next time. Defaults to its current
+                fingerprint.
+
+        Returns:
+            None
+        """
+        fingerprint = fingerprint or Fingerprint.of(path)
+
+        self.__connection.execute(
+            'INSERT OR REPLACE INTO files '
+            '(path, device, inode, size, mtime_ns, checksum, result, server, model, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                str(path),
+                *fingerprint,
+                checksum,
+                json.dumps(result, separators=(',', ':')) if result is not None else None,
+                self.__server,
+                self.__model,
+                time()
+            )
+        )
+
+    def remove(self, path: Union[str, Path]):
+        """
+        Remove the entry of a file.
+
+        Parameters:
+            path (Union[str, Path]):
+                The path of the file.
+
+        Returns:
+            None
+        """
+        self.__connection.execute('DELETE FROM files WHERE path = ?', (str(path),))
+
+    def prune(self) -> int:
+        """
+        Remove the entries of files that no longer exist.
+
+        Returns:
+            int:
+                The number of entries removed.
+        """
+        missing = [
+            (path,)
+            for path, in self.__connection.execute('SELECT path FROM files').fetchall()
+            if not os.path.exists(path)
+        ]
+
+        if missing:
+            self.__connection.executemany('DELETE FROM files WHERE path = ?', missing)
+            MOD_LOGGER.debug(f'Pruned {len(missing)} missing files from the file index.')
+
+        return len(missing)
+
+    def stats(self) -> dict:
+        """
+        Get the classification statistics of the index.
+
+        Returns:
+            dict:
+                The number of files classified as unchanged (of which `moved` were found under another path), changed
+                and new (since this object was created), and the number of entries in the index.
+        """
+        with self.__lock:
+            stats = {**self.__counts, 'moved': self.__moved}
+
+        stats['entries'] = len(self)
+
+        return stats
+
+    def close(self):
+        """
+        Close the calling thread's connection to the database.
+
+        Returns:
+            None
+        """
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
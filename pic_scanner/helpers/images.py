@@ -1,13 +1,22 @@
 from PIL import Image, ImageDraw, ImageFont, ImageTk
 import os
-from typing import Union, Tuple, Optional
+from collections import deque
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, Union, Tuple, Optional
 import io
 from io import BytesIO
 import base64
 from pic_scanner.helpers import MOD_LOGGER as PARENT_LOGGER
 from pathlib import Path
+from functools import lru_cache
 import hashlib
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
 MOD_LOGGER = PARENT_LOGGER.get_child('images')
 
 
@@ -70,7 +79,7 @@ def draw_bounding_boxes(
     image.show()
 
 
-def get_image_data(file_or_bytes: Union[str, bytes], maxsize: Tuple[int, int] = (1200, 850)) -> bytes:
+def get_image_data(file_or_bytes: Union[str, bytes, 'ImageBuffer'], maxsize: Tuple[int, int] = (1200, 850)) -> bytes:
     """
     Get image data from a file or a bytes object.
 
@@ -78,8 +87,9 @@ def get_image_data(file_or_bytes: Union[str, bytes], maxsize: Tuple[int, int] =
     and returns the image data in PNG format as bytes.
 
     Parameters:
-        file_or_bytes (Union[str, bytes]):
-            The path to the image file or a bytes object containing the image data.
+        file_or_bytes (Union[str, bytes, ImageBuffer]):
+            The path to the image file, a bytes object containing the image data, or the buffer of an image that was
+            already read (which is decoded without copying it).
 
         maxsize (Tuple[int, int], optional):
             The maximum size of the image as a (width, height) tuple. Default is (1200, 850).
@@ -96,7 +106,9 @@ def get_image_data(file_or_bytes: Union[str, bytes], maxsize: Tuple[int, int] =
 
     log.debug(f'Received file or bytes: {file_or_bytes}')
 
-    if isinstance(file_or_bytes, str):
+    if isinstance(file_or_bytes, ImageBuffer):
+        img = Image.open(file_or_bytes.open())
+    elif isinstance(file_or_bytes, str):
         try:
             img = Image.open(file_or_bytes)
         except FileNotFoundError as e:
@@ -124,14 +136,161 @@ def get_image_data(file_or_bytes: Union[str, bytes], maxsize: Tuple[int, int] =
         return bio.getvalue()
 
 
-def get_image_checksum(image_path: Union[str, Path]):
+def downscale_image(
+        image_path: Union[str, Path],
+        max_side: int,
+        quality: int = 85,
+        image_format: str = 'JPEG',
+        data: Optional[Union[bytes, memoryview]] = None
+) -> Optional[Tuple[bytes, Tuple[int, int], Tuple[int, int]]]:
+    """
+    Downscale an image so that its longest side is at most `max_side` pixels and re-encode it.
+
+    JPEG files are decoded at a reduced size (via :meth:`PIL.Image.Image.draft`) whenever possible, so large photos are
+    never fully decoded. No EXIF transposition is applied; the downscaled image keeps the pixel orientation of the
+    original file.
+
+    Parameters:
+        image_path (Union[str, Path]):
+            The path to the image file.
+
+        max_side (int):
+            The maximum length, in pixels, of the longest side of the downscaled image.
+
+        quality (int, optional):
+            The encoder quality (1-95) of the downscaled image. Default is 85.
+
+        image_format (str, optional):
+            The format the downscaled image is encoded in. Default is 'JPEG'.
+
+        data (Optional[Union[bytes, memoryview]]):
+            The bytes of the image, if they were already read. They are decoded in place, and the file is not read.
+
+    Returns:
+        Optional[Tuple[bytes, Tuple[int, int], Tuple[int, int]]]:
+            The encoded image data, the original (width, height) and the downscaled (width, height); or None if the
+            image is already small enough to be used as-is.
+
+    Raises:
+        FileNotFoundError: If the specified file does not exist.
+        OSError: If the file cannot be opened and identified as an image file.
+    """
+    with Image.open(open_buffer(data) if data is not None else image_path) as img:
+        original_size = img.size
+
+        if max(original_size) <= max_side:
+            return None
+
+        if img.format == 'JPEG':
+            img.draft('RGB', (max_side, max_side))
+
+        if image_format.upper() == 'JPEG' and img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        img.thumbnail((max_side, max_side))
+
+        # `draft` may have already reduced the decoded size, so the downscaled size is read back after `thumbnail`.
+        new_size = img.size
+
+        with BytesIO() as bio:
+            img.save(bio, format=image_format, quality=quality)
+            data = bio.getvalue()
+
+    return data, original_size, new_size
+
+
+DEFAULT_CHECKSUM_ALGORITHM = 'blake2b'
+"""
+str:
+    The algorithm used for file checksums when none is given. 'blake2b' is a 128-bit BLAKE2b digest: at least as fast
+    as MD5 on 64-bit CPUs, not vulnerable to collisions, and the same length (32 hexadecimal digits). For the fastest
+    hashing, install `blake3` or `xxhash` and use 'blake3' or 'xxh3_128'.
+"""
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+"""
+int:
+    The number of bytes read (and hashed) at a time, so hashing a large file does not load it into memory.
+"""
+
+
+class ChecksumResult(NamedTuple):
+    """
+    The checksum of one file from :func:`iter_image_checksums`, or the error that prevented it.
+    """
+    image_path: Path
+    checksum: Optional[str]
+    error: Optional[Exception] = None
+
+
+def _new_hasher(algorithm: str):
+    """
+    Create a hash object for a checksum algorithm.
+
+    Parameters:
+        algorithm (str):
+            'blake2b' (a 128-bit digest), 'blake3' (requires the `blake3` package), an `xxhash` function name such as
+            'xxh3_128' (requires the `xxhash` package), or any algorithm :func:`hashlib.new` supports.
+
+    Returns:
+        The hash object.
+
+    Raises:
+        ImportError:
+            If the algorithm requires a package that is not installed.
+
+        ValueError:
+            If the algorithm is not supported.
+    """
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=16)
+
+    if algorithm == 'blake3':
+        try:
+            import blake3
+        except ImportError:
+            raise ImportError("The 'blake3' checksum algorithm requires the 'blake3' package.") from None
+
+        return blake3.blake3()
+
+    if algorithm.startswith('xxh'):
+        try:
+            import xxhash
+        except ImportError:
+            raise ImportError(f"The {algorithm!r} checksum algorithm requires the 'xxhash' package.") from None
+
+        if not hasattr(xxhash, algorithm):
+            raise ValueError(f"Unsupported checksum algorithm: {algorithm}!")
+
+        return getattr(xxhash, algorithm)()
+
+    return hashlib.new(algorithm)
+
+
+def get_image_checksum(
+        image_path: Union[str, Path],
+        algorithm: Optional[str] = None,
+        chunk_size: int = CHECKSUM_CHUNK_SIZE
+):
     """
     Get the checksum of an image file.
 
+    The file is read in chunks into a reused buffer, so memory use does not depend on the size of the file, and the
+    hashing releases the GIL, so several files can be hashed at once on a thread pool (see
+    :func:`iter_image_checksums`).
+
     Parameters:
         image_path (Union[str, Path]):
             The path to the image file.
 
+        algorithm (Optional[str]):
+            The checksum algorithm: 'blake2b', 'blake3' (requires the `blake3` package), an `xxhash` function name such
+            as 'xxh3_128' (requires the `xxhash` package), or any algorithm :func:`hashlib.new` supports. Defaults to
+            :data:`DEFAULT_CHECKSUM_ALGORITHM`.
+
+        chunk_size (int):
+            The number of bytes read at a time.
+
     Returns:
         str: The checksum of the image file.
     """
@@ -142,16 +301,558 @@ def get_image_checksum(image_path: Union[str, Path]):
 
     log.debug(f'Received image path: {image_path}')
 
-    if isinstance(image_path, str):
-        image_path = Path(image_path)
+    hasher = _new_hasher(algorithm or DEFAULT_CHECKSUM_ALGORITHM)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
 
-    if not image_path.exists():
+    try:
+        with open(image_path, 'rb', buffering=0) as f:
+            while read := f.readinto(buffer):
+                hasher.update(view[:read])
+    except FileNotFoundError:
         log.error(f'File not found: {image_path}')
-        raise FileNotFoundError(f'File not found: {image_path}')
+        raise FileNotFoundError(f'File not found: {image_path}') from None
 
-    with open(image_path, 'rb') as f:
-        checksum = hashlib.md5(f.read()).hexdigest()
+    checksum = hasher.hexdigest()
 
     log.debug(f'Checksum: {checksum}')
 
     return checksum
+
+
+def iter_image_checksums(
+        image_paths: Iterable[Union[str, Path]],
+        algorithm: Optional[str] = None,
+        workers: Optional[int] = None,
+        prefetch: Optional[int] = None
+) -> Iterator[ChecksumResult]:
+    """
+    Hash many files on a thread pool, yielding the checksums in input order.
+
+    The paths are consumed lazily, and up to `prefetch` files are hashed ahead of the one being yielded, so hashing
+    overlaps with whatever the caller does with each checksum.
+
+    Parameters:
+        image_paths (Iterable[Union[str, Path]]):
+            The paths of the files.
+
+        algorithm (Optional[str]):
+            The checksum algorithm. Defaults to :data:`DEFAULT_CHECKSUM_ALGORITHM`.
+
+        workers (Optional[int]):
+            The number of hashing threads. Defaults to the number of CPUs (at most 8).
+
+        prefetch (Optional[int]):
+            The maximum number of files hashed ahead. Defaults to twice the number of workers.
+
+    Yields:
+        ChecksumResult:
+            The path and checksum of each file, or the error that prevented hashing it.
+
+    Examples:
+        >>> for image_path, checksum, error in iter_image_checksums(paths, algorithm='blake2b'):
+        ...     print(image_path, checksum or error)
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    prefetch = max(prefetch or 2 * workers, 1)
+    pending = deque()
+
+    def collect(image_path, future):
+        try:
+            return ChecksumResult(Path(image_path), future.result())
+        except Exception as e:
+            return ChecksumResult(Path(image_path), None, e)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='checksum') as executor:
+        try:
+            for image_path in image_paths:
+                pending.append((image_path, executor.submit(get_image_checksum, image_path, algorithm)))
+
+                if len(pending) >= prefetch:
+                    yield collect(*pending.popleft())
+
+            while pending:
+                yield collect(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def get_image_checksums(
+        image_paths: Iterable[Union[str, Path]],
+        algorithm: Optional[str] = None,
+        workers: Optional[int] = None
+) -> dict:
+    """
+    Hash many files on a thread pool.
+
+    Parameters:
+        image_paths (Iterable[Union[str, Path]]):
+            The paths of the files.
+
+        algorithm (Optional[str]):
+            The checksum algorithm. Defaults to :data:`DEFAULT_CHECKSUM_ALGORITHM`.
+
+        workers (Optional[int]):
+            The number of hashing threads. Defaults to the number of CPUs (at most 8).
+
+    Returns:
+        dict[Path, str]:
+            The checksum of each file. Files that could not be read are logged and left out.
+    """
+    checksums = {}
+
+    for image_path, checksum, error in iter_image_checksums(image_paths, algorithm=algorithm, workers=workers):
+        if error is not None:
+            MOD_LOGGER.warning(f'Could not hash {image_path}: {error}')
+        else:
+            checksums[image_path] = checksum
+
+    return checksums
+
+
+DEFAULT_MAX_BUFFERED_SIZE = 64 * 1024 * 1024
+"""
+int:
+    The size, in bytes, above which the scan pipeline streams a file from disk instead of buffering it in memory.
+"""
+
+
+class _BufferReader(io.RawIOBase):
+    """
+    A seekable, read-only file object over a memoryview, so decoders can read a buffer without copying it.
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self.__view = view
+        self.__position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self.__view[self.__position:self.__position + len(buffer)]
+        read = len(chunk)
+        memoryview(buffer).cast('B')[:read] = chunk
+        self.__position += read
+
+        return read
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.__position
+        elif whence == io.SEEK_END:
+            offset += len(self.__view)
+
+        self.__position = max(0, offset)
+
+        return self.__position
+
+    def tell(self) -> int:
+        return self.__position
+
+    def close(self):
+        self.__view = memoryview(b'')
+        super().close()
+
+
+def open_buffer(data: Union[bytes, bytearray, memoryview]) -> io.BufferedReader:
+    """
+    Get a seekable file object reading a buffer without copying it (unlike :class:`io.BytesIO`, which copies anything
+    but `bytes`).
+
+    Parameters:
+        data (Union[bytes, bytearray, memoryview]):
+            The buffer.
+
+    Returns:
+        io.BufferedReader:
+            The file object.
+    """
+    return io.BufferedReader(_BufferReader(memoryview(data).cast('B')))
+
+
+class ImageBuffer:
+    """
+    The bytes of one image file, read from disk once and shared by every consumer.
+
+    The file is hashed while it is read, so the checksum costs no extra I/O. Consumers get zero-copy, read-only views of
+    the bytes: :attr:`data` for uploads, and :meth:`open` for decoders such as Pillow (downscaling, thumbnails). The
+    buffer is reference-counted; call :meth:`acquire` for every additional consumer and :meth:`release` when each is
+    done, and the bytes are dropped when the last one is.
+
+    Properties:
+        checksum (str):
+            The checksum of the file.
+
+        data (memoryview):
+            A read-only view of the bytes of the file.
+
+        image_path (Path):
+            The path of the file.
+
+        released (bool):
+            Whether the bytes have been dropped.
+
+        size (int):
+            The size of the file, in bytes.
+
+    Methods:
+        acquire():
+            Register another consumer of the buffer.
+
+        open():
+            Get a file object reading the buffer.
+
+        read(image_path, algorithm=None, chunk_size=CHECKSUM_CHUNK_SIZE):
+            Read and hash a file into a new buffer.
+
+        release():
+            Unregister a consumer of the buffer.
+    """
+
+    def __init__(self, image_path: Union[str, Path], data: bytearray, checksum: Optional[str] = None):
+        """
+        The constructor for the ImageBuffer class. Use :meth:`read` to read a file.
+
+        Parameters:
+            image_path (Union[str, Path]):
+                The path of the file.
+
+            data (bytearray):
+                The bytes of the file.
+
+            checksum (Optional[str]):
+                The checksum of the file.
+        """
+        self.__image_path = Path(image_path)
+        self.__data = data
+        self.__view = memoryview(data).toreadonly()
+        self.__checksum = checksum
+        self.__size = len(data)
+        self.__references = 1
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def __len__(self):
+        return self.__size
+
+    def __repr__(self):
+        state = 'released' if self.released else f'{self.__references} references'
+
+        return f'ImageBuffer({str(self.__image_path)!r}, size={self.__size}, {state})'
+
+    @property
+    def checksum(self) -> Optional[str]:
+        """
+        Get the checksum of the file, computed while it was read.
+
+        Returns:
+            Optional[str]:
+                The checksum.
+        """
+        return self.__checksum
+
+    @property
+    def data(self) -> memoryview:
+        """
+        Get a read-only view of the bytes of the file.
+
+        Returns:
+            memoryview:
+                The bytes.
+
+        Raises:
+            ValueError:
+                If the buffer has been released.
+        """
+        if self.__view is None:
+            raise ValueError(f'The buffer of {self.__image_path} has been released!')
+
+        return self.__view
+
+    @property
+    def image_path(self) -> Path:
+        """
+        Get the path of the file.
+
+        Returns:
+            Path:
+                The path.
+        """
+        return self.__image_path
+
+    @property
+    def released(self) -> bool:
+        """
+        Get the released status of the buffer.
+
+        Returns:
+            bool:
+                True if the bytes have been dropped, False otherwise.
+        """
+        return self.__view is None
+
+    @property
+    def size(self) -> int:
+        """
+        Get the size of the file.
+
+        Returns:
+            int:
+                The size, in bytes.
+        """
+        return self.__size
+
+    @classmethod
+    def read(
+            cls,
+            image_path: Union[str, Path],
+            algorithm: Optional[str] = None,
+            chunk_size: int = CHECKSUM_CHUNK_SIZE
+    ) -> 'ImageBuffer':
+        """
+        Read a file into a new buffer, hashing it as it is read.
+
+        Parameters:
+            image_path (Union[str, Path]):
+                The path of the file.
+
+            algorithm (Optional[str]):
+                The checksum algorithm (see :func:`get_image_checksum`), or False not to hash the file. Defaults to
+                :data:`DEFAULT_CHECKSUM_ALGORITHM`.
+
+            chunk_size (int):
+                The number of bytes read (and hashed) at a time.
+
+        Returns:
+            ImageBuffer:
+                The buffer, with one reference.
+
+        Raises:
+            FileNotFoundError:
+                If the file does not exist.
+        """
+        hasher = _new_hasher(algorithm or DEFAULT_CHECKSUM_ALGORITHM) if algorithm is not False else None
+
+        with open(image_path, 'rb', buffering=0) as f:
+            data = bytearray(os.fstat(f.fileno()).st_size)
+            position = 0
+
+            with memoryview(data) as view:
+                while position < len(data):
+                    if not (read := f.readinto(view[position:position + chunk_size])):
+                        break
+
+                    if hasher is not None:
+                        hasher.update(view[position:position + read])
+
+                    position += read
+
+            # The file may have shrunk or grown while it was read.
+            del data[position:]
+
+            while extra := f.read(chunk_size):
+                if hasher is not None:
+                    hasher.update(extra)
+
+                data += extra
+
+        return cls(image_path, data, hasher.hexdigest() if hasher is not None else None)
+
+    def open(self) -> io.BufferedReader:
+        """
+        Get a file object reading the buffer, without copying it.
+
+        Returns:
+            io.BufferedReader:
+                The file object.
+        """
+        return open_buffer(self.data)
+
+    def acquire(self) -> 'ImageBuffer':
+        """
+        Register another consumer of the buffer.
+
+        Returns:
+            ImageBuffer:
+                This buffer.
+
+        Raises:
+            ValueError:
+                If the buffer has been released.
+        """
+        with self.__lock:
+            if self.__view is None:
+                raise ValueError(f'The buffer of {self.__image_path} has been released!')
+
+            self.__references += 1
+
+        return self
+
+    def release(self):
+        """
+        Unregister a consumer of the buffer, dropping the bytes once no consumer is left.
+
+        Views already handed out stay valid until they are garbage-collected.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            if self.__view is None:
+                return
+
+            self.__references -= 1
+
+            if self.__references <= 0:
+                self.__view = None
+                self.__data = None
+
+
+PERCEPTUAL_HASH_METHODS = ('dhash', 'phash')
+"""
+tuple[str]:
+    The perceptual hash methods supported by :func:`get_perceptual_hash`.
+"""
+
+DEFAULT_PERCEPTUAL_HASH_SIZE = 8
+"""
+int:
+    The default side of the perceptual hash grid; a hash has the square of it in bits (64).
+"""
+
+
+DEFAULT_SIMILARITY_RADIUS = 4
+"""
+int:
+    The default maximum Hamming distance between the perceptual hashes (of :data:`DEFAULT_PERCEPTUAL_HASH_SIZE`) of two
+    images for them to count as copies of the same picture. Resized and recompressed copies are usually within 2 bits;
+    unrelated images are about 32 bits apart.
+"""
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Perceptual hashing requires 'numpy'. Install it with `pip install pic-scanner[numpy]`.")
+
+
+@lru_cache(maxsize=8)
+def _dct_matrix(size: int):
+    """
+    Get the orthonormal DCT-II matrix of a size, so the 2-D DCT of a square is two matrix products.
+    """
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+
+    return matrix
+
+
+def _load_grayscale(image, width: int, height: int):
+    """
+    Decode an image to a grayscale array of the given size.
+
+    JPEG files not decoded yet are decoded at the smallest scale (1/2, 1/4 or 1/8) still larger than the target, which
+    skips most of the decoding work. (Drafting an image that is already loaded does nothing.)
+    """
+    opened = not isinstance(image, Image.Image)
+
+    if isinstance(image, ImageBuffer):
+        image = Image.open(image.open())
+    elif opened:
+        image = Image.open(image)
+
+    try:
+        image.draft('L', (width * 4, height * 4))
+
+        image = image.convert('L').resize((width, height), Image.Resampling.LANCZOS)
+
+        return np.asarray(image, dtype=np.float32)
+    finally:
+        if opened:
+            image.close()
+
+
+def _pack_bits(bits) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def get_perceptual_hash(
+        image: Union[str, Path, 'ImageBuffer', Image.Image],
+        method: str = 'dhash',
+        hash_size: int = DEFAULT_PERCEPTUAL_HASH_SIZE
+) -> int:
+    """
+    Get the perceptual hash of an image: a fingerprint of what it looks like, which barely changes when the image is
+    resized, recompressed or slightly edited. Compare two hashes with :func:`hamming_distance`.
+
+    Parameters:
+        image (Union[str, Path, ImageBuffer, Image.Image]):
+            The path of the image, its buffer, or the opened image (which, if it is a JPEG image that is not loaded
+            yet, is drafted to a reduced scale).
+
+        method (str):
+            'dhash' (difference hash: whether each pixel of a small grayscale copy is brighter than its right-hand
+            neighbour) or 'phash' (the signs of the low frequencies of a DCT of a 32x32 grayscale copy against their
+            median; slower, but more robust to changes of brightness and contrast).
+
+        hash_size (int):
+            The side of the hash grid.
+
+    Returns:
+        int:
+            The hash, of `hash_size ** 2` bits.
+
+    Raises:
+        ImportError:
+            If `numpy` is not installed.
+
+        ValueError:
+            If the method is not supported.
+
+        OSError:
+            If the image cannot be opened and identified.
+    """
+    _require_numpy()
+
+    if method == 'dhash':
+        pixels = _load_grayscale(image, hash_size + 1, hash_size)
+
+        return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+    if method == 'phash':
+        size = hash_size * 4
+        dct = _dct_matrix(size)
+        frequencies = (dct @ _load_grayscale(image, size, size) @ dct.T)[:hash_size, :hash_size]
+
+        return _pack_bits(frequencies > np.median(frequencies))
+
+    raise ValueError(f"Unsupported perceptual hash method: {method}! Choose one of {PERCEPTUAL_HASH_METHODS}.")
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """
+    Get the number of bits that differ between two perceptual hashes.
+
+    Parameters:
+        first (int):
+            The first hash.
+
+        second (int):
+            The second hash.
+
+    Returns:
+        int:
+            The distance: 0 for identical-looking images, and a few bits for a resized or recompressed copy.
+    """
+    return (first ^ second).bit_count()
@@ -0,0 +1,266 @@
+"""
+aggregates.py
+
+This module provides the aggregates of the concerns of a collection of scanned images, kept up to date as images are
+added and removed, so reading them does not walk the collection.
+
+Classes:
+    ConcernAggregates:
+        The per-label counts, score ranges and score histograms of the concerns of a collection.
+
+
+Since:
+    1.0
+"""
+import threading
+from typing import Callable, Iterable, Optional
+
+from pic_scanner.models import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.models.detection import LABELS, Detection
+
+
+__all__ = [
+    'SCORE_HISTOGRAM_BINS',
+    'ConcernAggregates',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('aggregates')
+
+
+SCORE_HISTOGRAM_BINS = 10
+"""
+int:
+    The number of equal-width bins of the score histograms, from 0 to 1.
+"""
+
+
+class ConcernAggregates:
+    """
+    The per-label counts, score ranges and score histograms of the concerns of a collection, and the number of images
+    with at least one concern.
+
+    Adding or removing the detections of an image costs a few operations per detection. Counts and histograms are
+    updated exactly; a score range is only recomputed, from the scores of the label, when the removed score was its
+    minimum or maximum and the range is read.
+
+    The aggregates are thread-safe, so a summary can be read while a scan adds images from another thread.
+
+    Properties:
+        concern_count (int):
+            The number of concerns.
+
+        image_count (int):
+            The number of images.
+
+        images_with_concerns (int):
+            The number of images with at least one concern.
+
+    Methods:
+        add(detections):
+            Add the detections of an image.
+
+        label_counts():
+            Get the number of concerns of each label.
+
+        remove(detections):
+            Remove the detections of an image.
+
+        summary():
+            Get every aggregate.
+    """
+
+    def __init__(self, scores_of: Callable[[str], Iterable[float]], bins: int = SCORE_HISTOGRAM_BINS):
+        """
+        The constructor for the ConcernAggregates class.
+
+        Parameters:
+            scores_of (Callable[[str], Iterable[float]]):
+                A function returning the current scores of a label, used to recompute its score range after a removal.
+
+            bins (int):
+                The number of bins of the score histograms.
+        """
+        self.__scores_of = scores_of
+        self.__bins = bins
+
+        self.__lock = threading.Lock()
+        self.__counts = {}
+        self.__histograms = {}
+        self.__ranges = {}
+        self.__stale_ranges = set()
+        self.__concern_count = 0
+        self.__image_count = 0
+        self.__images_with_concerns = 0
+
+    def __repr__(self):
+        return (
+            f'ConcernAggregates(images={self.__image_count}, images_with_concerns={self.__images_with_concerns}, '
+            f'concerns={self.__concern_count})'
+        )
+
+    @property
+    def concern_count(self) -> int:
+        """
+        Get the number of concerns.
+
+        Returns:
+            int:
+                The number of concerns.
+        """
+        return self.__concern_count
+
+    @property
+    def image_count(self) -> int:
+        """
+        Get the number of images.
+
+        Returns:
+            int:
+                The number of images.
+        """
+        return self.__image_count
+
+    @property
+    def images_with_concerns(self) -> int:
+        """
+        Get the number of images with at least one concern.
+
+        Returns:
+            int:
+                The number of images with at least one concern.
+        """
+        return self.__images_with_concerns
+
+    def __bin(self, score: float) -> int:
+        return min(max(int(score * self.__bins), 0), self.__bins - 1)
+
+    def add(self, detections: Iterable[Detection]):
+        """
+        Add the detections of an image.
+
+        Parameters:
+            detections (Iterable[Detection]):
+                The detections of the image.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            count = 0
+
+            for detection in detections:
+                name = LABELS[detection.label_id]
+                score = detection.score
+                count += 1
+
+                if name in self.__counts:
+                    self.__counts[name] += 1
+                else:
+                    self.__counts[name] = 1
+                    self.__histograms[name] = [0] * self.__bins
+
+                self.__histograms[name][self.__bin(score)] += 1
+
+                if name not in self.__stale_ranges:
+                    low, high = self.__ranges.get(name, (score, score))
+                    self.__ranges[name] = (min(low, score), max(high, score))
+
+            self.__image_count += 1
+            self.__concern_count += count
+            self.__images_with_concerns += count > 0
+
+    def remove(self, detections: Iterable[Detection]):
+        """
+        Remove the detections of an image.
+
+        Parameters:
+            detections (Iterable[Detection]):
+                The detections of the image, as they were added.
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            count = 0
+
+            for detection in detections:
+                name = LABELS[detection.label_id]
+                count += 1
+
+                self.__histograms[name][self.__bin(detection.score)] -= 1
+                self.__counts[name] -= 1
+
+                if not self.__counts[name]:
+                    del self.__counts[name]
+                    del self.__histograms[name]
+                    self.__ranges.pop(name, None)
+                    self.__stale_ranges.discard(name)
+                elif detection.score in self.__ranges.get(name, ()):
+                    del self.__ranges[name]
+                    self.__stale_ranges.add(name)
+
+            self.__image_count -= 1
+            self.__concern_count -= count
+            self.__images_with_concerns -= count > 0
+
+    def __range(self, name: str) -> Optional[tuple[float, float]]:
+        if name in self.__stale_ranges:
+            scores = list(self.__scores_of(name))
+
+            if scores:
+                self.__ranges[name] = (min(scores), max(scores))
+
+            self.__stale_ranges.discard(name)
+
+        return self.__ranges.get(name)
+
+    def label_counts(self) -> dict[str, int]:
+        """
+        Get the number of concerns of each label, skipping labels without concerns.
+
+        Returns:
+            dict[str, int]:
+                The number of concerns of each label, in the order of :data:`pic_scanner.models.detection.LABELS`.
+        """
+        with self.__lock:
+            return {name: self.__counts[name] for name in LABELS if name in self.__counts}
+
+    def summary(self) -> dict:
+        """
+        Get every aggregate.
+
+        Returns:
+            dict:
+                The number of images, of images with concerns and of concerns, and for each label with concerns (in the
+                order of :data:`pic_scanner.models.detection.LABELS`) its count, its minimum and maximum score and its
+                score histogram.
+
+        Examples:
+            >>> aggregates = ConcernAggregates(lambda name: ())
+            >>> aggregates.add([Detection(LABELS.index('FACE_FEMALE'), 0.85, (0, 0, 10, 10))])
+            >>> aggregates.summary()['labels']['FACE_FEMALE']['histogram']
+            [0, 0, 0, 0, 0, 0, 0, 0, 1, 0]
+        """
+        with self.__lock:
+            labels = {}
+
+            for name in LABELS:
+                if name not in self.__counts:
+                    continue
+
+                low, high = self.__range(name) or (None, None)
+
+                labels[name] = {
+                    'count': self.__counts[name],
+                    'min_score': low,
+                    'max_score': high,
+                    'histogram': list(self.__histograms[name]),
+                }
+
+            return {
+                'images': self.__image_count,
+                'images_with_concerns': self.__images_with_concerns,
+                'concerns': self.__concern_count,
+                'labels': labels,
+            }
@@ -0,0 +1,195 @@
+"""
+detection.py
+
+This module provides the compact record of a single detection, and the bulk parser that builds them from the results
+of the inference server.
+
+A :class:`pic_scanner.models.of_interest.concern.Concern` is a full :class:`pic_scanner.log_engine.Loggable` object:
+building one creates a child logger, validates every field and logs each of them. That is worth it for the handful of
+concerns a user looks at, not for the millions of detections of a large scan. A :class:`Detection` is a plain tuple
+holding an integer label ID (an index into :data:`LABELS`), a float score and a fixed box of four integers, built
+without validation or logging; :meth:`Detection.to_concern` creates the full object on demand.
+
+Classes:
+    Detection:
+        A compact record of a single detection.
+
+Functions:
+    parse_detections:
+        Build the detection records of a result in bulk.
+
+
+Since:
+    1.0
+"""
+from typing import NamedTuple
+
+from pic_scanner.common.constants import LABEL_DESCRIPTIONS
+from pic_scanner.models import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'LABELS',
+    'LABEL_IDS',
+    'Detection',
+    'parse_detections',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('detection')
+
+
+LABELS = tuple(LABEL_DESCRIPTIONS)
+"""
+tuple[str]:
+    The labels the inference server may return; the ID of a label is its index in this tuple.
+"""
+
+LABEL_IDS = {label: label_id for label_id, label in enumerate(LABELS)}
+"""
+dict[str, int]:
+    The ID of each label.
+"""
+
+_DESCRIPTIONS = tuple(LABEL_DESCRIPTIONS[label] for label in LABELS)
+
+_NO_BOX = (0, 0, 0, 0)
+
+
+def _box(values) -> tuple[int, int, int, int]:
+    """
+    Get a box as four integer coordinates, rounding fractional ones (such as those of a rescaled result); a missing or
+    short box is `_NO_BOX`.
+    """
+    if not values or len(values) < 4:
+        return _NO_BOX
+
+    return round(values[0]), round(values[1]), round(values[2]), round(values[3])
+
+
+class Detection(NamedTuple):
+    """
+    A compact record of a single detection: a label ID, a score and a box of four integers, as returned by the
+    inference server.
+
+    The record mirrors the read-only interface of :class:`pic_scanner.models.of_interest.concern.Concern` (`name`,
+    `score`, `location`, `description`, `score_percentage`).
+    """
+    label_id: int
+    score: float
+    box: tuple[int, int, int, int]
+
+    def __str__(self):
+        return f'{self.name} ({self.score}) at {list(self.box)}'
+
+    @property
+    def description(self) -> str:
+        """
+        Get the description of the label.
+
+        Returns:
+            str:
+                The description of the label.
+        """
+        return _DESCRIPTIONS[self.label_id]
+
+    @property
+    def location(self) -> list[int]:
+        """
+        Get the box of the detection, as :attr:`Concern.location` holds it.
+
+        Returns:
+            list[int]:
+                The box of the detection.
+        """
+        return list(self.box)
+
+    @property
+    def name(self) -> str:
+        """
+        Get the label of the detection.
+
+        Returns:
+            str:
+                The label of the detection.
+        """
+        return LABELS[self.label_id]
+
+    @property
+    def score_percentage(self) -> float:
+        """
+        Get the score of the detection as a percentage.
+
+        Returns:
+            float:
+                The score of the detection as a percentage.
+        """
+        return self.score * 100
+
+    @classmethod
+    def from_concern(cls, concern) -> 'Detection':
+        """
+        Get the record of a concern.
+
+        Parameters:
+            concern (Concern):
+                The concern.
+
+        Returns:
+            Detection:
+                The record of the concern.
+        """
+        return cls(LABEL_IDS[concern.name.upper()], concern.score, _box(concern.location))
+
+    def to_concern(self):
+        """
+        Create the full concern object of the detection.
+
+        Returns:
+            Concern:
+                The concern.
+        """
+        from pic_scanner.models.of_interest.concern import Concern
+
+        return Concern(self.name, self.score, list(self.box), self.description)
+
+
+def parse_detections(result: dict) -> list[Detection]:
+    """
+    Build the detection records of a result in bulk, without validating or logging each of them.
+
+    Detections with a label the scanner does not know are skipped.
+
+    Parameters:
+        result (dict):
+            The result of the inference server for one image (`{'prediction': [[...]]}`).
+
+    Returns:
+        list[Detection]:
+            The detections, in the order the server returned them.
+
+    Examples:
+        >>> parse_detections({'prediction': [[{'class': 'FACE_FEMALE', 'score': 0.8, 'box': [1, 2, 30, 40]}]]})
+        [Detection(label_id=1, score=0.8, box=(1, 2, 30, 40))]
+    """
+    detections = []
+    label_ids = LABEL_IDS
+    skipped = 0
+
+    for detection_list in result.get('prediction', ()):
+        for detection in detection_list:
+            label_id = label_ids.get(detection.get('class'))
+
+            if label_id is None:
+                label_id = label_ids.get(str(detection.get('class')).upper())
+
+                if label_id is None:
+                    skipped += 1
+                    continue
+
+            detections.append(Detection(label_id, float(detection.get('score') or 0.0), _box(detection.get('box'))))
+
+    if skipped:
+        MOD_LOGGER.debug(f'Skipped {skipped} detections with unknown labels.')
+
+    return detections
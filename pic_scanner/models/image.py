@@ -10,11 +10,21 @@ from inspyre_toolbox.syntactic_sweets.properties.decorators import validate_type
 from shutil import copy as copy_file
 
 from ..common.constants import LABEL_DESCRIPTIONS
+from .aggregates import ConcernAggregates
+from .detection import Detection, parse_detections
 from .of_interest import OfInterest
 from .of_interest.concern import Concern
+from .of_interest.policy import CONCERNING
+from .store import DetectionStore
 from ..helpers.filesystem import provision_path
+from ..helpers.bk_tree import BKTree
 from ..helpers.filesystem.classes import FileCollection
-from ..helpers.images import get_image_checksum
+from ..helpers.images import (
+    DEFAULT_PERCEPTUAL_HASH_SIZE,
+    DEFAULT_SIMILARITY_RADIUS,
+    get_image_checksum,
+    get_perceptual_hash,
+)
 from ..helpers.locks import flag_lock
 
 from pic_scanner.common.types import ScannedImageCollection as ScannedImageCollectionMeta
@@ -64,13 +74,25 @@ class ScannedImage:
         concern_names (list):
             The names of the concerns associated with the image.
 
+        detections (list):
+            The compact records of the concerns associated with the image.
+
+        known_checksum (str):
+            The checksum of the image, if it is already known, without computing it.
+
     Methods:
         add_concern(concern):
             Add a concern to the scanned image.
 
+        add_detections(detections):
+            Add concerns to the scanned image as compact records.
+
         backup(backup_dir, backup_name, **kwargs):
             Backup the image.
 
+        copy_for(image_path):
+            Create the scanned image of an identical copy of the image.
+
         create_concerns(result):
             Create concerns from a result dictionary.
 
@@ -80,6 +102,9 @@ class ScannedImage:
         get_concerns_by_name(name):
             Get the concerns associated with the image by name.
 
+        get_perceptual_hash(method, hash_size):
+            Get the perceptual hash of the image.
+
         has_concern(name, case_sensitive):
             Check if the image has a concern.
 
@@ -99,19 +124,24 @@ class ScannedImage:
             image_path: Union[str, Path],
             auto_checksum: bool = True,
             backup_path: Union[str, Path] = None,
+            checksum: str = None,
             ):
         """
         The constructor for ScannedImage class.
 
         Parameters:
             image_path (str, Path): The path of the image.
+            checksum (str, optional): The checksum of the image, if it is already known.
         """
         self._getting_checksum = False
         self.__auto_checksum = None
         self.__backup_path = None
         self.__backed_up = False
-        self.__checksum = None
-        self.__concerns = []
+        self.__checksum = checksum
+        # The concerns are kept as compact records; the full Concern objects are created (and kept) on demand.
+        self.__detections = []
+        self.__concerns = {}
+        self.__perceptual_hashes = {}
         self.__point_of_interests = []
 
         self.auto_checksum = auto_checksum
@@ -193,7 +223,7 @@ class ScannedImage:
             list:
                 The concerns associated with the image.
         """
-        return self.__concerns
+        return [self.__concern(number) for number in range(len(self.__detections))]
 
     @property
     def concern_count(self):
@@ -204,7 +234,7 @@ class ScannedImage:
             int:
                 The number of concerns associated with the image.
         """
-        return len(self.__concerns)
+        return len(self.__detections)
 
     @property
     def concern_names(self):
@@ -214,7 +244,18 @@ class ScannedImage:
         Returns:
             list:
         """
-        return [concern.name for concern in self.concerns]
+        return [detection.name for detection in self.__detections]
+
+    @property
+    def detections(self):
+        """
+        Get the compact records of the concerns associated with the image, without creating the full concern objects.
+
+        Returns:
+            list[Detection]:
+                The detections of the image.
+        """
+        return self.__detections
 
     @property
     def default_backup_path(self):
@@ -238,6 +279,17 @@ class ScannedImage:
         """
         return self._getting_checksum
 
+    @property
+    def known_checksum(self):
+        """
+        Get the checksum of the image if it is already known, without computing it.
+
+        Returns:
+            str:
+                The checksum of the image, or None if it was not computed yet.
+        """
+        return self.__checksum
+
     @property
     def point_of_interests(self):
         """
@@ -263,7 +315,22 @@ class ScannedImage:
         if not isinstance(concern, Concern):
             raise ValueError(f"The concern must be an instance of the Concern class, not {type(concern)}!"
                              f"")
-        self.__concerns.append(concern)
+        self.__concerns[len(self.__detections)] = concern
+        self.__detections.append(Detection.from_concern(concern))
+
+    def add_detections(self, detections):
+        """
+        Add concerns to the scanned image as compact records (see
+        :func:`pic_scanner.models.detection.parse_detections`).
+
+        Parameters:
+            detections (Iterable[Detection]):
+                The detections to add.
+
+        Returns:
+            None
+        """
+        self.__detections.extend(detections)
 
     def add_point_of_interest(self, point_of_interest):
         """
@@ -309,10 +376,35 @@ class ScannedImage:
 
         return backup_path
 
+    def copy_for(self, image_path):
+        """
+        Create the scanned image of an identical copy of the image, without reading or scanning the copy.
+
+        Parameters:
+            image_path (str, Path):
+                The path of the copy.
+
+        Returns:
+            ScannedImage:
+                The scanned image of the copy, with the checksum (if known) and the concerns of this image.
+        """
+        copy = ScannedImage(image_path, auto_checksum=self.auto_checksum, checksum=self.__checksum)
+        copy.__detections = list(self.__detections)
+        copy.__concerns = dict(self.__concerns)
+        copy.__perceptual_hashes = dict(self.__perceptual_hashes)
+
+        for point_of_interest in self.__point_of_interests:
+            copy.add_point_of_interest(point_of_interest)
+
+        return copy
+
     def create_concerns(self, result):
         """
         Create concerns from a result dictionary.
 
+        The detections are parsed in bulk into compact records; the full concern objects are only created when
+        :attr:`concerns` is read. Detections with an unknown label are skipped.
+
         Parameters:
             result (dict):
                 The result dictionary.
@@ -320,17 +412,7 @@ class ScannedImage:
         Returns:
             None
         """
-        result = result['result']
-
-        detections = result.get('prediction', [])
-
-        for detection_list in detections:
-            for detection in detection_list:
-                class_name = detection.get('class')
-                score = detection.get('score')
-                location = detection.get('box')
-                if description := get_description(class_name):
-                    self.add_concern(Concern(class_name, score, location, description))
+        self.add_detections(parse_detections(result['result']))
 
     def get_checksum(self):
         """
@@ -372,17 +454,43 @@ class ScannedImage:
             list:
                 The concerns associated with the image by name.
         """
-        concerns = []
-        for concern in self.__concerns:
+        if not case_sensitive:
+            name = name.upper()
 
-            if not case_sensitive:
-                name = name.upper()
-                if concern.name.upper() == name:
-                    concerns.append(concern)
-            elif concern.name == name:
-                concerns.append(concern)
+        return [
+            self.__concern(number)
+            for number, detection in enumerate(self.__detections)
+            if (detection.name if case_sensitive else detection.name.upper()) == name
+        ]
 
-        return concerns
+    def __concern(self, number):
+        if (concern := self.__concerns.get(number)) is None:
+            concern = self.__concerns[number] = self.__detections[number].to_concern()
+
+        return concern
+
+    def get_perceptual_hash(self, method='dhash', hash_size=DEFAULT_PERCEPTUAL_HASH_SIZE):
+        """
+        Get the perceptual hash of the image (computed once for each method and size).
+
+        Parameters:
+            method (str):
+                The perceptual hash method, 'dhash' or 'phash' (see
+                :func:`pic_scanner.helpers.images.get_perceptual_hash`).
+
+            hash_size (int):
+                The side of the hash grid.
+
+        Returns:
+            int:
+                The perceptual hash of the image.
+        """
+        key = (method, hash_size)
+
+        if key not in self.__perceptual_hashes:
+            self.__perceptual_hashes[key] = get_perceptual_hash(self.image_path, method, hash_size)
+
+        return self.__perceptual_hashes[key]
 
     def has_concern(self, name, case_sensitive=False):
         """
@@ -459,19 +567,23 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         concern_count (int):
             The number of concerns associated with the images in the collection.
 
+        detection_store (DetectionStore):
+            The columnar store of the detections of the images in the collection.
+
         image_count (int):
             The number of images in the collection.
 
         image_paths (list):
             The paths of the images in the collection.
-    """
 
-    RestrictedSetter(
-        'images',
-        allowed_types=list,
-        restrict_setter=True,
-        initial=[]
-    )
+        images_with_concerns (int):
+            The number of images in the collection with at least one concern.
+
+    Note:
+        The path and the detections of an image are indexed when it is added to the collection; concerns added to an
+        image afterwards, or a path changed by moving it other than with :meth:`move_all_with_concern`, are not seen by
+        the queries of the collection.
+    """
 
     def __init__(self):
         """
@@ -481,7 +593,35 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         self.add_image = self.__add_image
         self.finalize = self.__finalize
 
-        self.images = []
+        self.__similarity_trees = {}
+        self.__store = DetectionStore()
+        self.__store_images = []
+
+        # The images, in the order they were added, mapped to their index in the store; the list of them is built on
+        # demand, so removing an image does not shift a list.
+        self.__images = {}
+        self.__image_list = []
+
+        self.__by_path = {}
+        self.__by_checksum = {}
+        self.__by_label = {}
+        self.__unhashed = {}
+
+        self.__aggregates = ConcernAggregates(self.__scores_of)
+
+    @property
+    def images(self):
+        """
+        Get the images in the collection.
+
+        Returns:
+            list:
+                The images in the collection, in the order they were added. The list must not be modified.
+        """
+        if self.__image_list is None:
+            self.__image_list = list(self.__images)
+
+        return self.__image_list
 
     def __add_image(self, image: ScannedImage):
         """
@@ -497,7 +637,29 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         if not isinstance(image, ScannedImage):
             raise ValueError(f"The image must be an instance of the ScannedImage class, not {type(image)}!")
 
-        self.images.append(image)
+        if image in self.__images:
+            raise ValueError(f"The image {image.image_path} is already in the collection!")
+
+        self.__images[image] = self.__store.add(image.image_path, image.detections)
+        self.__store_images.append(image)
+
+        if self.__image_list is not None:
+            self.__image_list.append(image)
+
+        self.__by_path[image.image_path] = image
+
+        if (checksum := image.known_checksum) is not None:
+            self.__by_checksum.setdefault(checksum, {})[image] = None
+        else:
+            self.__unhashed[image] = None
+
+        for detection in image.detections:
+            self.__by_label.setdefault(detection.name, {})[image] = None
+
+        self.__aggregates.add(image.detections)
+
+        for (method, hash_size), tree in self.__similarity_trees.items():
+            self.__add_to_similarity_tree(tree, image, method, hash_size)
 
     def remove_image(self, image):
         """
@@ -510,11 +672,44 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         Returns:
             None
         """
+        if (index := self.__images.pop(image, None)) is None:
+            raise ValueError(f"The image {image} is not in the collection!")
 
-        if image in self.images:
-            self.images.remove(image)
+        self.__image_list = None
+        self.__store.remove(index)
+        self.__store_images[index] = None
+
+        if self.__by_path.get(image.image_path) is image:
+            del self.__by_path[image.image_path]
+
+        if image in self.__unhashed:
+            del self.__unhashed[image]
         else:
-            raise ValueError(f"The image {image} is not in the collection!")
+            self.__discard(self.__by_checksum, image.known_checksum, image)
+
+        for name in {detection.name for detection in image.detections}:
+            self.__discard(self.__by_label, name, image)
+
+        self.__aggregates.remove(image.detections)
+
+        # A BK-tree cannot drop a hash; it is rebuilt on the next query.
+        self.__similarity_trees.clear()
+
+    def __scores_of(self, name):
+        return [
+            detection.score
+            for image in list(self.__by_label.get(name, ()))
+            for detection in image.detections
+            if detection.name == name
+        ]
+
+    @staticmethod
+    def __discard(index, key, image):
+        if (images := index.get(key)) is not None:
+            images.pop(image, None)
+
+            if not images:
+                del index[key]
 
     def get_all_with_concern(self, concern_name: str, case_sensitive=False, score_threshold=None):
         """
@@ -543,24 +738,97 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         if not case_sensitive:
             concern_name = concern_name.upper()
 
-        if concern_name not in self.concern_names:
+        if concern_name not in self.__by_label:
             warn(f"The concern {concern_name} is not in the collection!")
+        elif score_threshold:
+            return self.filter_images(concern_name, min_score=score_threshold)
         else:
-            images = []
-
-            for image in self.images:
-                if image.has_concern(concern_name, case_sensitive):
-                    if score_threshold:
-                        images.extend(
-                            image
-                            for concern in image.get_concerns_by_name(
-                                concern_name, case_sensitive
-                            )
-                            if concern.score >= score_threshold
-                        )
-                    else:
-                        images.append(image)
-            return images
+            return list(self.__by_label[concern_name])
+
+    def filter_images(self, labels=None, min_score=None, min_area=None, policy=None, level=CONCERNING):
+        """
+        Get the images with at least one concern matching every given condition, using vectorized queries over the
+        columnar detection store (see :meth:`pic_scanner.models.store.DetectionStore.filter`).
+
+        Parameters:
+            labels (Union[str, Iterable[str]], optional):
+                The name(s) of the concern, in any case. Defaults to any concern.
+
+            min_score (float, optional):
+                The minimum score of the concern, from 0 to 1.
+
+            min_area (int, optional):
+                The minimum area of the box of the concern, in pixels.
+
+            policy (InterestPolicy, optional):
+                The interest policy classifying the concern, in the same vectorized pass.
+
+            level (int):
+                The interest level the policy must give the concern; concerning by default.
+
+        Returns:
+            list:
+                The matching images, in the order they were added to the collection.
+        """
+        indices = self.__store.filter(labels, min_score, min_area, policy, level)
+
+        return [self.__store_images[index] for index in indices]
+
+    def find_similar(
+            self,
+            image,
+            radius=DEFAULT_SIMILARITY_RADIUS,
+            method='dhash',
+            hash_size=DEFAULT_PERCEPTUAL_HASH_SIZE
+    ):
+        """
+        Find the images of the collection that look like an image: resized, recompressed or slightly edited copies.
+
+        The perceptual hashes of the images are computed on the first query (for each method and size) and kept in a
+        BK-tree, so later queries only compare the hash of the image to a fraction of them.
+
+        Parameters:
+            image (ScannedImage, str, Path):
+                An image of the collection, or the path of any image.
+
+            radius (int):
+                The maximum Hamming distance between the perceptual hashes of two similar images.
+
+            method (str):
+                The perceptual hash method, 'dhash' or 'phash'.
+
+            hash_size (int):
+                The side of the perceptual hash grid.
+
+        Returns:
+            list[tuple[int, ScannedImage]]:
+                The distance and the scanned image of every similar image (other than the image itself), closest first.
+        """
+        if (tree := self.__similarity_trees.get((method, hash_size))) is None:
+            tree = self.__similarity_trees[(method, hash_size)] = BKTree()
+
+            for scanned_image in self.images:
+                self.__add_to_similarity_tree(tree, scanned_image, method, hash_size)
+
+        if isinstance(image, ScannedImage):
+            image_path = image.image_path
+            hash_value = image.get_perceptual_hash(method, hash_size)
+        else:
+            image_path = Path(image)
+            hash_value = get_perceptual_hash(image_path, method, hash_size)
+
+        return [
+            (distance, match)
+            for distance, _, match in tree.find(hash_value, radius)
+            if match.image_path != image_path
+        ]
+
+    @staticmethod
+    def __add_to_similarity_tree(tree, image, method, hash_size):
+        try:
+            tree.add(image.get_perceptual_hash(method, hash_size), image)
+        except OSError as e:
+            warn(f"Could not compute the perceptual hash of {image.image_path}: {e}")
 
     def get_image(self, image_path):
         """
@@ -574,10 +842,34 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
             ScannedImage:
                 The scanned image.
         """
-        for image in self.images:
-            if image.image_path == image_path:
-                return image
-        raise ValueError(f"The image {image_path} is not in the collection!")
+        if (image := self.__by_path.get(Path(image_path))) is None:
+            raise ValueError(f"The image {image_path} is not in the collection!")
+
+        return image
+
+    def get_images_by_checksum(self, checksum):
+        """
+        Get the images of the collection with a checksum: the copies of the same file.
+
+        The checksums of images added without one are computed (once) on the first call.
+
+        Parameters:
+            checksum (str):
+                The checksum.
+
+        Returns:
+            list:
+                The images with the checksum, in the order they were added to the collection.
+        """
+        while self.__unhashed:
+            image = next(iter(self.__unhashed))
+
+            if (image_checksum := image.checksum) is not None:
+                self.__by_checksum.setdefault(image_checksum, {})[image] = None
+
+            del self.__unhashed[image]
+
+        return list(self.__by_checksum.get(checksum, ()))
 
     def get_concerns(self):
         """
@@ -587,11 +879,11 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
             list:
                 The concerns associated with the images in the collection.
         """
-        concerns = set()
+        concerns = []
         for image in self.images:
-            for concern in image.concerns:
-                concerns.add(concern)
-        return list(concerns)
+            if image.concern_count:
+                concerns.extend(image.concerns)
+        return concerns
 
     def get_concerns_by_name(self, name):
         """
@@ -606,10 +898,8 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
                 The concerns associated with the images in the collection by name.
         """
         concerns = []
-        for image in self.images:
-            for concern in image.__concerns:
-                if concern.name == name:
-                    concerns.append(concern)
+        for image in self.__by_label.get(name, ()):
+            concerns.extend(image.get_concerns_by_name(name))
         return concerns
 
     def get_concerns_by_score(self, score):
@@ -626,7 +916,7 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         """
         concerns = []
         for image in self.images:
-            for concern in image.__concerns:
+            for concern in image.concerns:
                 if concern.score == score:
                     concerns.append(concern)
         return concerns
@@ -639,12 +929,7 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
             list:
                 The names of the concerns associated with the images in the collection.
         """
-        names = set()
-        for image in self.images:
-            for concern in image.concerns:
-                names.add(concern.name)
-
-        return list(names)
+        return list(self.__aggregates.label_counts())
 
     def move_all_with_concern(self, new_dir, concern_name):
         """
@@ -660,9 +945,14 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         Returns:
             None
         """
-        for image in self.images:
-            if concern_name in image.concern_names:
-                image.move(new_dir)
+        for image in list(self.__by_label.get(concern_name, ())):
+            old_path = image.image_path
+            image.move(new_dir)
+
+            if self.__by_path.get(old_path) is image:
+                del self.__by_path[old_path]
+
+            self.__by_path[image.image_path] = image
 
     @property
     def concern_names(self):
@@ -695,7 +985,18 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
             int:
                 The number of concerns associated with the images in the collection.
         """
-        return len(self.concerns)
+        return self.__aggregates.concern_count
+
+    @property
+    def detection_store(self):
+        """
+        Get the columnar store of the detections of the images in the collection.
+
+        Returns:
+            DetectionStore:
+                The detection store; its image indices are the positions of the images in the order they were added.
+        """
+        return self.__store
 
     @property
     def image_count(self):
@@ -706,7 +1007,7 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
             int:
                 The number of images in the collection.
         """
-        return len(self.images)
+        return len(self.__images)
 
     @property
     def image_paths(self):
@@ -719,6 +1020,29 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
         """
         return [image.image_path for image in self.images]
 
+    @property
+    def images_with_concerns(self):
+        """
+        Get the number of images in the collection with at least one concern.
+
+        Returns:
+            int:
+                The number of images with at least one concern.
+        """
+        return self.__aggregates.images_with_concerns
+
+    def summary(self):
+        """
+        Get the aggregates of the collection, kept up to date as images are added and removed, so it is cheap enough to
+        poll during a scan (see :meth:`pic_scanner.models.aggregates.ConcernAggregates.summary`).
+
+        Returns:
+            dict:
+                The number of images, of images with concerns and of concerns, and the count, score range and score
+                histogram of each label.
+        """
+        return self.__aggregates.summary()
+
     def __finalize(self):
         """
         Finalize the collection.
@@ -732,7 +1056,7 @@ class ScannedImageCollection(ScannedImageCollectionMeta):
 
 
 
-def create_scanned_image(result_struct):
+def create_scanned_image(result_struct, checksum=None):
     """
     Create a scanned image from a result dictionary.
 
@@ -740,11 +1064,14 @@ def create_scanned_image(result_struct):
         result_struct (dict):
             The result dictionary.
 
+        checksum (str, optional):
+            The checksum of the image, if it is already known.
+
     Returns:
         ScannedImage:
             The scanned image.
     """
     image_path = result_struct['image_path']
-    scanned_image = ScannedImage(image_path)
+    scanned_image = ScannedImage(image_path, checksum=checksum)
     scanned_image.create_concerns(result_struct)
     return scanned_image
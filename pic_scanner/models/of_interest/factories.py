@@ -5,6 +5,7 @@ from pic_scanner.common.constants import LABEL_DESCRIPTIONS, VALID_LABELS
 from pic_scanner.models.of_interest import OfInterest
 from pic_scanner.models.of_interest.concern import Concern
 from pic_scanner.models.of_interest.non_interesting import NonInteresting
+from pic_scanner.models.of_interest.policy import InterestPolicy
 
 
 class InterestFactory:
@@ -18,13 +19,13 @@ class InterestFactory:
         points_of_interest:
             A list of labels that are points of interest. All labels are points of interest until they are marked as
             concerning.
-    """
 
-    concerns = []
-    points_of_interest = []
-    non_interesting = []
-    for label in VALID_LABELS:
-        points_of_interest.append(label)
+        non_interesting:
+            A list of labels that are not interesting.
+
+    Each factory has its own lists. To share a configuration, or to classify many detections, compile it into an
+    immutable :class:`pic_scanner.models.of_interest.policy.InterestPolicy` with :meth:`compile`.
+    """
 
     def __init__(self, all_non_interesting=False):
         """
@@ -37,6 +38,10 @@ class InterestFactory:
         Returns:
             None
         """
+        self.concerns = []
+        self.points_of_interest = list(LABEL_DESCRIPTIONS)
+        self.non_interesting = []
+
         if all_non_interesting:
             for label in VALID_LABELS:
                 self.make_non_interesting(label)
@@ -114,6 +119,16 @@ class InterestFactory:
             self.concerns.remove(name)
             self.points_of_interest.append(name)
 
+    def compile(self):
+        """
+        Compile the labels of the factory into an immutable interest policy.
+
+        Returns:
+            InterestPolicy:
+                The policy.
+        """
+        return InterestPolicy.from_factory(self)
+
     def get_concerns(self):
         """
         Get the list of concerns.
@@ -4,7 +4,7 @@ from pic_scanner.models.of_interest import MOD_LOGGER as PARENT_LOGGER, Loggable
 MOD_LOGGER = PARENT_LOGGER.get_child('non_interesting')
 
 
-class NonInteresting(Loggable, OfInterest):
+class NonInteresting(OfInterest):
     """
     A class detailing a non-interesting label found on an image.
 
@@ -0,0 +1,411 @@
+"""
+policy.py
+
+This module provides the compiled, immutable interest policy: the interest level of each label, and optional per-label
+score thresholds.
+
+Unlike :class:`pic_scanner.models.of_interest.factories.InterestFactory`, which keeps its labels in lists and changes
+them in place, an :class:`InterestPolicy` is compiled into lookup tables indexed by label ID (see
+:data:`pic_scanner.models.detection.LABELS`) and never changes: every change (:meth:`InterestPolicy.with_level`,
+:meth:`InterestPolicy.with_threshold`, the presets of :mod:`pic_scanner.models.presets`) returns a new policy.
+Classifying one detection is two table lookups, and :meth:`InterestPolicy.apply` classifies a whole column of
+detections (see :class:`pic_scanner.models.store.DetectionStore`) in one vectorized pass when the optional `numpy`
+dependency is installed.
+
+Classes:
+    InterestPolicy:
+        An immutable mapping of labels to interest levels, with optional per-label score thresholds.
+
+
+Since:
+    1.0
+"""
+from array import array
+from typing import Iterable, Mapping, Optional, Union
+
+from pic_scanner.models.detection import LABELS, LABEL_IDS, Detection
+from pic_scanner.models.of_interest import MOD_LOGGER as PARENT_LOGGER
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+__all__ = [
+    'CONCERNING',
+    'INTEREST_LEVELS',
+    'InterestPolicy',
+    'NON_INTERESTING',
+    'POINT_OF_INTEREST',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('policy')
+
+
+INTEREST_LEVELS = ('point_of_interest', 'concerning', 'non_interesting')
+"""
+tuple[str]:
+    The names of the interest levels, as :meth:`InterestFactory.mark` takes them; the ID of a level is its index.
+"""
+
+POINT_OF_INTEREST, CONCERNING, NON_INTERESTING = range(len(INTEREST_LEVELS))
+
+
+def _level_id(level: Union[str, int]) -> int:
+    if isinstance(level, int):
+        if not 0 <= level < len(INTEREST_LEVELS):
+            raise ValueError(f"Invalid interest level: {level}!")
+
+        return level
+
+    if level not in INTEREST_LEVELS:
+        raise ValueError(f"Invalid interest level: {level}!")
+
+    return INTEREST_LEVELS.index(level)
+
+
+def _label_id(label: Union[str, int]) -> int:
+    if isinstance(label, int):
+        return label
+
+    try:
+        return LABEL_IDS[label.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown label: {label}!") from None
+
+
+class InterestPolicy:
+    """
+    An immutable mapping of labels to interest levels, with optional per-label score thresholds.
+
+    A detection scoring below the threshold of its label is non-interesting, whatever the level of its label.
+
+    Properties:
+        concerns (tuple[str]):
+            The concerning labels.
+
+        non_interesting (tuple[str]):
+            The non-interesting labels.
+
+        points_of_interest (tuple[str]):
+            The labels that are points of interest.
+
+        thresholds (dict[str, float]):
+            The score threshold of each label that has one.
+
+    Methods:
+        apply(labels, scores=None):
+            Get the interest level of every detection of a column.
+
+        classify(label, score=None):
+            Get the interest level of a detection.
+
+        compose(*presets):
+            Get the policy the presets make of this one.
+
+        from_factory(factory):
+            Compile the labels of an interest factory.
+
+        level_of(label):
+            Get the name of the interest level of a label.
+
+        with_level(labels, level):
+            Get a copy of the policy with labels at another level.
+
+        with_threshold(labels, threshold):
+            Get a copy of the policy with another score threshold for labels.
+    """
+
+    def __init__(
+            self,
+            levels:     Optional[Mapping[Union[str, int], Union[str, int]]] = None,
+            thresholds: Optional[Mapping[Union[str, int], float]] = None
+    ):
+        """
+        The constructor for the InterestPolicy class.
+
+        Parameters:
+            levels (Optional[Mapping[Union[str, int], Union[str, int]]]):
+                The interest level of labels, by name or ID. Labels not given are points of interest.
+
+            thresholds (Optional[Mapping[Union[str, int], float]]):
+                The minimum score of a detection of labels for it not to be non-interesting. Labels not given have
+                none.
+
+        Raises:
+            ValueError:
+                If a label or an interest level is unknown.
+        """
+        level_table = bytearray(len(LABELS))
+        threshold_table = [0.0] * len(LABELS)
+
+        for label, level in (levels or {}).items():
+            level_table[_label_id(label)] = _level_id(level)
+
+        for label, threshold in (thresholds or {}).items():
+            threshold_table[_label_id(label)] = float(threshold)
+
+        self.__levels = bytes(level_table)
+        # Rounded to float32, like the scores of a detection store, so a score equal to its threshold is classified
+        # the same way with or without NumPy.
+        self.__thresholds = tuple(array('f', threshold_table))
+
+        if np is not None:
+            self.__level_array = np.frombuffer(self.__levels, dtype=np.uint8)
+            self.__threshold_array = np.array(self.__thresholds, dtype=np.float32)
+            self.__threshold_array.flags.writeable = False
+
+    def __eq__(self, other):
+        if not isinstance(other, InterestPolicy):
+            return NotImplemented
+
+        return (self.__levels, self.__thresholds) == (other.__levels, other.__thresholds)
+
+    def __hash__(self):
+        return hash((self.__levels, self.__thresholds))
+
+    def __repr__(self):
+        return (
+            f'InterestPolicy(concerns={len(self.concerns)}, non_interesting={len(self.non_interesting)}, '
+            f'thresholds={len(self.thresholds)})'
+        )
+
+    def __labels_at(self, level: int) -> tuple[str, ...]:
+        return tuple(LABELS[label_id] for label_id, label_level in enumerate(self.__levels) if label_level == level)
+
+    @property
+    def concerns(self) -> tuple[str, ...]:
+        """
+        Get the concerning labels.
+
+        Returns:
+            tuple[str]:
+                The concerning labels.
+        """
+        return self.__labels_at(CONCERNING)
+
+    @property
+    def non_interesting(self) -> tuple[str, ...]:
+        """
+        Get the non-interesting labels.
+
+        Returns:
+            tuple[str]:
+                The non-interesting labels.
+        """
+        return self.__labels_at(NON_INTERESTING)
+
+    @property
+    def points_of_interest(self) -> tuple[str, ...]:
+        """
+        Get the labels that are points of interest.
+
+        Returns:
+            tuple[str]:
+                The labels that are points of interest.
+        """
+        return self.__labels_at(POINT_OF_INTEREST)
+
+    @property
+    def thresholds(self) -> dict[str, float]:
+        """
+        Get the score threshold of each label that has one.
+
+        Returns:
+            dict[str, float]:
+                The score threshold of each label that has one, rounded to float32 (as the scores are stored).
+        """
+        return {LABELS[label_id]: threshold for label_id, threshold in enumerate(self.__thresholds) if threshold}
+
+    @classmethod
+    def from_factory(cls, factory) -> 'InterestPolicy':
+        """
+        Compile the labels of an interest factory into a policy.
+
+        Parameters:
+            factory (InterestFactory):
+                The interest factory.
+
+        Returns:
+            InterestPolicy:
+                The policy.
+        """
+        levels = {name: CONCERNING for name in factory.concerns}
+        levels.update((name, NON_INTERESTING) for name in factory.non_interesting)
+
+        return cls(levels)
+
+    def __copy_with(self, levels=None, thresholds=None) -> 'InterestPolicy':
+        policy = InterestPolicy(
+            dict(enumerate(levels if levels is not None else self.__levels)),
+            dict(enumerate(thresholds if thresholds is not None else self.__thresholds))
+        )
+        MOD_LOGGER.debug(f'Compiled {policy!r}.')
+
+        return policy
+
+    def with_level(
+            self,
+            labels: Union[str, int, Iterable[Union[str, int]]],
+            level:  Union[str, int]
+    ) -> 'InterestPolicy':
+        """
+        Get a copy of the policy with labels at another interest level.
+
+        Parameters:
+            labels (Union[str, int, Iterable[Union[str, int]]]):
+                The label(s), by name (in any case) or ID.
+
+            level (Union[str, int]):
+                The interest level, by name (see :data:`INTEREST_LEVELS`) or ID.
+
+        Returns:
+            InterestPolicy:
+                The new policy.
+
+        Raises:
+            ValueError:
+                If a label or the interest level is unknown.
+
+        Examples:
+            >>> policy = InterestPolicy().with_level(['MALE_GENITALIA_EXPOSED', 'female_genitalia_exposed'], 1)
+            >>> policy.concerns
+            ('FEMALE_GENITALIA_EXPOSED', 'MALE_GENITALIA_EXPOSED')
+        """
+        if isinstance(labels, (str, int)):
+            labels = (labels,)
+
+        level_table = bytearray(self.__levels)
+        level = _level_id(level)
+
+        for label in labels:
+            level_table[_label_id(label)] = level
+
+        return self.__copy_with(levels=level_table)
+
+    def with_threshold(
+            self,
+            labels:    Union[str, int, Iterable[Union[str, int]]],
+            threshold: float
+    ) -> 'InterestPolicy':
+        """
+        Get a copy of the policy with another score threshold for labels.
+
+        Parameters:
+            labels (Union[str, int, Iterable[Union[str, int]]]):
+                The label(s), by name (in any case) or ID.
+
+            threshold (float):
+                The minimum score, from 0 to 1, of a detection of the labels for it not to be non-interesting; 0 for no
+                threshold.
+
+        Returns:
+            InterestPolicy:
+                The new policy.
+
+        Raises:
+            ValueError:
+                If a label is unknown.
+        """
+        if isinstance(labels, (str, int)):
+            labels = (labels,)
+
+        threshold_table = list(self.__thresholds)
+
+        for label in labels:
+            threshold_table[_label_id(label)] = float(threshold)
+
+        return self.__copy_with(thresholds=threshold_table)
+
+    def compose(self, *presets) -> 'InterestPolicy':
+        """
+        Get the policy the presets make of this one, applying them in order.
+
+        Parameters:
+            *presets (Callable[[InterestPolicy], InterestPolicy]):
+                The presets (see :mod:`pic_scanner.models.presets`).
+
+        Returns:
+            InterestPolicy:
+                The new policy.
+        """
+        policy = self
+
+        for preset in presets:
+            policy = preset(policy)
+
+        return policy
+
+    def level_of(self, label: Union[str, int]) -> str:
+        """
+        Get the name of the interest level of a label, regardless of thresholds.
+
+        Parameters:
+            label (Union[str, int]):
+                The label, by name (in any case) or ID.
+
+        Returns:
+            str:
+                The name of the interest level (see :data:`INTEREST_LEVELS`).
+        """
+        return INTEREST_LEVELS[self.__levels[_label_id(label)]]
+
+    def classify(self, label: Union[str, int, Detection], score: Optional[float] = None) -> int:
+        """
+        Get the interest level of a detection.
+
+        Parameters:
+            label (Union[str, int, Detection]):
+                The label of the detection, by name (in any case) or ID, or the detection itself.
+
+            score (Optional[float]):
+                The score of the detection, compared to the threshold of its label. Ignored for a detection.
+
+        Returns:
+            int:
+                The ID of the interest level (:data:`POINT_OF_INTEREST`, :data:`CONCERNING` or
+                :data:`NON_INTERESTING`).
+        """
+        if isinstance(label, Detection):
+            label, score = label.label_id, label.score
+        elif not isinstance(label, int):
+            label = _label_id(label)
+
+        if score is not None and score < self.__thresholds[label]:
+            return NON_INTERESTING
+
+        return self.__levels[label]
+
+    def apply(self, labels, scores=None):
+        """
+        Get the interest level of every detection of a column, in one vectorized pass if `numpy` is installed.
+
+        Parameters:
+            labels (Union[numpy.ndarray, Sequence[int]]):
+                The label ID of each detection (for example the 'label' column of
+                :meth:`pic_scanner.models.store.DetectionStore.columns`).
+
+            scores (Optional[Union[numpy.ndarray, Sequence[float]]]):
+                The score of each detection, compared to the thresholds of the labels.
+
+        Returns:
+            Union[numpy.ndarray, list[int]]:
+                The ID of the interest level of each detection, as a `uint8` array if `numpy` is installed, or as a
+                list otherwise.
+        """
+        if np is None:
+            if scores is None:
+                return [self.__levels[label] for label in labels]
+
+            return [self.classify(label, score) for label, score in zip(labels, scores)]
+
+        labels = np.asarray(labels)
+        levels = self.__level_array[labels]
+
+        if scores is not None:
+            below = np.asarray(scores, dtype=np.float32) < self.__threshold_array[labels]
+            levels = np.where(below, np.uint8(NON_INTERESTING), levels)
+
+        return levels
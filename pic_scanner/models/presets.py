@@ -1,41 +1,46 @@
 from pic_scanner.models.of_interest import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.models.of_interest.policy import CONCERNING, NON_INTERESTING, InterestPolicy
 
 
 MOD_LOGGER = PARENT_LOGGER.get_child('presets')
 
 
+def _relabel(target, fragment, level):
+    """
+    Move the points of interest whose name contains a fragment to another interest level.
+
+    An :class:`InterestPolicy` is left unchanged, and the new policy returned; an interest factory is changed in place
+    and returned.
+    """
+    # The names are collected first: the factory removes them from its points of interest as they move.
+    names = [name for name in target.points_of_interest if fragment in name]
+
+    if isinstance(target, InterestPolicy):
+        return target.with_level(names, level) if names else target
+
+    for name in names:
+        if level == CONCERNING:
+            target.make_concerning(name)
+        else:
+            target.make_non_interesting(name)
+
+    return target
+
+
 def make_all_exposed_genitalia_concerning(factory):
     """
     Make all exposed genitalia concerning.
 
     Parameters:
-        factory (LabelFactory):
-            The label factory.
+        factory (Union[InterestFactory, InterestPolicy]):
+            The interest factory, changed in place, or the interest policy.
 
     Returns:
-        None
+        Union[InterestFactory, InterestPolicy]:
+            The factory, or the new policy.
     """
-    _name = 'make_all_exposed_genitalia_concerning'
-    if not MOD_LOGGER.find_child_by_name(_name):
-        log = MOD_LOGGER.get_child(_name)
-    else:
-        log = MOD_LOGGER.find_child_by_name(_name)
-
-    _checked = []
-    _found = []
-
-    for name in factory.points_of_interest:
-        log.debug(f'Checking {name}')
-
-        if 'GENITALIA_EXPOSED' in name:
-            log.debug(f'Making {name} concerning')
-            factory.make_concerning(name)
-            log.debug(f'{factory.concerns}')
-            _found.append(name)
-
-        _checked.append(name)
-        log.debug(f'Checked {_checked}')
-        log.debug(f'Found {_found}')
+    factory = _relabel(factory, 'GENITALIA_EXPOSED', CONCERNING)
+    MOD_LOGGER.debug(f'Concerns: {factory.concerns}')
 
     return factory
 
@@ -45,23 +50,14 @@ def make_all_armpit_non_interesting(factory):
     Make all armpit non-interesting.
 
     Parameters:
-        factory (LabelFactory):
-            The label factory.
+        factory (Union[InterestFactory, InterestPolicy]):
+            The interest factory, changed in place, or the interest policy.
 
     Returns:
-        None
+        Union[InterestFactory, InterestPolicy]:
+            The factory, or the new policy.
     """
-    _name = 'make_all_armpit_non_interesting'
-    if not MOD_LOGGER.find_child_by_name(_name):
-        log = MOD_LOGGER.get_child(_name)
-    else:
-        log = MOD_LOGGER.find_child_by_name(_name)
-    
-    for name in factory.points_of_interest:
-        if 'ARMPIT' in name:
-            factory.make_non_interesting(name)
-
-    return factory
+    return _relabel(factory, 'ARMPIT', NON_INTERESTING)
 
 
 def make_all_belly_non_interesting(factory):
@@ -69,17 +65,14 @@ def make_all_belly_non_interesting(factory):
     Make all belly non-interesting.
 
     Parameters:
-        factory (LabelFactory):
-            The label factory.
+        factory (Union[InterestFactory, InterestPolicy]):
+            The interest factory, changed in place, or the interest policy.
 
     Returns:
-        None
+        Union[InterestFactory, InterestPolicy]:
+            The factory, or the new policy.
     """
-    for name in factory.points_of_interest:
-        if 'BELLY' in name:
-            factory.make_non_interesting(name)
-
-    return factory
+    return _relabel(factory, 'BELLY', NON_INTERESTING)
 
 
 def make_all_covered_non_interesting(factory):
@@ -87,14 +80,11 @@ def make_all_covered_non_interesting(factory):
     Make all covered non-interesting.
 
     Parameters:
-        factory (LabelFactory):
-            The label factory.
+        factory (Union[InterestFactory, InterestPolicy]):
+            The interest factory, changed in place, or the interest policy.
 
     Returns:
-        None
+        Union[InterestFactory, InterestPolicy]:
+            The factory, or the new policy.
     """
-    for name in factory.points_of_interest:
-        if 'COVERED' in name:
-            factory.make_non_interesting(name)
-
-    return factory
+    return _relabel(factory, 'COVERED', NON_INTERESTING)
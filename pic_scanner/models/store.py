@@ -0,0 +1,404 @@
+"""
+store.py
+
+This module provides the columnar store of the detections of a collection of scanned images.
+
+The :class:`DetectionStore` keeps every detection of a collection in parallel columns: the index of its image (into a
+table of image paths), its label ID (see :data:`pic_scanner.models.detection.LABELS`), its score and its box. The
+columns are compact `array.array` buffers, so adding the detections of an image only appends a few numbers to each of
+them. With the optional `numpy` dependency (`pip install pic-scanner[numpy]`), queries read the columns through
+zero-copy NumPy views and run vectorized, so filtering millions of detections by label, score or box area takes
+milliseconds; without it, the same queries run as plain Python loops over the columns.
+
+Classes:
+    DetectionStore:
+        A columnar store of the detections of a collection of scanned images.
+
+
+Since:
+    1.0
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from pic_scanner.models import MOD_LOGGER as PARENT_LOGGER
+from pic_scanner.models.detection import LABELS, LABEL_IDS, Detection
+from pic_scanner.models.of_interest.policy import CONCERNING, InterestPolicy
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+__all__ = [
+    'DetectionStore',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('store')
+
+
+def _label_ids(labels: Union[str, int, Iterable[Union[str, int]]]) -> set[int]:
+    """
+    Get the IDs of labels given by name (in any case) or by ID; unknown labels are ignored.
+    """
+    if isinstance(labels, (str, int)):
+        labels = (labels,)
+
+    ids = set()
+
+    for label in labels:
+        if isinstance(label, int):
+            ids.add(label)
+        elif (label_id := LABEL_IDS.get(label.upper())) is not None:
+            ids.add(label_id)
+
+    return ids
+
+
+class DetectionStore:
+    """
+    A columnar store of the detections of a collection of scanned images.
+
+    Each image is identified by its index in the store, in the order the images were added. Removing an image only
+    marks its index as removed: the indices of the other images do not change, and its detections are skipped by every
+    query.
+
+    Boxes are read as `[left, top, right, bottom]`, as :func:`pic_scanner.helpers.images.draw_bounding_boxes` draws
+    them, to compute their areas.
+
+    Properties:
+        detection_count (int):
+            The number of detections of the images that were not removed.
+
+        image_count (int):
+            The number of images that were not removed.
+
+        paths (list[Path]):
+            The path of each image index (None for removed images).
+
+    Methods:
+        add(image_path, detections):
+            Add the detections of an image.
+
+        classify(policy):
+            Get the interest level of every detection under a policy.
+
+        columns():
+            Get a copy of the columns of the detections.
+
+        filter(labels=None, min_score=None, min_area=None, policy=None, level=CONCERNING):
+            Get the indices of the images with a detection matching every condition.
+
+        label_counts():
+            Get the number of detections of each label.
+
+        remove(image_index):
+            Remove the detections of an image.
+    """
+
+    def __init__(self):
+        """
+        The constructor for the DetectionStore class.
+        """
+        self.__images = array('I')
+        self.__labels = array('B')
+        self.__scores = array('f')
+        self.__boxes = array('i')
+
+        self.__paths = []
+        self.__removed = bytearray()
+        self.__removed_detections = 0
+        self.__removed_images = 0
+
+    def __len__(self):
+        return self.detection_count
+
+    def __repr__(self):
+        return f'DetectionStore(images={self.image_count}, detections={self.detection_count})'
+
+    @property
+    def detection_count(self) -> int:
+        """
+        Get the number of detections of the images that were not removed.
+
+        Returns:
+            int:
+                The number of detections.
+        """
+        return len(self.__labels) - self.__removed_detections
+
+    @property
+    def image_count(self) -> int:
+        """
+        Get the number of images that were not removed.
+
+        Returns:
+            int:
+                The number of images.
+        """
+        return len(self.__paths) - self.__removed_images
+
+    @property
+    def paths(self) -> list[Optional[Path]]:
+        """
+        Get the path of each image index.
+
+        Returns:
+            list[Optional[Path]]:
+                The path of each image index, or None for removed images.
+        """
+        return self.__paths
+
+    def add(self, image_path: Union[str, Path], detections: Iterable[Detection]) -> int:
+        """
+        Add the detections of an image.
+
+        Parameters:
+            image_path (Union[str, Path]):
+                The path of the image.
+
+            detections (Iterable[Detection]):
+                The detections of the image.
+
+        Returns:
+            int:
+                The index of the image in the store.
+        """
+        image_index = len(self.__paths)
+        self.__paths.append(Path(image_path))
+        self.__removed.append(0)
+
+        boxes = self.__boxes
+        count = 0
+
+        for label_id, score, box in detections:
+            self.__labels.append(label_id)
+            self.__scores.append(score)
+            boxes.extend(box)
+            count += 1
+
+        self.__images.extend((image_index,) * count)
+
+        return image_index
+
+    def remove(self, image_index: int):
+        """
+        Remove the detections of an image from every later query.
+
+        Parameters:
+            image_index (int):
+                The index of the image.
+
+        Returns:
+            None
+
+        Raises:
+            IndexError:
+                If there is no image with this index.
+        """
+        if self.__removed[image_index]:
+            return
+
+        self.__removed[image_index] = 1
+        self.__paths[image_index] = None
+        self.__removed_images += 1
+
+        # The image column is sorted, as the detections of each image are appended together.
+        self.__removed_detections += bisect_right(self.__images, image_index) - bisect_left(self.__images, image_index)
+
+    @staticmethod
+    def __column(column: array, dtype):
+        # A view over the buffer of the column, only used for the duration of a query: an `array` cannot grow while
+        # a view of it exists.
+        return np.frombuffer(column, dtype=dtype) if len(column) else np.empty(0, dtype=dtype)
+
+    def __live(self):
+        """
+        Get the mask of the detections of the images that were not removed, or None if none were.
+        """
+        if not self.__removed_images:
+            return None
+
+        return np.frombuffer(self.__removed, dtype=np.uint8)[self.__column(self.__images, np.uint32)] == 0
+
+    def filter(
+            self,
+            labels:    Optional[Union[str, int, Iterable[Union[str, int]]]] = None,
+            min_score: Optional[float] = None,
+            min_area:  Optional[int] = None,
+            policy:    Optional[InterestPolicy] = None,
+            level:     int = CONCERNING
+    ) -> list[int]:
+        """
+        Get the indices of the images with at least one detection matching every given condition.
+
+        Parameters:
+            labels (Optional[Union[str, int, Iterable[Union[str, int]]]]):
+                The label(s) of the detection, by name (in any case) or ID. Defaults to any label.
+
+            min_score (Optional[float]):
+                The minimum score of the detection, from 0 to 1.
+
+            min_area (Optional[int]):
+                The minimum area of the box of the detection, in pixels.
+
+            policy (Optional[InterestPolicy]):
+                The interest policy classifying the detection.
+
+            level (int):
+                The interest level the policy must give the detection (see
+                :data:`pic_scanner.models.of_interest.policy.INTEREST_LEVELS`).
+
+        Returns:
+            list[int]:
+                The indices of the matching images, in ascending order.
+
+        Examples:
+            >>> store = DetectionStore()
+            >>> store.add('a.jpg', [Detection(LABEL_IDS['FACE_FEMALE'], 0.9, (0, 0, 10, 10))])
+            0
+            >>> store.add('b.jpg', [Detection(LABEL_IDS['FACE_FEMALE'], 0.3, (0, 0, 10, 10))])
+            1
+            >>> store.filter('face_female', min_score=0.5)
+            [0]
+        """
+        label_ids = None if labels is None else _label_ids(labels)
+
+        if np is None:
+            return self.__filter_python(label_ids, min_score, min_area, policy, level)
+
+        images = self.__column(self.__images, np.uint32)
+        mask = self.__live()
+
+        if label_ids is not None:
+            table = np.zeros(256, dtype=bool)
+            table[list(label_ids)] = True
+            mask = self.__and(mask, table[self.__column(self.__labels, np.uint8)])
+
+        if min_score is not None:
+            mask = self.__and(mask, self.__column(self.__scores, np.float32) >= np.float32(min_score))
+
+        if min_area is not None:
+            boxes = self.__column(self.__boxes, np.int32).reshape(-1, 4)
+            widths = np.maximum(boxes[:, 2] - boxes[:, 0], 0).astype(np.int64)
+            heights = np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+            mask = self.__and(mask, widths * heights >= min_area)
+
+        if policy is not None:
+            mask = self.__and(mask, self.classify(policy) == level)
+
+        matched = images if mask is None else images[mask]
+
+        # The image column is sorted, so keeping the first of each run is a linear `unique`.
+        first = np.empty(len(matched), dtype=bool)
+        first[:1] = True
+        np.not_equal(matched[1:], matched[:-1], out=first[1:])
+
+        return matched[first].tolist()
+
+    @staticmethod
+    def __and(mask, condition):
+        return condition if mask is None else mask & condition
+
+    def __filter_python(self, label_ids, min_score, min_area, policy, level) -> list[int]:
+        removed = self.__removed
+        boxes = self.__boxes
+        matched = set()
+
+        if min_score is not None:
+            # The scores are stored as float32; compare them to a float32 threshold, as the NumPy path does.
+            min_score = array('f', (min_score,))[0]
+
+        for number, (image_index, label_id, score) in enumerate(zip(self.__images, self.__labels, self.__scores)):
+            if image_index in matched or removed[image_index]:
+                continue
+
+            if label_ids is not None and label_id not in label_ids:
+                continue
+
+            if min_score is not None and score < min_score:
+                continue
+
+            if min_area is not None:
+                left, top, right, bottom = boxes[number * 4:number * 4 + 4]
+
+                if max(right - left, 0) * max(bottom - top, 0) < min_area:
+                    continue
+
+            if policy is not None and policy.classify(label_id, score) != level:
+                continue
+
+            matched.add(image_index)
+
+        return sorted(matched)
+
+    def classify(self, policy: InterestPolicy):
+        """
+        Get the interest level of every detection under a policy, in one vectorized pass if `numpy` is installed.
+
+        Parameters:
+            policy (InterestPolicy):
+                The interest policy.
+
+        Returns:
+            Union[numpy.ndarray, list[int]]:
+                The ID of the interest level of each detection, in the order of :meth:`columns` (including the
+                detections of removed images).
+        """
+        if np is None:
+            return policy.apply(self.__labels, self.__scores)
+
+        return policy.apply(self.__column(self.__labels, np.uint8), self.__column(self.__scores, np.float32))
+
+    def label_counts(self) -> dict[str, int]:
+        """
+        Get the number of detections of each label, skipping labels without detections.
+
+        Returns:
+            dict[str, int]:
+                The number of detections of each label, in the order of :data:`LABELS`.
+        """
+        if np is None:
+            counts = [0] * len(LABELS)
+            removed = self.__removed
+
+            for image_index, label_id in zip(self.__images, self.__labels):
+                if not removed[image_index]:
+                    counts[label_id] += 1
+        else:
+            labels = self.__column(self.__labels, np.uint8)
+
+            if (live := self.__live()) is not None:
+                labels = labels[live]
+
+            counts = np.bincount(labels, minlength=len(LABELS)).tolist()
+
+        return {LABELS[label_id]: count for label_id, count in enumerate(counts) if count}
+
+    def columns(self) -> dict:
+        """
+        Get a copy of the columns of the detections, including those of removed images.
+
+        Returns:
+            dict:
+                The 'image', 'label', 'score' and 'box' columns, as NumPy arrays (the boxes as an N x 4 array) if
+                `numpy` is installed, or as `array.array` objects (the boxes flattened) otherwise.
+        """
+        if np is None:
+            return {
+                'image': array('I', self.__images),
+                'label': array('B', self.__labels),
+                'score': array('f', self.__scores),
+                'box': array('i', self.__boxes),
+            }
+
+        return {
+            'image': self.__column(self.__images, np.uint32).copy(),
+            'label': self.__column(self.__labels, np.uint8).copy(),
+            'score': self.__column(self.__scores, np.float32).copy(),
+            'box': self.__column(self.__boxes, np.int32).reshape(-1, 4).copy(),
+        }
@@ -0,0 +1,27 @@
+"""
+pic_scanner.testing
+
+This package contains tools for testing and benchmarking the scanner without a real inference server.
+
+Modules:
+    mock_server:
+        A local stand-in for the NSFW inference server.
+
+
+Since:
+    1.0
+"""
+from pic_scanner.log_engine import ROOT_LOGGER as PARENT_LOGGER
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('testing')
+
+
+from .mock_server import LatencyDistribution, MockInferenceServer, MockServerConfig
+
+
+__all__ = [
+    'LatencyDistribution',
+    'MockInferenceServer',
+    'MockServerConfig',
+]
@@ -0,0 +1,5 @@
+from pic_scanner.testing.mock_server import main
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,642 @@
+"""
+mock_server.py
+
+This module provides a local stand-in for the NSFW inference server, for throughput and tail-latency tests of the client
+on machines without the model (or a GPU).
+
+The :class:`MockInferenceServer` speaks the same protocol as the real server: it accepts a `multipart/form-data` POST
+with numbered file fields (`f1` .. `fN`) and answers with `{'prediction': [[{'class', 'score', 'box'}, ...], ...]}`, one
+list of detections per field. The detections are synthetic but deterministic; they are derived from a hash of the
+uploaded bytes, so the same image always yields the same result. Latency, error rate and server-side batching are
+configurable through a :class:`MockServerConfig`.
+
+The server can also be started from the command line:
+
+    python -m pic_scanner.testing --port 8080 --latency lognormal:0.05:0.5 --error-rate 0.01
+
+Classes:
+    LatencyDistribution:
+        A distribution the simulated inference latency is drawn from.
+
+    MockServerConfig:
+        The behavior of a :class:`MockInferenceServer`.
+
+    MockInferenceServer:
+        A local, threaded HTTP server that imitates the inference server.
+
+
+Since:
+    1.0
+"""
+import hashlib
+import json
+import random
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import HTTP
+import os
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from socketserver import ThreadingUnixStreamServer
+from threading import Condition, Event, Lock, Thread
+from time import monotonic, sleep
+from typing import Optional
+
+from PIL import Image
+
+from pic_scanner.common.constants import VALID_LABELS
+from pic_scanner.testing import MOD_LOGGER as PARENT_LOGGER
+
+
+__all__ = [
+    'LatencyDistribution',
+    'MockInferenceServer',
+    'MockServerConfig',
+]
+
+
+MOD_LOGGER = PARENT_LOGGER.get_child('mock_server')
+
+
+DISTRIBUTIONS = ('constant', 'uniform', 'exponential', 'lognormal')
+"""
+tuple[str]:
+    The kinds of :class:`LatencyDistribution`.
+"""
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """
+    A distribution the simulated inference latency is drawn from, in seconds.
+
+    Attributes:
+        kind (str):
+            One of 'constant' (always `a`), 'uniform' (between `a` and `b`), 'exponential' (mean `a`) or 'lognormal'
+            (median `a`, shape `b`; a heavy right tail, like a real server with occasional slow batches).
+
+        a (float):
+            The first parameter of the distribution.
+
+        b (float):
+            The second parameter of the distribution, if it takes one.
+    """
+    kind: str = 'constant'
+    a: float = 0.0
+    b: float = 0.0
+
+    def __post_init__(self):
+        if self.kind not in DISTRIBUTIONS:
+            raise ValueError(f"Invalid latency distribution: {self.kind}! Must be one of {DISTRIBUTIONS}.")
+
+        if self.a < 0 or self.b < 0:
+            raise ValueError(f"Invalid latency distribution parameters: {self.a}, {self.b}!")
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyDistribution':
+        """
+        Parse a distribution from a `kind:a[:b]` string, such as `constant:0.02` or `lognormal:0.05:0.5`.
+
+        Parameters:
+            spec (str):
+                The distribution specification.
+
+        Returns:
+            LatencyDistribution:
+                The parsed distribution.
+        """
+        kind, *params = spec.split(':')
+
+        return cls(kind, *(float(param) for param in params))
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Draw a latency from the distribution.
+
+        Parameters:
+            rng (random.Random):
+                The random number generator to draw from.
+
+        Returns:
+            float:
+                The latency, in seconds.
+        """
+        if self.kind == 'uniform':
+            return rng.uniform(self.a, self.b)
+
+        if self.kind == 'exponential':
+            return rng.expovariate(1 / self.a) if self.a else 0.0
+
+        if self.kind == 'lognormal':
+            return rng.lognormvariate(0, self.b) * self.a
+
+        return self.a
+
+
+@dataclass(frozen=True)
+class MockServerConfig:
+    """
+    The behavior of a :class:`MockInferenceServer`.
+
+    Attributes:
+        latency (LatencyDistribution):
+            The distribution of the inference time of each batch the server runs.
+
+        per_image_latency (float):
+            The additional inference time per image in a batch, in seconds.
+
+        error_rate (float):
+            The probability of a request failing with `error_status`.
+
+        error_status (int):
+            The HTTP status of a failed request.
+
+        batch_window (float):
+            How long the server waits for more requests to join a batch before it runs it, in seconds. With a window
+            of 0, requests are not batched across connections.
+
+        max_batch_size (int):
+            The maximum number of images the server runs in one batch.
+
+        max_detections (int):
+            The maximum number of synthetic detections per image.
+
+        clean_rate (float):
+            The probability of an image having no detections at all.
+
+        seed (int):
+            The seed of the latency and error draws. Detections do not depend on it.
+    """
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    per_image_latency: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    batch_window: float = 0.0
+    max_batch_size: int = 32
+    max_detections: int = 3
+    clean_rate: float = 0.5
+    seed: int = 0
+
+    def __post_init__(self):
+        if not 0 <= self.error_rate <= 1:
+            raise ValueError(f"Invalid error rate: {self.error_rate}!")
+
+        if not 0 <= self.clean_rate <= 1:
+            raise ValueError(f"Invalid clean rate: {self.clean_rate}!")
+
+        if self.max_batch_size < 1:
+            raise ValueError(f"Invalid maximum batch size: {self.max_batch_size}!")
+
+
+LABELS = sorted(VALID_LABELS)
+
+
+def synthesize_detections(data: bytes, max_detections: int = 3, clean_rate: float = 0.5) -> list[dict]:
+    """
+    Create deterministic, synthetic detections for an uploaded image.
+
+    The detections are drawn from a generator seeded with a hash of the bytes, so the same image always yields the same
+    detections. The boxes (`[left, top, right, bottom]`, as the scanner reads them) lie within the image if its size can
+    be read from its header.
+
+    Parameters:
+        data (bytes):
+            The bytes of the uploaded image.
+
+        max_detections (int):
+            The maximum number of detections.
+
+        clean_rate (float):
+            The probability of the image having no detections at all.
+
+    Returns:
+        list[dict]:
+            The detections, each with a 'class', a 'score' and a 'box'.
+    """
+    rng = random.Random(hashlib.blake2b(data, digest_size=8).digest())
+
+    if rng.random() < clean_rate or max_detections < 1:
+        return []
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            width, height = image.size
+    except Exception:
+        width, height = 1000, 1000
+
+    detections = []
+
+    for _ in range(rng.randint(1, max_detections)):
+        box_width = rng.randint(1, max(1, width // 2))
+        box_height = rng.randint(1, max(1, height // 2))
+        left = rng.randint(0, width - box_width)
+        top = rng.randint(0, height - box_height)
+        detections.append({
+            'class': rng.choice(LABELS),
+            'score': round(rng.uniform(0.2, 0.99), 4),
+            'box': [left, top, left + box_width, top + box_height],
+        })
+
+    return detections
+
+
+class _Batcher:
+    """
+    Collects the images of concurrent requests into batches and runs each batch after a simulated inference time.
+    """
+
+    def __init__(self, server: 'MockInferenceServer'):
+        self.server = server
+        self.condition = Condition()
+        self.pending = []
+        self.stopped = False
+        self.thread = Thread(target=self.run, name='MockServerBatcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, count: int):
+        done = Event()
+
+        with self.condition:
+            self.pending.append((count, done))
+            self.condition.notify_all()
+
+        done.wait()
+
+    def run(self):
+        config = self.server.config
+
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.stopped)
+
+                if self.stopped:
+                    return
+
+                deadline = monotonic() + config.batch_window
+
+                while sum(count for count, _ in self.pending) < config.max_batch_size:
+                    remaining = deadline - monotonic()
+
+                    if remaining <= 0 or self.stopped:
+                        break
+
+                    self.condition.wait(remaining)
+
+                batch, size = [], 0
+
+                while self.pending and (not batch or size + self.pending[0][0] <= config.max_batch_size):
+                    count, done = self.pending.pop(0)
+                    batch.append(done)
+                    size += count
+
+            sleep(self.server.draw_latency(size))
+            self.server.record_batch(size)
+
+            for done in batch:
+                done.set()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+            for _, done in self.pending:
+                done.set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: '_HTTPServer'
+    protocol_version = 'HTTP/1.1'
+
+    # The headers and the body are written separately; without this, Nagle's algorithm holds the body back until the
+    # client's delayed ACK, adding tens of milliseconds to every reply.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        if self.server.address_family == socket.AF_UNIX:
+            self.disable_nagle_algorithm = False
+
+        super().setup()
+
+    def log_message(self, format, *args):
+        MOD_LOGGER.debug(format % args)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+
+        try:
+            files = self.parse_files(body)
+        except ValueError as e:
+            self.reply(400, {'error': str(e)})
+            return
+
+        if mock.draw_error():
+            mock.record_request(len(files), failed=True)
+            self.reply(mock.config.error_status, {'error': 'Simulated inference failure.'})
+            return
+
+        if mock.config.batch_window > 0:
+            mock.batcher.submit(len(files))
+        else:
+            sleep(mock.draw_latency(len(files)))
+            mock.record_batch(len(files))
+
+        predictions = [
+            synthesize_detections(data, mock.config.max_detections, mock.config.clean_rate)
+            for data in files
+        ]
+        mock.record_request(len(files))
+        self.reply(200, {'prediction': predictions})
+
+    def parse_files(self, body: bytes) -> list[bytes]:
+        content_type = self.headers.get('Content-Type', '')
+
+        if not content_type.startswith('multipart/form-data'):
+            raise ValueError(f'Expected a multipart/form-data body, got {content_type!r}.')
+
+        message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        fields = {
+            part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+            for part in message.iter_parts()
+        }
+
+        files = [fields[f'f{index}'] for index in range(1, len(fields) + 1) if f'f{index}' in fields]
+
+        if not files:
+            raise ValueError('No file fields (f1 .. fN) in the request.')
+
+        return files
+
+    def reply(self, status: int, content: dict):
+        data = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+    mock: 'MockInferenceServer'
+
+
+class _UnixHTTPServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+    # A full backlog makes UNIX domain socket connections fail outright rather than retry, as TCP connections do.
+    request_queue_size = 1024
+    mock: 'MockInferenceServer'
+
+
+class MockInferenceServer:
+    """
+    A local, threaded HTTP server that imitates the inference server.
+
+    The server is a context manager; entering the context starts it on a background thread and leaving it stops it.
+
+    Properties:
+        config (MockServerConfig):
+            The behavior of the server.
+
+        url (str):
+            The base URL to pass to the scanner (the server answers on any path).
+
+    Methods:
+        start():
+            Start serving on a background thread.
+
+        stop():
+            Stop serving.
+
+        stats():
+            Get the request, image, batch and error counts of the server.
+
+    Examples:
+        >>> config = MockServerConfig(latency=LatencyDistribution('lognormal', 0.02, 0.5), error_rate=0.01)
+        >>> with MockInferenceServer(config) as server:
+        ...     collection = scan_images(paths, base_url=server.url, threaded=True)
+    """
+
+    def __init__(
+            self,
+            config:      Optional[MockServerConfig] = None,
+            host:        str = '127.0.0.1',
+            port:        int = 0,
+            unix_socket: Optional[str] = None
+    ):
+        """
+        The constructor for the MockInferenceServer class.
+
+        Parameters:
+            config (Optional[MockServerConfig]):
+                The behavior of the server. Defaults to an instant, error-free server.
+
+            host (str):
+                The host to bind to.
+
+            port (int):
+                The port to bind to. A free port is chosen if 0.
+
+            unix_socket (Optional[str]):
+                If given, the server listens on a UNIX domain socket at this path instead of on `host` and `port`.
+        """
+        self.__config = config or MockServerConfig()
+        self.__rng = random.Random(self.__config.seed)
+        self.__lock = Lock()
+        self.__counts = {'requests': 0, 'images': 0, 'errors': 0, 'batches': 0, 'batched_images': 0}
+
+        if unix_socket is not None:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+
+            self.__httpd = _UnixHTTPServer(unix_socket, _Handler)
+        else:
+            self.__httpd = _HTTPServer((host, port), _Handler)
+
+        self.__httpd.mock = self
+        self.__thread = None
+        self.batcher = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __repr__(self):
+        return f'MockInferenceServer({self.url!r})'
+
+    @property
+    def config(self) -> MockServerConfig:
+        """
+        Get the behavior of the server.
+
+        Returns:
+            MockServerConfig:
+                The configuration.
+        """
+        return self.__config
+
+    @property
+    def url(self) -> str:
+        """
+        Get the base URL of the server.
+
+        Returns:
+            str:
+                The base URL, ending in `/infer` like the real server's (`unix://<socket>:/infer` for a UNIX domain
+                socket).
+        """
+        if self.__httpd.address_family == socket.AF_UNIX:
+            return f'unix://{self.__httpd.server_address}:/infer'
+
+        host, port = self.__httpd.server_address[:2]
+
+        return f'http://{host}:{port}/infer'
+
+    def draw_latency(self, images: int) -> float:
+        with self.__lock:
+            latency = self.__config.latency.sample(self.__rng)
+
+        return latency + self.__config.per_image_latency * images
+
+    def draw_error(self) -> bool:
+        with self.__lock:
+            return self.__rng.random() < self.__config.error_rate
+
+    def record_batch(self, images: int):
+        with self.__lock:
+            self.__counts['batches'] += 1
+            self.__counts['batched_images'] += images
+
+    def record_request(self, images: int, failed: bool = False):
+        with self.__lock:
+            self.__counts['requests'] += 1
+
+            if failed:
+                self.__counts['errors'] += 1
+            else:
+                self.__counts['images'] += images
+
+    def start(self):
+        """
+        Start serving on a background thread.
+
+        Returns:
+            None
+        """
+        if self.__thread is not None:
+            return
+
+        if self.__config.batch_window > 0:
+            self.batcher = _Batcher(self)
+
+        self.__thread = Thread(target=self.__httpd.serve_forever, name='MockInferenceServer', daemon=True)
+        self.__thread.start()
+        MOD_LOGGER.debug(f'Mock inference server listening on {self.url}')
+
+    def serve_forever(self):
+        """
+        Serve on the calling thread until interrupted.
+
+        Returns:
+            None
+        """
+        if self.__config.batch_window > 0:
+            self.batcher = _Batcher(self)
+
+        try:
+            self.__httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop serving.
+
+        Returns:
+            None
+        """
+        if self.batcher is not None:
+            self.batcher.stop()
+
+        if self.__thread is not None:
+            self.__httpd.shutdown()
+            self.__thread.join()
+            self.__thread = None
+
+        self.__httpd.server_close()
+
+        if self.__httpd.address_family == socket.AF_UNIX and os.path.exists(self.__httpd.server_address):
+            os.unlink(self.__httpd.server_address)
+
+    def stats(self) -> dict:
+        """
+        Get the request, image, batch and error counts of the server.
+
+        Returns:
+            dict:
+                The number of requests, successfully analyzed images, failed requests, batches run and the average
+                batch size.
+        """
+        with self.__lock:
+            counts = dict(self.__counts)
+
+        batched_images = counts.pop('batched_images')
+        counts['mean_batch_size'] = batched_images / counts['batches'] if counts['batches'] else 0.0
+
+        return counts
+
+
+def main(args: Optional[list[str]] = None):
+    parser = ArgumentParser(prog='python -m pic_scanner.testing', description=__doc__.split('\n\n')[1])
+    parser.add_argument('--host', default='127.0.0.1', help='The host to bind to.')
+    parser.add_argument('--port', type=int, default=8080, help='The port to bind to.')
+    parser.add_argument('--unix-socket', help='Listen on a UNIX domain socket at this path instead of on a port.')
+    parser.add_argument('--latency', type=LatencyDistribution.parse, default=LatencyDistribution(),
+                        help="The inference latency distribution, as 'kind:a[:b]' (e.g. 'lognormal:0.05:0.5').")
+    parser.add_argument('--per-image-latency', type=float, default=0.0,
+                        help='The additional inference time per image in a batch, in seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='The probability of a request failing.')
+    parser.add_argument('--error-status', type=int, default=500, help='The HTTP status of a failed request.')
+    parser.add_argument('--batch-window', type=float, default=0.0,
+                        help='How long to wait for requests to join a batch, in seconds.')
+    parser.add_argument('--max-batch-size', type=int, default=32, help='The maximum number of images in a batch.')
+    parser.add_argument('--max-detections', type=int, default=3,
+                        help='The maximum number of synthetic detections per image.')
+    parser.add_argument('--clean-rate', type=float, default=0.5,
+                        help='The probability of an image having no detections at all.')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the latency and error draws.')
+    parsed = parser.parse_args(args)
+
+    config = MockServerConfig(
+        latency=parsed.latency,
+        per_image_latency=parsed.per_image_latency,
+        error_rate=parsed.error_rate,
+        error_status=parsed.error_status,
+        batch_window=parsed.batch_window,
+        max_batch_size=parsed.max_batch_size,
+        max_detections=parsed.max_detections,
+        clean_rate=parsed.clean_rate,
+        seed=parsed.seed,
+    )
+    server = MockInferenceServer(config, host=parsed.host, port=parsed.port, unix_socket=parsed.unix_socket)
+    print(f'Mock inference server listening on {server.url}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    print(server.stats())
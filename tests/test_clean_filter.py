@@ -0,0 +1,81 @@
+import pytest
+
+from pic_scanner.core import _resolve_clean_filter
+from pic_scanner.core.cache import ResultCache
+from pic_scanner.core.clean_filter import BloomFilter, CleanFilter, clean_result
+
+
+SERVER = 'http://127.0.0.1:5000/'
+OTHER_SERVER = 'http://127.0.0.1:5001/'
+CHECKSUM = '0' * 64
+
+
+@pytest.fixture
+def saved_filter(tmp_path):
+    clean_filter = CleanFilter(capacity=100, path=tmp_path / 'clean.bloom', server=SERVER, model='v1')
+    clean_filter.add(CHECKSUM)
+    clean_filter.save()
+
+    return clean_filter.path
+
+
+def test_load_keeps_the_identity(saved_filter):
+    clean_filter = CleanFilter.load(saved_filter, server=SERVER, model='v1')
+
+    assert (clean_filter.server, clean_filter.model) == (SERVER, 'v1')
+    assert CHECKSUM in clean_filter
+
+
+@pytest.mark.parametrize('server, model', [(OTHER_SERVER, 'v1'), (SERVER, 'v2'), (None, 'v2')])
+def test_load_refuses_another_identity(saved_filter, server, model):
+    with pytest.raises(ValueError):
+        CleanFilter.load(saved_filter, server=server, model=model)
+
+
+@pytest.mark.parametrize('server, model', [(OTHER_SERVER, 'v1'), (SERVER, 'v2')])
+def test_open_discards_another_identity(saved_filter, server, model):
+    clean_filter = CleanFilter.open(saved_filter, server=server, model=model, capacity=100)
+
+    assert CHECKSUM not in clean_filter
+    assert clean_filter.matches(server, model)
+
+
+def test_scan_refuses_a_filter_of_another_server(tmp_path):
+    clean_filter = CleanFilter(capacity=100, path=tmp_path / 'clean.bloom', server=OTHER_SERVER)
+
+    with pytest.raises(ValueError):
+        _resolve_clean_filter(clean_filter, None, None, SERVER)
+
+    assert _resolve_clean_filter(clean_filter, None, None, OTHER_SERVER) is clean_filter
+
+
+def test_scan_refuses_a_filter_of_another_model(tmp_path):
+    clean_filter = CleanFilter(capacity=100, path=tmp_path / 'clean.bloom', server=SERVER, model='v1')
+    cache = ResultCache(tmp_path / 'cache.sqlite3', server=SERVER, model='v2')
+
+    try:
+        with pytest.raises(ValueError):
+            _resolve_clean_filter(clean_filter, cache, None, SERVER)
+    finally:
+        cache.close()
+
+
+def test_merge_refuses_another_identity(tmp_path):
+    clean_filter = CleanFilter(capacity=100, server=SERVER, model='v1')
+
+    with pytest.raises(ValueError):
+        clean_filter.merge(CleanFilter(capacity=100, server=SERVER, model='v2'))
+
+
+@pytest.mark.parametrize('capacity, error_rate', [(1, 0.5), (100, 1e-6), (12_345, 1e-3)])
+def test_bloom_filter_size_is_a_power_of_two(capacity, error_rate):
+    size = BloomFilter(capacity, error_rate).size
+
+    assert size >= 8 and size & (size - 1) == 0
+
+
+def test_clean_result_is_not_shared():
+    result = clean_result()
+    result['prediction'][0].append({'class': 'FACE_FEMALE', 'score': 0.9, 'box': [0, 0, 1, 1]})
+
+    assert clean_result() == {'prediction': [[]]}
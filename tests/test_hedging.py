@@ -0,0 +1,87 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from pic_scanner.api import close_clients
+from pic_scanner.core import scan_images
+
+
+NUM_THREADS = 4
+FAST_IMAGES = 60
+SLOW_DELAY = 3.0
+
+
+class _StallingHandler(BaseHTTPRequestHandler):
+    """
+    Answers at once, except for the first request for a `slow-*` image, which stalls; a duplicate of it does not.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        filename = re.search(rb'filename="([^"]+)"', body).group(1)
+
+        with self.server.lock:
+            duplicate = filename in self.server.seen
+            self.server.seen.add(filename)
+            self.server.duplicates += duplicate
+
+        if filename.startswith(b'slow-') and not duplicate:
+            time.sleep(SLOW_DELAY)
+
+        reply = json.dumps({'prediction': [[]]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+@pytest.fixture
+def stalling_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StallingHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.seen = set()
+    server.duplicates = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    close_clients()
+
+
+def test_hedges_go_out_while_every_worker_is_busy(stalling_server, tmp_path):
+    paths = []
+
+    # Enough fast images to set the hedging delay, then one stalled image per worker, so every worker (and, without
+    # spare connections, every pooled connection) is held by a stalled request when the duplicates are sent.
+    for i in range(FAST_IMAGES + NUM_THREADS):
+        path = tmp_path / (f'fast-{i:03}.jpg' if i < FAST_IMAGES else f'slow-{i:03}.jpg')
+        Image.new('RGB', (8, 8), (i, 0, 0)).save(path)
+        paths.append(path)
+
+    start = time.perf_counter()
+    collection = scan_images(
+        paths,
+        base_url=f'http://127.0.0.1:{stalling_server.server_port}/',
+        threaded=True,
+        num_threads=NUM_THREADS,
+        hedge_percentile=0.5,
+        hedge_budget=1.0,
+        do_not_provision_paths=True
+    )
+    elapsed = time.perf_counter() - start
+
+    assert collection.image_count == len(paths)
+    assert stalling_server.duplicates >= NUM_THREADS
+    assert elapsed < SLOW_DELAY